@@ -0,0 +1,17 @@
+import sys
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == "batch":
+        from permitted_audio_downloader.app.batch import main as batch_main
+
+        return batch_main(argv[1:])
+
+    from permitted_audio_downloader.main import main as gui_main
+
+    return gui_main()
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import time as clock_time
+from typing import Any, Callable, Iterable, Optional
+
+Weight = Callable[[], float]
+
+
+@dataclass(frozen=True)
+class RateProfile:
+    start: clock_time
+    end: clock_time
+    bytes_per_second: int
+
+    def contains(self, moment: clock_time) -> bool:
+        if self.start <= self.end:
+            return self.start <= moment < self.end
+        # Windows like 22:00-06:00 wrap past midnight.
+        return moment >= self.start or moment < self.end
+
+
+def _parse_clock(value: str) -> clock_time:
+    hours, _, minutes = str(value).partition(":")
+    return clock_time(int(hours), int(minutes or 0))
+
+
+def parse_profiles(raw: Optional[Iterable[dict[str, Any]]]) -> list[RateProfile]:
+    # {"start": "09:00", "end": "18:00", "kbps": 512}; malformed entries are skipped.
+    profiles = []
+    for entry in raw or ():
+        try:
+            profiles.append(
+                RateProfile(
+                    _parse_clock(entry["start"]),
+                    _parse_clock(entry["end"]),
+                    max(0, int(entry["kbps"])) * 1024,
+                )
+            )
+        except (KeyError, TypeError, ValueError):
+            continue
+    return profiles
+
+
+class BandwidthLimiter:
+    # One token bucket shared by every active download. Chunks waiting for
+    # tokens are admitted by virtual finish time (bytes / weight), so while
+    # jobs are backlogged a job with twice the weight gets twice the bytes.
+    def __init__(
+        self,
+        bytes_per_second: int = 0,
+        profiles: Iterable[RateProfile] = (),
+        burst_seconds: float = 0.25,
+        window: float = 3.0,
+        clock: Callable[[], float] = time.monotonic,
+        now: Callable[[], datetime] = datetime.now,
+    ):
+        self._cond = threading.Condition()
+        self._clock = clock
+        self._now = now
+        self.burst_seconds = burst_seconds
+        self.window = window
+        self.default_rate = 0
+        self.profiles: list[RateProfile] = []
+        self._tokens = 0.0
+        self._updated = clock()
+        self._virtual = 0.0
+        self._finish: dict[object, float] = {}
+        self._waiters: list[tuple[float, int]] = []
+        self._sequence = itertools.count()
+        self._samples: deque[tuple[float, int]] = deque()
+        self.configure(bytes_per_second, profiles)
+
+    def configure(self, bytes_per_second: int, profiles: Iterable[RateProfile] = ()) -> None:
+        with self._cond:
+            self.default_rate = max(0, int(bytes_per_second))
+            self.profiles = list(profiles)
+            self._cond.notify_all()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.default_rate or self.profiles)
+
+    def current_rate(self) -> int:
+        if self.profiles:
+            moment = self._now().time()
+            for profile in self.profiles:
+                if profile.contains(moment):
+                    return profile.bytes_per_second
+        return self.default_rate
+
+    def _refill(self, rate: int) -> None:
+        now = self._clock()
+        if rate > 0:
+            ceiling = rate * self.burst_seconds
+            self._tokens = min(self._tokens + (now - self._updated) * rate, ceiling)
+        else:
+            self._tokens = 0.0
+        self._updated = now
+
+    def _record(self, nbytes: int) -> None:
+        now = self._clock()
+        self._samples.append((now, nbytes))
+        while self._samples and now - self._samples[0][0] > self.window:
+            self._samples.popleft()
+
+    def consume(self, flow: object, nbytes: int, weight: float = 1.0) -> None:
+        if nbytes <= 0:
+            return
+        with self._cond:
+            if self.current_rate() <= 0 and not self._waiters:
+                self._record(nbytes)
+                return
+            tag = max(self._virtual, self._finish.get(flow, 0.0)) + nbytes / max(weight, 0.01)
+            self._finish[flow] = tag
+            entry = (tag, next(self._sequence))
+            heapq.heappush(self._waiters, entry)
+            while True:
+                rate = self.current_rate()
+                self._refill(rate)
+                at_head = self._waiters[0] == entry
+                if at_head and (rate <= 0 or self._tokens >= 0):
+                    heapq.heappop(self._waiters)
+                    if rate > 0:
+                        # A chunk larger than the bucket goes into debt that
+                        # the next chunk waits out, keeping the average exact.
+                        self._tokens -= nbytes
+                    self._virtual = tag
+                    self._record(nbytes)
+                    self._cond.notify_all()
+                    return
+                # Profiles can change the rate without a configure() call, so
+                # never sleep unbounded.
+                timeout = min(-self._tokens / rate, 1.0) if at_head and rate > 0 else 1.0
+                self._cond.wait(timeout)
+
+    def release(self, flow: object) -> None:
+        with self._cond:
+            self._finish.pop(flow, None)
+
+    def throughput(self) -> float:
+        with self._cond:
+            now = self._clock()
+            while self._samples and now - self._samples[0][0] > self.window:
+                self._samples.popleft()
+            return sum(nbytes for _, nbytes in self._samples) / self.window
+
+
+class FlowMeter:
+    # Turns yt-dlp's cumulative downloaded_bytes into per-hook deltas for the
+    # limiter. The first report of each file only sets the baseline, so the
+    # bytes of a resumed .part are not charged again.
+    def __init__(self, limiter: BandwidthLimiter, weight: Optional[Weight] = None):
+        self.limiter = limiter
+        self.weight = weight
+        self._last: dict[str, int] = {}
+
+    def _weight(self) -> float:
+        return self.weight() if self.weight is not None else 1.0
+
+    def charge(self, nbytes: int) -> None:
+        self.limiter.consume(self, nbytes, self._weight())
+
+    def update(self, data: dict[str, Any]) -> None:
+        if data.get("status") != "downloading":
+            return
+        name = data.get("tmpfilename") or data.get("filename") or ""
+        downloaded = int(data.get("downloaded_bytes") or 0)
+        last = self._last.get(name)
+        self._last[name] = downloaded
+        if last is not None and downloaded > last:
+            self.charge(downloaded - last)
+
+    def close(self) -> None:
+        self.limiter.release(self)
@@ -0,0 +1,439 @@
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from functools import partial
+from typing import IO, Iterable, Iterator, Optional
+
+from permitted_audio_downloader.app import ffmpeg_service, ytdlp_service
+from permitted_audio_downloader.app.bandwidth import parse_profiles
+from permitted_audio_downloader.app.config import load_config
+from permitted_audio_downloader.app.library import OutputCatalog, get_catalog_path
+from permitted_audio_downloader.app.metrics import get_metrics
+from permitted_audio_downloader.app.models import DownloadItem
+from permitted_audio_downloader.app.pipeline import (
+    ConversionJob,
+    HandoffQueue,
+    convert_stage,
+    existing_outputs,
+    failure_status,
+    fetch_stage,
+)
+from permitted_audio_downloader.app.scheduler import DEFAULT_SOURCE_LIMIT
+from permitted_audio_downloader.app.source_cache import SourceCache, get_cache_dir
+from permitted_audio_downloader.app.utils import get_ffmpeg_bin_dir
+from permitted_audio_downloader.app.validators import (
+    ValidationError,
+    canonicalize_url,
+    get_source_label,
+    normalize_url,
+    validate_url,
+)
+
+
+class JsonLinesReporter:
+    def __init__(self, stream: IO[str]):
+        self._stream = stream
+        self._lock = threading.Lock()
+
+    def emit(self, event: str, **fields) -> None:
+        payload = {"event": event, "time": round(time.time(), 3), **fields}
+        line = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            self._stream.write(line + "\n")
+            self._stream.flush()
+
+
+@dataclass
+class JobRecord:
+    item: DownloadItem
+    queued_at: float
+    timings: dict[str, float] = field(default_factory=dict)
+    success: Optional[bool] = None
+    message: str = ""
+    last_percent: int = -1
+    duplicate_of: Optional[int] = None
+
+
+def read_urls(lines: Iterable[str]) -> Iterator[str]:
+    for line in lines:
+        url = normalize_url(line)
+        if url and not url.startswith("#"):
+            yield url
+
+
+class BatchRunner:
+    def __init__(
+        self,
+        options: dict,
+        reporter: JsonLinesReporter,
+        concurrency: int = 3,
+        cache: Optional[SourceCache] = None,
+        progress_step: int = 5,
+        catalog: Optional[OutputCatalog] = None,
+    ):
+        self.options = options
+        self.reporter = reporter
+        self.concurrency = max(1, concurrency)
+        self.cache = cache
+        self.progress_step = max(1, progress_step)
+        self.catalog = catalog
+        self._records: dict[int, JobRecord] = {}
+        self._cancelled = threading.Event()
+        self._source_slots: dict[str, threading.BoundedSemaphore] = {}
+        self._slots_lock = threading.Lock()
+        self._media_jobs: dict[tuple[str, str], int] = {}
+        self._followers: dict[int, list[int]] = {}
+        self._followers_lock = threading.Lock()
+        self._pool: Optional[ffmpeg_service.ConversionPool] = None
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+
+    def _is_cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    @contextmanager
+    def _source_slot(self, source: str) -> Iterator[None]:
+        with self._slots_lock:
+            slot = self._source_slots.get(source)
+            if slot is None:
+                limits = self.options.get("source_limits") or {}
+                slot = threading.BoundedSemaphore(limits.get(source, DEFAULT_SOURCE_LIMIT))
+                self._source_slots[source] = slot
+        with slot:
+            yield
+
+    def _status(self, index: int, status: str) -> None:
+        self._records[index].item.status = status
+        self.reporter.emit("status", job=index, status=status)
+
+    def _progress(self, index: int, percent: float) -> None:
+        record = self._records[index]
+        step = int(percent) // self.progress_step * self.progress_step
+        if step > record.last_percent:
+            record.last_percent = step
+            self.reporter.emit("progress", job=index, percent=round(percent, 1))
+
+    def _info(self, index: int) -> None:
+        item = self._records[index].item
+        self.reporter.emit(
+            "info",
+            job=index,
+            title=item.title,
+            source=item.source,
+            duration=item.duration,
+            filesize=item.filesize,
+        )
+
+    def _finish(self, index: int, success: bool, message: str) -> None:
+        record = self._records[index]
+        record.timings["total"] = time.perf_counter() - record.queued_at
+        with self._followers_lock:
+            record.success = success
+            record.message = message
+            followers = self._followers.pop(index, [])
+        extra = {} if record.duplicate_of is None else {"duplicate_of": record.duplicate_of}
+        self.reporter.emit(
+            "done",
+            job=index,
+            url=record.item.url,
+            success=success,
+            status=record.item.status,
+            message=message,
+            output_path=record.item.output_path,
+            output_paths=record.item.output_paths,
+            timings={
+                name: round(value, 3)
+                for name, value in {**record.item.timings, **record.timings}.items()
+            },
+            **extra,
+        )
+        for follower in followers:
+            self._finish_duplicate(follower)
+
+    def _follow(self, index: int, primary: int) -> None:
+        # Repeated media rides on the first job for it and finishes with it.
+        self._records[index].duplicate_of = primary
+        with self._followers_lock:
+            if self._records[primary].success is None:
+                self._followers.setdefault(primary, []).append(index)
+                return
+        self._finish_duplicate(index)
+
+    def _finish_duplicate(self, index: int) -> None:
+        record = self._records[index]
+        primary = self._records[record.duplicate_of]
+        record.item.status = primary.item.status
+        record.item.title = primary.item.title
+        record.item.output_path = primary.item.output_path
+        record.item.output_paths = primary.item.output_paths
+        self._finish(index, bool(primary.success), primary.message)
+
+    def _fail(self, index: int, exc: Exception) -> None:
+        status, message = failure_status(exc)
+        self._records[index].item.status = status
+        self._finish(index, False, message)
+
+    def _download(self, index: int, handoff: HandoffQueue) -> None:
+        record = self._records[index]
+        item = record.item
+        try:
+            existing = existing_outputs(item, self.options, self.catalog)
+            if existing:
+                item.output_paths = {key: str(path) for key, path in existing.items()}
+                item.output_path = str(next(iter(existing.values())))
+                item.status = "Concluído"
+                self._finish(index, True, "Já existe")
+                return
+            with self._source_slot(item.source):
+                started = time.perf_counter()
+                record.timings["queue_wait"] = started - record.queued_at
+                self._status(index, "Baixando")
+                job = fetch_stage(
+                    index,
+                    item,
+                    self.options,
+                    on_progress=partial(self._progress, index),
+                    is_cancelled=self._is_cancelled,
+                    on_info=partial(self._info, index),
+                    cache=self.cache,
+                    catalog=self.catalog,
+                )
+                record.timings["fetch"] = time.perf_counter() - started
+            if job is None:
+                item.status = "Concluído"
+                self._finish(index, True, "Concluído")
+                return
+            self._status(index, "Aguardando conversão")
+            waited = time.perf_counter()
+            try:
+                handoff.put(job, self._is_cancelled)
+            except Exception:
+                job.cleanup()
+                raise
+            record.timings["handoff_wait"] = time.perf_counter() - waited
+        except Exception as exc:
+            self._fail(index, exc)
+
+    def _convert(self, job: ConversionJob, threads: int) -> None:
+        record = self._records[job.index]
+        try:
+            self._status(job.index, "Convertendo")
+            record.last_percent = -1
+            started = time.perf_counter()
+            convert_stage(
+                job, partial(self._progress, job.index), self._is_cancelled, threads=threads
+            )
+            record.timings["convert"] = time.perf_counter() - started
+            job.item.status = "Concluído"
+            self._finish(job.index, True, "Concluído")
+        except Exception as exc:
+            self._fail(job.index, exc)
+        finally:
+            job.cleanup()
+
+    def _convert_loop(self, handoff: HandoffQueue, pool: ffmpeg_service.ConversionPool) -> None:
+        try:
+            while True:
+                job: Optional[ConversionJob] = handoff.get()
+                if job is None:
+                    return
+                pool.submit(partial(self._convert, job, pool.threads))
+        finally:
+            pool.shutdown()
+
+    def run(self, urls: Iterable[str]) -> dict:
+        started = time.perf_counter()
+        handoff = HandoffQueue(self.options.get("conversion_queue_size", 2))
+        self._pool = ffmpeg_service.ConversionPool(self.options.get("conversion_workers", 0))
+        converter = threading.Thread(
+            target=self._convert_loop, args=(handoff, self._pool), name="convert"
+        )
+        converter.start()
+        pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="download")
+        try:
+            for index, url in enumerate(urls):
+                item = DownloadItem(url=url, source=get_source_label(url))
+                self._records[index] = JobRecord(item=item, queued_at=time.perf_counter())
+                self.reporter.emit("queued", job=index, url=url)
+                try:
+                    validate_url(url)
+                except ValidationError as exc:
+                    self._fail(index, exc)
+                    continue
+                key = canonicalize_url(url)
+                if key is not None and key in self._media_jobs:
+                    self._follow(index, self._media_jobs[key])
+                    continue
+                if key is not None:
+                    self._media_jobs[key] = index
+                pool.submit(self._download, index, handoff)
+            pool.shutdown(wait=True)
+        except KeyboardInterrupt:
+            self.cancel()
+            pool.shutdown(wait=True, cancel_futures=True)
+        finally:
+            handoff.close()
+            converter.join()
+        return self._summary(time.perf_counter() - started)
+
+    def _summary(self, elapsed: float) -> dict:
+        records = list(self._records.values())
+        summary = {
+            "total": len(records),
+            "succeeded": sum(1 for r in records if r.success),
+            "failed": sum(
+                1 for r in records if r.success is False and r.item.status != "Cancelado"
+            ),
+            "cancelled": sum(1 for r in records if r.item.status == "Cancelado"),
+            "duplicates": sum(1 for r in records if r.duplicate_of is not None),
+            "elapsed": round(elapsed, 3),
+            "conversion_paths": ffmpeg_service.get_conversion_stats(),
+            "conversion": self._pool.stats() if self._pool is not None else {},
+            "stages": {},
+        }
+        for stage in ("queue_wait", "fetch", "handoff_wait", "convert", "total"):
+            values = [r.timings[stage] for r in records if stage in r.timings]
+            if values:
+                summary["stages"][stage] = {
+                    "mean": round(statistics.fmean(values), 3),
+                    "max": round(max(values), 3),
+                }
+        return summary
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m permitted_audio_downloader batch",
+        description="Baixa e converte uma lista de URLs sem interface gráfica.",
+    )
+    parser.add_argument("urls", nargs="*", help="URLs (além das lidas de --input)")
+    parser.add_argument("-i", "--input", help="arquivo com uma URL por linha ('-' para stdin)")
+    parser.add_argument("-o", "--output-dir", help="pasta de saída")
+    parser.add_argument("-j", "--concurrency", type=int, help="downloads simultâneos")
+    parser.add_argument(
+        "--convert-workers", type=int, help="conversões simultâneas (padrão: núcleos físicos)"
+    )
+    parser.add_argument(
+        "--segments", type=int, help="conexões paralelas por arquivo grande ou stream DASH/HLS"
+    )
+    parser.add_argument("--sample-rate", type=int, choices=(44100, 48000))
+    parser.add_argument(
+        "--variant",
+        action="append",
+        metavar="TAXA[:BITS[:CANAIS[:FORMATO]]]",
+        help="saída extra gerada da mesma decodificação, ex.: 48000:24:2:wav (repetível)",
+    )
+    parser.add_argument("--overwrite", action="store_true", default=None)
+    parser.add_argument("--no-preserve-name", action="store_true")
+    parser.add_argument(
+        "--stream", action="store_true", default=None, help="converter durante o download"
+    )
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument(
+        "--redownload",
+        action="store_true",
+        help="baixa mesmo que o WAV já exista na pasta de saída",
+    )
+    parser.add_argument(
+        "--limit-rate",
+        type=int,
+        metavar="KBPS",
+        help="limite de banda total em KB/s (0 = sem limite)",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="ARQUIVO",
+        help="mede cada etapa e grava os histogramas em JSON (.prom para formato Prometheus)",
+    )
+    parser.add_argument(
+        "--progress-step", type=int, default=5, help="intervalo (%%) entre eventos de progresso"
+    )
+    return parser
+
+
+def build_options(args: argparse.Namespace) -> dict:
+    config = load_config()
+    return {
+        "output_dir": args.output_dir or config.output_dir,
+        "preserve_name": config.preserve_name and not args.no_preserve_name,
+        "overwrite": config.overwrite if args.overwrite is None else args.overwrite,
+        "sample_rate": args.sample_rate or config.sample_rate,
+        "output_variants": args.variant or config.output_variants,
+        "ffmpeg_bin_dir": get_ffmpeg_bin_dir(),
+        "max_workers": args.concurrency or config.max_workers,
+        "source_limits": config.source_limits,
+        "conversion_queue_size": config.conversion_queue_size,
+        "conversion_workers": args.convert_workers or config.conversion_workers,
+        "download_segments": args.segments or config.download_segments,
+        "stream_to_ffmpeg": config.stream_to_ffmpeg if args.stream is None else args.stream,
+        "cache_enabled": config.cache_enabled and not args.no_cache,
+        "cache_max_mb": config.cache_max_mb,
+        "skip_existing": config.skip_existing and not args.redownload,
+        "ffmpeg_timeout": config.ffmpeg_timeout,
+        "rate_limit_kbps": config.rate_limit_kbps if args.limit_rate is None else args.limit_rate,
+        "bandwidth_profiles": config.bandwidth_profiles if args.limit_rate is None else [],
+    }
+
+
+def _iter_input(args: argparse.Namespace, stdin: IO[str]) -> Iterator[str]:
+    yield from read_urls(args.urls)
+    if args.input == "-" or (args.input is None and not args.urls):
+        yield from read_urls(stdin)
+    elif args.input:
+        with open(args.input, encoding="utf-8") as handle:
+            yield from read_urls(handle)
+
+
+def main(
+    argv: Optional[list[str]] = None,
+    stdin: Optional[IO[str]] = None,
+    stdout: Optional[IO[str]] = None,
+) -> int:
+    args = build_parser().parse_args(argv)
+    options = build_options(args)
+    stdin = stdin or sys.stdin
+    stdout = stdout or sys.stdout
+    cache = None
+    if options["cache_enabled"]:
+        cache = SourceCache(get_cache_dir(), options["cache_max_mb"] * 1024 * 1024)
+    reporter = JsonLinesReporter(stdout)
+    catalog = OutputCatalog(get_catalog_path())
+    metrics = get_metrics()
+    metrics.enabled = bool(args.metrics)
+    runner = BatchRunner(
+        options,
+        reporter,
+        concurrency=options["max_workers"],
+        cache=cache,
+        progress_step=args.progress_step,
+        catalog=catalog,
+    )
+    ytdlp_service.get_bandwidth_limiter().configure(
+        options["rate_limit_kbps"] * 1024, parse_profiles(options["bandwidth_profiles"])
+    )
+    pool = ytdlp_service.get_session_pool()
+    pool.resize(runner.concurrency)
+    try:
+        summary = runner.run(_iter_input(args, stdin))
+    finally:
+        pool.close()
+        catalog.close()
+        if cache is not None:
+            cache.close()
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as handle:
+            if args.metrics.endswith(".prom"):
+                handle.write(metrics.to_prometheus())
+            else:
+                handle.write(metrics.to_json())
+    reporter.emit("summary", **summary)
+    return 0 if summary["failed"] == 0 and summary["cancelled"] == 0 else 1
@@ -1,9 +1,8 @@
 import json
-import os
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from pathlib import Path
 
-from permitted_audio_downloader.app.utils import get_default_music_dir
+from permitted_audio_downloader.app.utils import get_app_data_dir, get_default_music_dir
 
 
 @dataclass
@@ -12,6 +11,46 @@ class AppConfig:
     preserve_name: bool
     overwrite: bool
     sample_rate: int
+    max_workers: int = 3
+    conversion_queue_size: int = 2
+    # Parallel ffmpeg conversions; 0 means one per physical core.
+    conversion_workers: int = 0
+    stream_to_ffmpeg: bool = False
+    # Parallel connections for one large direct file (byte ranges) or one
+    # DASH/HLS stream (fragments); 1 downloads sequentially.
+    download_segments: int = 4
+    cache_enabled: bool = True
+    cache_max_mb: int = 2048
+    metadata_workers: int = 2
+    persist_queue: bool = True
+    source_limits: dict[str, int] = field(default_factory=lambda: {"YT": 2, "SC": 2})
+    rate_limit_kbps: int = 0
+    # [{"start": "09:00", "end": "18:00", "kbps": 512}, ...]; outside every
+    # window rate_limit_kbps applies (0 = no limit).
+    bandwidth_profiles: list[dict] = field(default_factory=list)
+    # Local stage timings/histograms; metrics_port > 0 also serves them on
+    # http://127.0.0.1:<port>/metrics (Prometheus) and /metrics.json.
+    metrics_enabled: bool = False
+    metrics_port: int = 0
+    # Skip items whose WAV (same media, same sample rate) is already in the
+    # output folder.
+    skip_existing: bool = True
+    # Several outputs from one download and one decode, e.g.
+    # [{"sample_rate": 44100}, {"sample_rate": 48000, "bit_depth": 24}];
+    # empty means a single WAV at sample_rate.
+    output_variants: list[dict] = field(default_factory=list)
+    # ffmpeg is killed after this many seconds without progress; 0 disables.
+    ffmpeg_timeout: int = 120
+    # Downloads that fail with a transient error (429, 5xx, timeout, reset)
+    # are retried up to max_retries times after a jittered exponential
+    # backoff of retry_base_delay * 2**n seconds, capped at retry_max_delay.
+    max_retries: int = 3
+    retry_base_delay: float = 2.0
+    retry_max_delay: float = 300.0
+    # After breaker_threshold such failures in a row a source gets no new
+    # downloads for breaker_cooldown seconds, then a single probe.
+    breaker_threshold: int = 5
+    breaker_cooldown: float = 60.0
 
 
 DEFAULT_CONFIG = AppConfig(
@@ -23,11 +62,7 @@ DEFAULT_CONFIG = AppConfig(
 
 
 def get_config_path() -> Path:
-    appdata = os.getenv("APPDATA")
-    base_dir = Path(appdata) if appdata else Path.home() / ".config"
-    config_dir = base_dir / "PermittedAudioDownloader"
-    config_dir.mkdir(parents=True, exist_ok=True)
-    return config_dir / "config.json"
+    return get_app_data_dir() / "config.json"
 
 
 def load_config() -> AppConfig:
@@ -42,8 +77,53 @@ def load_config() -> AppConfig:
             preserve_name=bool(data.get("preserve_name", DEFAULT_CONFIG.preserve_name)),
             overwrite=bool(data.get("overwrite", DEFAULT_CONFIG.overwrite)),
             sample_rate=int(data.get("sample_rate", DEFAULT_CONFIG.sample_rate)),
+            max_workers=int(data.get("max_workers", DEFAULT_CONFIG.max_workers)),
+            conversion_queue_size=int(
+                data.get("conversion_queue_size", DEFAULT_CONFIG.conversion_queue_size)
+            ),
+            conversion_workers=int(
+                data.get("conversion_workers", DEFAULT_CONFIG.conversion_workers)
+            ),
+            stream_to_ffmpeg=bool(data.get("stream_to_ffmpeg", DEFAULT_CONFIG.stream_to_ffmpeg)),
+            download_segments=int(
+                data.get("download_segments", DEFAULT_CONFIG.download_segments)
+            ),
+            cache_enabled=bool(data.get("cache_enabled", DEFAULT_CONFIG.cache_enabled)),
+            cache_max_mb=int(data.get("cache_max_mb", DEFAULT_CONFIG.cache_max_mb)),
+            metadata_workers=int(data.get("metadata_workers", DEFAULT_CONFIG.metadata_workers)),
+            persist_queue=bool(data.get("persist_queue", DEFAULT_CONFIG.persist_queue)),
+            source_limits={
+                str(source): int(limit)
+                for source, limit in dict(
+                    data.get("source_limits", DEFAULT_CONFIG.source_limits)
+                ).items()
+            },
+            rate_limit_kbps=int(data.get("rate_limit_kbps", DEFAULT_CONFIG.rate_limit_kbps)),
+            bandwidth_profiles=[
+                dict(profile)
+                for profile in data.get("bandwidth_profiles", DEFAULT_CONFIG.bandwidth_profiles)
+            ],
+            metrics_enabled=bool(data.get("metrics_enabled", DEFAULT_CONFIG.metrics_enabled)),
+            metrics_port=int(data.get("metrics_port", DEFAULT_CONFIG.metrics_port)),
+            skip_existing=bool(data.get("skip_existing", DEFAULT_CONFIG.skip_existing)),
+            output_variants=[
+                dict(variant)
+                for variant in data.get("output_variants", DEFAULT_CONFIG.output_variants)
+            ],
+            ffmpeg_timeout=int(data.get("ffmpeg_timeout", DEFAULT_CONFIG.ffmpeg_timeout)),
+            max_retries=int(data.get("max_retries", DEFAULT_CONFIG.max_retries)),
+            retry_base_delay=float(
+                data.get("retry_base_delay", DEFAULT_CONFIG.retry_base_delay)
+            ),
+            retry_max_delay=float(data.get("retry_max_delay", DEFAULT_CONFIG.retry_max_delay)),
+            breaker_threshold=int(
+                data.get("breaker_threshold", DEFAULT_CONFIG.breaker_threshold)
+            ),
+            breaker_cooldown=float(
+                data.get("breaker_cooldown", DEFAULT_CONFIG.breaker_cooldown)
+            ),
         )
-    except (json.JSONDecodeError, OSError, ValueError):
+    except (json.JSONDecodeError, OSError, ValueError, TypeError):
         return DEFAULT_CONFIG
 
 
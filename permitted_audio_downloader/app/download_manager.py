@@ -1,120 +1,263 @@
 from __future__ import annotations
 
-import tempfile
-from dataclasses import dataclass
-from pathlib import Path
+import heapq
+import time
+from collections import deque
+from functools import partial
 from typing import Optional
 
 from PySide6 import QtCore
 
-from permitted_audio_downloader.app import ffmpeg_service
-from permitted_audio_downloader.app.utils import resolve_output_path, sanitize_filename
+from permitted_audio_downloader.app import ffmpeg_service, ytdlp_service
+from permitted_audio_downloader.app.bandwidth import parse_profiles
+from permitted_audio_downloader.app.job_db import JobDatabase, get_job_db_path
+from permitted_audio_downloader.app.job_store import JobStore
+from permitted_audio_downloader.app.library import OutputCatalog, get_catalog_path
+from permitted_audio_downloader.app.logging_setup import job_logging
+from permitted_audio_downloader.app.metadata import MetadataPrefetcher
+from permitted_audio_downloader.app.metrics import ATTEMPT_BUCKETS, MetricsServer, get_metrics
+from permitted_audio_downloader.app.models import (
+    PAUSED_STATUS,
+    RETRY_STATUS,
+    TERMINAL_STATUSES,
+    DownloadItem,
+    OutputVariant,
+)
+from permitted_audio_downloader.app.pipeline import (
+    ConversionJob,
+    HandoffQueue,
+    apply_info,
+    convert_stage,
+    existing_outputs,
+    failure_status,
+    fetch_stage,
+)
+from permitted_audio_downloader.app.scheduler import (
+    CircuitBreaker,
+    SlotLimiter,
+    backoff_delay,
+    is_retryable,
+)
+from permitted_audio_downloader.app.source_cache import SourceCache, get_cache_dir
+from permitted_audio_downloader.app.staging import StagingArea, get_staging_dir
+from permitted_audio_downloader.app.utils import format_size
 from permitted_audio_downloader.app.validators import (
     ValidationError,
+    canonicalize_url,
     get_source_label,
     validate_url,
 )
-from permitted_audio_downloader.app.ytdlp_service import download_audio
-
-
-@dataclass
-class DownloadItem:
-    url: str
-    status: str = "Na fila"
-    title: str = ""
-    source: str = ""
-    progress: float = 0.0
-    output_path: str = ""
 
 
 class DownloadWorker(QtCore.QObject):
     progress_changed = QtCore.Signal(int, float)
     status_changed = QtCore.Signal(int, str)
     info_resolved = QtCore.Signal(int, str, str)
+    handed_off = QtCore.Signal(int, object)
     finished = QtCore.Signal(int, bool, str)
-    log = QtCore.Signal(str)
+    log = QtCore.Signal(int, str)
 
-    def __init__(self, index: int, item: DownloadItem, options: dict):
+    def __init__(
+        self,
+        job_id: int,
+        item: DownloadItem,
+        options: dict,
+        handoff: HandoffQueue,
+        cache: Optional[SourceCache] = None,
+        metadata: Optional[MetadataPrefetcher] = None,
+        staging_dir: Optional[str] = None,
+        catalog: Optional[OutputCatalog] = None,
+    ):
         super().__init__()
-        self.index = index
+        self.job_id = job_id
         self.item = item
         self.options = options
+        self.handoff = handoff
+        self.cache = cache
+        self.metadata = metadata
+        self.staging_dir = staging_dir
+        self.catalog = catalog
         self._cancelled = False
+        self._paused = False
+        self._last_percent = -1
+        # Read by the manager when finished arrives, to decide on a retry.
+        self.retryable = False
 
     def cancel(self) -> None:
         self._cancelled = True
 
-    def _check_cancelled(self) -> None:
-        if self._cancelled:
-            raise RuntimeError("Download cancelado")
+    def pause(self) -> None:
+        self._paused = True
+
+    def _is_cancelled(self) -> bool:
+        return self._cancelled
+
+    def _is_paused(self) -> bool:
+        return self._paused
+
+    def _is_stopping(self) -> bool:
+        return self._cancelled or self._paused
 
     def _set_status(self, status: str) -> None:
         self.item.status = status
-        self.status_changed.emit(self.index, status)
+        self.status_changed.emit(self.job_id, status)
+
+    def _report_progress(self, percent: float) -> None:
+        # The view reads item.progress on its own refresh tick; the signal is
+        # only needed to mark the row dirty, so whole-percent steps are enough.
+        self.item.progress = percent
+        if int(percent) != self._last_percent:
+            self._last_percent = int(percent)
+            self.progress_changed.emit(self.job_id, percent)
+
+    def _emit_info(self) -> None:
+        self.info_resolved.emit(self.job_id, self.item.title, self.item.source)
+
+    def _complete(self) -> None:
+        self._report_progress(100.0)
+        self._set_status("Concluído")
+        self.finished.emit(self.job_id, True, "Concluído")
 
     def run(self) -> None:
+        with job_logging(self.job_id):
+            self._run()
+
+    def _run(self) -> None:
         try:
-            validate_url(self.item.url)
+            with get_metrics().span("validate", self.item.timings):
+                validate_url(self.item.url)
             self.item.source = get_source_label(self.item.url)
+            existing = existing_outputs(self.item, self.options, self.catalog)
+            if existing:
+                self.item.output_paths = {key: str(path) for key, path in existing.items()}
+                self.item.output_path = str(next(iter(existing.values())))
+                self.log.emit(
+                    self.job_id,
+                    f"Item {self.job_id} já existe em {self.item.output_path}; download ignorado"
+                )
+                self._complete()
+                return
             self._set_status("Baixando")
+            job = fetch_stage(
+                self.job_id,
+                self.item,
+                self.options,
+                on_progress=self._report_progress,
+                is_cancelled=self._is_cancelled,
+                on_info=self._emit_info,
+                cache=self.cache,
+                prefetched=(
+                    partial(self.metadata.take, self.item.url, is_cancelled=self._is_stopping)
+                    if self.metadata
+                    else None
+                ),
+                staging_dir=self.staging_dir,
+                is_paused=self._is_paused,
+                catalog=self.catalog,
+            )
+            if job is None:
+                self._complete()
+                return
 
-            with tempfile.TemporaryDirectory() as temp_dir:
-                def hook(data: dict) -> None:
-                    if data.get("status") == "downloading":
-                        downloaded = data.get("downloaded_bytes") or 0
-                        total = data.get("total_bytes") or data.get("total_bytes_estimate") or 0
-                        percent = (downloaded / total * 100) if total else 0.0
-                        self.progress_changed.emit(self.index, percent)
-                    self._check_cancelled()
-
-                info = download_audio(
-                    self.item.url,
-                    temp_dir,
-                    progress_callback=hook,
-                    ffmpeg_location=self.options.get("ffmpeg_bin_dir"),
-                )
-                self._check_cancelled()
-                title = info.get("title") or "audio"
-                uploader = info.get("uploader") or ""
-                self.item.title = title
-                self.info_resolved.emit(self.index, title, self.item.source)
-
-                filename = title
-                if self.options["preserve_name"] and uploader:
-                    filename = f"{uploader} - {title}"
-                filename = sanitize_filename(filename)
-                output_path = resolve_output_path(
-                    self.options["output_dir"],
-                    filename,
-                    self.options["overwrite"],
-                )
+            self._emit_info()
+            self._set_status("Aguardando conversão")
+            try:
+                self.handoff.put(job, self._is_cancelled)
+            except Exception:
+                job.cleanup()
+                raise
+            self.handed_off.emit(self.job_id, job)
+        except Exception as exc:
+            status, message = failure_status(exc)
+            self.retryable = status == "Falhou" and is_retryable(exc)
+            self._set_status(status)
+            self.finished.emit(self.job_id, False, message)
 
-                requested = info.get("requested_downloads") or []
-                filepath = (
-                    requested[0].get("filepath") if requested else info.get("filepath")
-                ) or info.get("_filename")
-                if not filepath:
-                    raise RuntimeError("Arquivo de download não localizado")
-                downloaded_path = Path(filepath)
-                ffmpeg_service.convert_to_wav(
-                    str(downloaded_path),
-                    str(output_path),
-                    self.options["sample_rate"],
-                )
-                self.item.output_path = str(output_path)
-                self.progress_changed.emit(self.index, 100.0)
-                self._set_status("Concluído")
-                self.finished.emit(self.index, True, "Concluído")
-        except ValidationError as exc:
-            self._set_status("Falhou")
-            self.finished.emit(self.index, False, str(exc))
+
+class ConversionWorker(QtCore.QObject):
+    progress_changed = QtCore.Signal(int, float)
+    status_changed = QtCore.Signal(int, str)
+    finished = QtCore.Signal(int, bool, str)
+    stopped = QtCore.Signal()
+
+    def __init__(self, handoff: HandoffQueue, pool: ffmpeg_service.ConversionPool):
+        super().__init__()
+        self.handoff = handoff
+        self.pool = pool
+
+    def _set_status(self, job: ConversionJob, status: str) -> None:
+        job.item.status = status
+        self.status_changed.emit(job.index, status)
+
+    def _on_progress(self, job: ConversionJob, percent: float) -> None:
+        # ffmpeg reports twice a second; only whole-percent steps reach the UI.
+        if int(percent) > int(job.item.progress):
+            job.item.progress = percent
+            self.progress_changed.emit(job.index, percent)
+
+    def _convert(self, job: ConversionJob) -> None:
+        with job_logging(job.index):
+            self._run_job(job)
+
+    def _run_job(self, job: ConversionJob) -> None:
+        try:
+            self._set_status(job, "Convertendo")
+            job.item.progress = 0.0
+            self.progress_changed.emit(job.index, 0.0)
+            convert_stage(job, partial(self._on_progress, job), threads=self.pool.threads)
+            job.item.progress = 100.0
+            self.progress_changed.emit(job.index, 100.0)
+            self._set_status(job, "Concluído")
+            self.finished.emit(job.index, True, "Concluído")
         except Exception as exc:
-            if "cancelado" in str(exc).lower():
-                self._set_status("Cancelado")
-                self.finished.emit(self.index, False, "Cancelado")
-            else:
-                self._set_status("Falhou")
-                self.finished.emit(self.index, False, str(exc))
+            status, message = failure_status(exc)
+            self._set_status(job, status)
+            self.finished.emit(job.index, False, message)
+        finally:
+            job.cleanup()
+
+    def run(self) -> None:
+        # Hands jobs to the pool in arrival order; the pool's slots run them.
+        while True:
+            job = self.handoff.get()
+            if job is None:
+                break
+            self.pool.submit(partial(self._convert, job))
+        self.pool.shutdown()
+        self.stopped.emit()
+
+
+class PlaylistExpander(QtCore.QObject):
+    page_ready = QtCore.Signal(int, object)
+    finished = QtCore.Signal(int, bool, str)
+
+    def __init__(self, expander_id: int, url: str, options: dict):
+        super().__init__()
+        self.expander_id = expander_id
+        self.url = url
+        self.options = options
+        self._cancelled = False
+
+    def cancel(self) -> None:
+        self._cancelled = True
+
+    def run(self) -> None:
+        count = 0
+        try:
+            pages = ytdlp_service.iter_playlist_pages(
+                self.url,
+                self.options.get("playlist_page_size", 25),
+                ffmpeg_location=self.options.get("ffmpeg_bin_dir"),
+            )
+            for page in pages:
+                if self._cancelled:
+                    pages.close()
+                    break
+                count += len(page)
+                self.page_ready.emit(self.expander_id, page)
+            self.finished.emit(self.expander_id, True, f"{count} itens listados")
+        except Exception as exc:
+            self.finished.emit(self.expander_id, False, str(exc))
 
 
 class DownloadManager(QtCore.QObject):
@@ -124,60 +267,607 @@ class DownloadManager(QtCore.QObject):
     item_info = QtCore.Signal(int, str, str)
     item_finished = QtCore.Signal(int, bool, str)
     log_message = QtCore.Signal(str)
+    job_log = QtCore.Signal(int, str)
     queue_empty = QtCore.Signal()
+    _metadata_resolved = QtCore.Signal(int, object)
 
     def __init__(self, options: dict):
         super().__init__()
         self.options = options
-        self.items: list[DownloadItem] = []
-        self._thread: Optional[QtCore.QThread] = None
-        self._worker: Optional[DownloadWorker] = None
+        self.store = JobStore()
+        # (source, media id) -> job that downloads it; see find_duplicate().
+        self._media_jobs: dict[tuple[str, str], int] = {}
+        self._threads: dict[int, QtCore.QThread] = {}
+        self._workers: dict[int, DownloadWorker] = {}
+        self._conversions: dict[int, ConversionJob] = {}
+        self._limiter = SlotLimiter(
+            options.get("max_workers", 1),
+            options.get("source_limits"),
+        )
+        self._breaker = CircuitBreaker(
+            options.get("breaker_threshold", 5), options.get("breaker_cooldown", 60)
+        )
+        # (monotonic due time, job id) for items waiting out a backoff; one
+        # timer wakes the queue for the earliest of these or of a breaker
+        # cooldown, so no worker slot is held while waiting.
+        self._retry_due: list[tuple[float, int]] = []
+        self._retry_timer = QtCore.QTimer(self)
+        self._retry_timer.setSingleShot(True)
+        self._retry_timer.timeout.connect(self._on_retry_timer)
+        self._handoff = HandoffQueue(options.get("conversion_queue_size", 2))
+        self._cache: Optional[SourceCache] = None
+        self._configure_cache(options)
+        self._metadata = MetadataPrefetcher(
+            self._extract_metadata,
+            max_workers=options.get("metadata_workers", 2),
+        )
+        self._metadata_resolved.connect(self._apply_metadata)
+        self._resize_session_pool(options)
+        self._configure_bandwidth(options)
+        self._metrics_server: Optional[MetricsServer] = None
+        self._configure_metrics(options)
+        self._conversion_thread: Optional[QtCore.QThread] = None
+        self._conversion_worker: Optional[ConversionWorker] = None
+        self._conversion_pool: Optional[ffmpeg_service.ConversionPool] = None
+        self._expanders: dict[int, tuple[QtCore.QThread, PlaylistExpander]] = {}
+        self._next_expander_id = 0
+        self._prefetch_pending: deque[int] = deque()
+        self._prefetch_window: set[int] = set()
+        self._running = False
+        self._staging = StagingArea(get_staging_dir())
+        self._catalog = OutputCatalog(get_catalog_path())
+        self._db: Optional[JobDatabase] = None
+        if options.get("persist_queue", True):
+            self._db = JobDatabase(get_job_db_path())
+            self.item_status.connect(self._persist_status)
+            self.item_info.connect(self._persist_info)
+            self.item_finished.connect(self._persist_finished)
+        else:
+            # Ids restart with every session, so leftovers can't be matched.
+            self._staging.prune(keep=())
 
-    def add_item(self, url: str) -> int:
-        item = DownloadItem(url=url, source=get_source_label(url))
-        self.items.append(item)
-        index = len(self.items) - 1
-        self.item_updated.emit(index, item)
-        return index
+    def restore(self) -> int:
+        if self._db is None:
+            return 0
+        rows = self._db.load_unfinished()
+        self._staging.prune(keep=[row["id"] for row in rows])
+        for row in rows:
+            item = DownloadItem(
+                url=row["url"],
+                status=row["status"],
+                title=row["title"],
+                source=row["source"] or get_source_label(row["url"]),
+                duration=row["duration"],
+                filesize=row["filesize"],
+                attempts=row["attempts"],
+                job_id=row["id"],
+            )
+            self._enqueue(item)
+        self._prefetch_ahead()
+        return len(rows)
 
-    def start_next(self) -> None:
-        if self._thread and self._thread.isRunning():
+    def _persist(self, job_id: int) -> None:
+        item = self.store.get(job_id)
+        if self._db is None or item is None:
+            return
+        self._db.update(
+            job_id,
+            status=item.status,
+            title=item.title,
+            source=item.source,
+            duration=item.duration,
+            filesize=item.filesize,
+            output_path=item.output_path,
+            attempts=item.attempts,
+        )
+
+    def _persist_status(self, job_id: int, status: str) -> None:
+        self._persist(job_id)
+
+    def _persist_info(self, job_id: int, title: str, source: str) -> None:
+        self._persist(job_id)
+
+    def _persist_finished(self, job_id: int, success: bool, message: str) -> None:
+        self._persist(job_id)
+
+    def _enqueue(self, item: DownloadItem) -> int:
+        item.queued_at = time.perf_counter()
+        job_id = self.store.add(item)
+        key = canonicalize_url(item.url)
+        if key is not None:
+            self._media_jobs[key] = job_id
+        self._prefetch_pending.append(job_id)
+        self.item_updated.emit(job_id, item)
+        return job_id
+
+    def find_duplicate(self, url: str) -> Optional[int]:
+        # Only jobs still in progress count: submitting a finished one again
+        # starts a fresh job, e.g. at another sample rate or set of variants
+        # (one already on disk is then skipped by existing_outputs()).
+        key = canonicalize_url(url)
+        job_id = self._media_jobs.get(key) if key is not None else None
+        item = self.store.get(job_id) if job_id is not None else None
+        if item is None or item.status in TERMINAL_STATUSES:
+            return None
+        return job_id
+
+    def add_item(
+        self,
+        url: str,
+        info: Optional[dict] = None,
+        variants: Optional[list[OutputVariant]] = None,
+    ) -> int:
+        # Duplicates are merged onto the existing job, whose id is returned,
+        # so the caller receives that job's item_finished and output path.
+        duplicate = self.find_duplicate(url)
+        if duplicate is not None:
+            self.job_log.emit(duplicate, f"URL já está na fila como item {duplicate}: {url}")
+            return duplicate
+        item = DownloadItem(url=url, source=get_source_label(url), variants=list(variants or []))
+        if info:
+            apply_info(item, info)
+        if self._db is not None:
+            item.job_id = self._db.add(
+                url,
+                source=item.source,
+                title=item.title,
+                duration=item.duration,
+                filesize=item.filesize,
+            )
+        job_id = self._enqueue(item)
+        self._prefetch_ahead()
+        return job_id
+
+    def add_playlist(self, url: str) -> None:
+        expander_id = self._next_expander_id
+        self._next_expander_id += 1
+        thread = QtCore.QThread()
+        expander = PlaylistExpander(expander_id, url, self.options)
+        expander.moveToThread(thread)
+        self._expanders[expander_id] = (thread, expander)
+
+        thread.started.connect(expander.run)
+        expander.page_ready.connect(self._on_playlist_page)
+        expander.finished.connect(self._on_playlist_finished)
+        expander.finished.connect(thread.quit)
+        expander.finished.connect(expander.deleteLater)
+        thread.finished.connect(thread.deleteLater)
+        thread.start()
+
+    def _on_playlist_page(self, expander_id: int, page: list) -> None:
+        for url, info in page:
+            try:
+                validate_url(url)
+            except ValidationError as exc:
+                label = url or info.get("title") or "sem título"
+                self.log_message.emit(f"Item da playlist ignorado ({exc}): {label}")
+                continue
+            self.add_item(url, info)
+        if self._running:
+            self.start_next()
+
+    def _on_playlist_finished(self, expander_id: int, success: bool, message: str) -> None:
+        self._expanders.pop(expander_id, None)
+        if success:
+            self.log_message.emit(f"Playlist expandida: {message}")
+        else:
+            self.log_message.emit(f"Falha ao expandir playlist: {message}")
+        if self._running:
+            self.start_next()
+
+    def _prefetch_ahead(self) -> None:
+        # Only the next few queued items are resolved, so a long playlist does
+        # not hold thousands of full info dicts in memory.
+        lookahead = self.options.get("metadata_lookahead", 20)
+        while len(self._prefetch_window) < lookahead and self._prefetch_pending:
+            job_id = self._prefetch_pending.popleft()
+            item = self.store.get(job_id)
+            if item is None or item.status != "Na fila":
+                continue
+            self._prefetch_window.add(job_id)
+            self._metadata.submit(item.url, partial(self._on_metadata, job_id))
+
+    def _extract_metadata(self, url: str) -> dict:
+        with get_metrics().span("metadata_prefetch"):
+            return ytdlp_service.extract_info(
+                url, ffmpeg_location=self.options.get("ffmpeg_bin_dir")
+            )
+
+    def _on_metadata(self, job_id: int, url: str, compact, error) -> None:
+        # Runs on a prefetch thread; the signal hops back to the GUI thread.
+        if compact is not None:
+            self._metadata_resolved.emit(job_id, compact)
+
+    def _apply_metadata(self, job_id: int, compact: dict) -> None:
+        item = self.store.get(job_id)
+        if item is None or item.status in TERMINAL_STATUSES:
             return
-        next_index = next((i for i, item in enumerate(self.items) if item.status == "Na fila"), None)
-        if next_index is None:
+        apply_info(item, compact)
+        self.item_info.emit(job_id, item.title, item.source)
+
+    def active_count(self) -> int:
+        return len(self._workers)
+
+    def start(self) -> None:
+        self._running = True
+        self.start_next()
+
+    def start_next(self) -> None:
+        self._ensure_conversion_stage()
+        while self._limiter.has_free_slot():
+            item = self.store.pop_ready(self._can_dispatch)
+            if item is None:
+                break
+            self._limiter.acquire(item.source)
+            self._breaker.dispatched(item.source)
+            self._start_worker(item.job_id, item)
+        self._arm_retry_timer()
+
+        if (
+            not self._workers
+            and not self._conversions
+            and not self._expanders
+            and not self.store.count("Na fila")
+            and not self.store.count(RETRY_STATUS)
+        ):
+            self._running = False
+            stats = ffmpeg_service.get_conversion_stats()
+            if stats:
+                summary = ", ".join(f"{path}: {count}" for path, count in sorted(stats.items()))
+                self.log_message.emit(f"Caminhos de conversão: {summary}")
+            if self._conversion_pool is not None:
+                usage = self._conversion_pool.stats()
+                self.log_message.emit(
+                    f"Uso da conversão: {usage['utilization']:.0%} de {usage['workers']} slot(s)"
+                )
             self.queue_empty.emit()
+
+    def _can_dispatch(self, source: str) -> bool:
+        return self._limiter.can_acquire(source) and self._breaker.allow(source)
+
+    def _arm_retry_timer(self) -> None:
+        waits = [self._breaker.next_probe_in()]
+        if self._retry_due:
+            waits.append(self._retry_due[0][0] - time.monotonic())
+        waits = [max(0.0, wait) for wait in waits if wait is not None]
+        if waits:
+            self._retry_timer.start(int(min(waits) * 1000) + 1)
+        else:
+            self._retry_timer.stop()
+
+    def _on_retry_timer(self) -> None:
+        now = time.monotonic()
+        while self._retry_due and self._retry_due[0][0] <= now:
+            _, job_id = heapq.heappop(self._retry_due)
+            item = self.store.get(job_id)
+            # Cancelled, paused or removed while it waited.
+            if item is None or item.status != RETRY_STATUS:
+                continue
+            self._on_status(job_id, "Na fila")
+            item.queued_at = time.perf_counter()
+        if self._running:
+            self.start_next()
+        else:
+            self._arm_retry_timer()
+
+    def _schedule_retry(self, job_id: int, item: DownloadItem) -> bool:
+        max_attempts = 1 + int(self.options.get("max_retries", 3))
+        if item.attempts >= max_attempts:
+            return False
+        delay = backoff_delay(
+            item.attempts,
+            float(self.options.get("retry_base_delay", 2)),
+            float(self.options.get("retry_max_delay", 300)),
+        )
+        heapq.heappush(self._retry_due, (time.monotonic() + delay, job_id))
+        self._on_status(job_id, RETRY_STATUS)
+        self.job_log.emit(
+            job_id,
+            f"Item {job_id} falhou (tentativa {item.attempts} de {max_attempts}): "
+            f"{item.last_error}; nova tentativa em {delay:.1f}s",
+        )
+        return True
+
+    def _record_source_health(self, source: str, success: bool, retryable: bool) -> None:
+        if success:
+            self._breaker.record_success(source)
+        elif not retryable:
+            self._breaker.record_other(source)
+        elif self._breaker.record_failure(source):
+            self.log_message.emit(
+                f"Fonte {source} com falhas seguidas; novos downloads dela pausados por "
+                f"{self._breaker.cooldown:.0f}s antes de um teste"
+            )
+
+    def _ensure_conversion_stage(self) -> None:
+        if self._conversion_thread is not None:
             return
+        thread = QtCore.QThread()
+        pool = ffmpeg_service.ConversionPool(self.options.get("conversion_workers", 0))
+        worker = ConversionWorker(self._handoff, pool)
+        worker.moveToThread(thread)
+        self._conversion_thread = thread
+        self._conversion_worker = worker
+        self._conversion_pool = pool
+        self.log_message.emit(
+            f"Conversão: {pool.workers} slot(s), {pool.threads} thread(s) por ffmpeg"
+        )
+
+        thread.started.connect(worker.run)
+        worker.progress_changed.connect(self.item_progress)
+        worker.status_changed.connect(self._on_status)
+        worker.finished.connect(self._on_conversion_finished)
+        worker.stopped.connect(thread.quit)
+        thread.start()
+
+    def shutdown(self) -> None:
+        self._retry_timer.stop()
+        self._metadata.shutdown()
+        for thread, expander in list(self._expanders.values()):
+            expander.cancel()
+            thread.quit()
+            thread.wait()
+        for worker in self._workers.values():
+            worker.cancel()
+        for job in self._conversions.values():
+            job.cancelled = True
+        for thread in list(self._threads.values()):
+            thread.quit()
+            thread.wait()
+        if self._conversion_thread is not None:
+            self._handoff.close(discard=True)
+            # stopped -> quit is queued to this (blocked) thread, so quit here.
+            self._conversion_thread.quit()
+            self._conversion_thread.wait()
+            self._conversion_thread = None
+            self._conversion_worker = None
+            self._conversion_pool = None
+        ytdlp_service.get_session_pool().close()
+        if self._metrics_server is not None:
+            self._metrics_server.close()
+            self._metrics_server = None
+        self._catalog.close()
+        if self._cache is not None:
+            self._cache.close()
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def _start_worker(self, job_id: int, item: DownloadItem) -> None:
+        thread = QtCore.QThread()
+        worker = DownloadWorker(
+            job_id,
+            item,
+            self.options,
+            self._handoff,
+            self._cache,
+            self._metadata,
+            staging_dir=str(self._staging.path_for(job_id)),
+            catalog=self._catalog,
+        )
+        worker.moveToThread(thread)
+        self._threads[job_id] = thread
+        self._workers[job_id] = worker
+        # Leaves the ready queue right away so it can't be picked twice before
+        # the worker reports its own status.
+        self.store.set_status(job_id, "Baixando")
+        self._prefetch_window.discard(job_id)
+        self._prefetch_ahead()
+        item.attempts += 1
+        get_metrics().record("queue_wait", time.perf_counter() - item.queued_at, item.timings)
+        self._persist(job_id)
+
+        thread.started.connect(worker.run)
+        worker.progress_changed.connect(self.item_progress)
+        worker.status_changed.connect(self._on_status)
+        worker.info_resolved.connect(self.item_info)
+        worker.log.connect(self.job_log)
+        worker.handed_off.connect(self._on_handed_off)
+        worker.finished.connect(self._on_finished)
+        for done in (worker.handed_off, worker.finished):
+            done.connect(thread.quit)
+            done.connect(worker.deleteLater)
+        thread.finished.connect(partial(self._on_thread_finished, job_id))
+        thread.finished.connect(thread.deleteLater)
 
-        item = self.items[next_index]
-        self._thread = QtCore.QThread()
-        self._worker = DownloadWorker(next_index, item, self.options)
-        self._worker.moveToThread(self._thread)
+        thread.start()
 
-        self._thread.started.connect(self._worker.run)
-        self._worker.progress_changed.connect(self.item_progress)
-        self._worker.status_changed.connect(self.item_status)
-        self._worker.info_resolved.connect(self.item_info)
-        self._worker.finished.connect(self._on_finished)
-        self._worker.finished.connect(self._thread.quit)
-        self._worker.finished.connect(self._worker.deleteLater)
-        self._thread.finished.connect(self._thread.deleteLater)
+    def _on_thread_finished(self, job_id: int) -> None:
+        self._threads.pop(job_id, None)
 
-        self._thread.start()
+    def _on_status(self, job_id: int, status: str) -> None:
+        self.store.set_status(job_id, status)
+        self.item_status.emit(job_id, status)
 
-    def _on_finished(self, index: int, success: bool, message: str) -> None:
-        self.item_finished.emit(index, success, message)
+    def _release_worker(self, job_id: int) -> None:
+        worker = self._workers.pop(job_id, None)
+        if worker is not None:
+            self._limiter.release(worker.item.source)
+
+    def _on_handed_off(self, job_id: int, job: ConversionJob) -> None:
+        self._breaker.record_success(job.item.source)
+        self._release_worker(job_id)
+        if job.item.status not in TERMINAL_STATUSES:
+            self._conversions[job_id] = job
+        self.start_next()
+
+    def _on_finished(self, job_id: int, success: bool, message: str) -> None:
+        worker = self._workers.get(job_id)
+        retryable = worker is not None and worker.retryable
+        if worker is not None:
+            self._record_source_health(worker.item.source, success, retryable)
+        self._release_worker(job_id)
+        item = self.store.get(job_id)
+        if item is not None and item.status == "Falhou":
+            item.last_error = message
+            # Partial data stays staged, so the retry resumes it.
+            if retryable and self._schedule_retry(job_id, item):
+                self.start_next()
+                return
+        if item is not None and item.status == PAUSED_STATUS:
+            kept = format_size(self._staging.partial_bytes(job_id))
+            self.job_log.emit(job_id, f"Item {job_id} pausado; {kept} mantidos para retomar")
+        else:
+            self._staging.discard(job_id)
+        self._record_finished(job_id)
+        self.item_finished.emit(job_id, success, message)
         self.start_next()
 
-    def cancel_item(self, index: int) -> None:
-        if index < 0 or index >= len(self.items):
+    def _on_conversion_finished(self, job_id: int, success: bool, message: str) -> None:
+        job = self._conversions.pop(job_id, None)
+        if job is not None and job.item.status == "Falhou":
+            job.item.last_error = message
+        self._staging.discard(job_id)
+        self._record_finished(job_id)
+        self.item_finished.emit(job_id, success, message)
+        self.start_next()
+
+    def _record_finished(self, job_id: int) -> None:
+        metrics = get_metrics()
+        item = self.store.get(job_id)
+        if item is not None:
+            # Normally taken by the worker already; this covers jobs that
+            # ended before they got to it.
+            self._metadata.forget(item.url)
+        if not metrics.enabled or item is None:
+            return
+        metrics.inc("jobs_total", result=item.status)
+        if item.status in TERMINAL_STATUSES:
+            metrics.observe("job_attempts", item.attempts, ATTEMPT_BUCKETS)
+        if item.timings:
+            stages = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in item.timings.items())
+            self.job_log.emit(job_id, f"Item {job_id} ({item.status}): {stages}")
+
+    def pause_item(self, job_id: int) -> None:
+        item = self.store.get(job_id)
+        if item is None:
             return
-        item = self.items[index]
-        if item.status == "Na fila":
-            item.status = "Cancelado"
-            self.item_status.emit(index, "Cancelado")
+        worker = self._workers.get(job_id)
+        if worker is not None:
+            if item.status == "Baixando":
+                worker.pause()
+            return
+        if item.status in ("Na fila", RETRY_STATUS):
+            self._on_status(job_id, PAUSED_STATUS)
+
+    def resume_item(self, job_id: int) -> None:
+        item = self.store.get(job_id)
+        # The worker that paused it may not have reported back yet.
+        if item is None or item.status != PAUSED_STATUS or job_id in self._workers:
+            return
+        self._on_status(job_id, "Na fila")
+        item.queued_at = time.perf_counter()
+        self._prefetch_pending.append(job_id)
+        self._prefetch_ahead()
+        if self._running:
+            self.start_next()
+
+    def pause_all(self) -> None:
+        self._running = False
+        for job_id in sorted(self.store.ids_with_status("Na fila", RETRY_STATUS)):
+            self._on_status(job_id, PAUSED_STATUS)
+        for job_id, worker in self._workers.items():
+            if worker.item.status == "Baixando":
+                worker.pause()
+
+    def resume_all(self) -> None:
+        for job_id in sorted(self.store.ids_with_status(PAUSED_STATUS)):
+            self.resume_item(job_id)
+        self.start()
+
+    def cancel_item(self, job_id: int) -> None:
+        item = self.store.get(job_id)
+        if item is None:
+            return
+        if item.status in ("Na fila", RETRY_STATUS, PAUSED_STATUS) and job_id not in self._workers:
+            self._on_status(job_id, "Cancelado")
+            self._staging.discard(job_id)
+            if job_id in self._prefetch_window:
+                self._prefetch_window.discard(job_id)
+                self._metadata.forget(item.url)
+                self._prefetch_ahead()
+            return
+        worker = self._workers.get(job_id)
+        if worker is not None:
+            worker.cancel()
+            return
+        job = self._conversions.get(job_id)
+        if job is not None:
+            job.cancelled = True
+
+    def _configure_cache(self, options: dict) -> None:
+        if not options.get("cache_enabled", False):
+            if self._cache is not None:
+                self._cache.close()
+            self._cache = None
+            return
+        max_bytes = int(options.get("cache_max_mb", 2048)) * 1024 * 1024
+        if self._cache is None:
+            self._cache = SourceCache(get_cache_dir(), max_bytes)
+        else:
+            self._cache.max_bytes = max_bytes
+
+    def _resize_session_pool(self, options: dict) -> None:
+        # Workers and metadata prefetch threads may all hold a session at once.
+        size = options.get("max_workers", 1) + options.get("metadata_workers", 2)
+        ytdlp_service.get_session_pool().resize(size)
+
+    def clear_finished(self) -> int:
+        # Only terminal jobs are removed, so running workers keep their ids
+        # and late signals for removed ids are simply ignored.
+        removed = self.store.remove_finished()
+        for item in removed:
+            self._prefetch_window.discard(item.job_id)
+            key = canonicalize_url(item.url)
+            if key is not None and self._media_jobs.get(key) == item.job_id:
+                del self._media_jobs[key]
+        if self._db is not None:
+            self._db.delete([item.job_id for item in removed])
+        return len(removed)
+
+    def _configure_bandwidth(self, options: dict) -> None:
+        # Takes effect on the next chunk of every running download.
+        ytdlp_service.get_bandwidth_limiter().configure(
+            int(options.get("rate_limit_kbps", 0)) * 1024,
+            parse_profiles(options.get("bandwidth_profiles")),
+        )
+
+    def _configure_metrics(self, options: dict) -> None:
+        enabled = bool(options.get("metrics_enabled", False))
+        get_metrics().enabled = enabled
+        port = int(options.get("metrics_port", 0)) if enabled else 0
+        server = self._metrics_server
+        if server is not None and server.port != port:
+            server.close()
+            self._metrics_server = None
+        if port and self._metrics_server is None:
+            try:
+                self._metrics_server = MetricsServer(port)
+            except OSError as exc:
+                self.log_message.emit(f"Endpoint de métricas indisponível na porta {port}: {exc}")
+                return
+            self.log_message.emit(f"Métricas em http://127.0.0.1:{port}/metrics")
+
+    def throughput(self) -> float:
+        return ytdlp_service.get_bandwidth_limiter().throughput()
+
+    def current_rate_limit(self) -> int:
+        return ytdlp_service.get_bandwidth_limiter().current_rate()
+
+    def set_priority(self, job_id: int, priority: str) -> None:
+        item = self.store.get(job_id)
+        if item is None or item.priority == priority:
             return
-        if self._worker and self._worker.index == index:
-            self._worker.cancel()
+        item.priority = priority
+        self.item_info.emit(job_id, item.title, item.source)
 
     def update_options(self, options: dict) -> None:
         self.options = options
+        self._limiter.configure(options.get("max_workers", 1), options.get("source_limits"))
+        self._breaker.configure(
+            options.get("breaker_threshold", 5), options.get("breaker_cooldown", 60)
+        )
+        self._configure_cache(options)
+        self._resize_session_pool(options)
+        self._configure_bandwidth(options)
+        self._configure_metrics(options)
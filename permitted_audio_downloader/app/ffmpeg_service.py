@@ -1,9 +1,53 @@
+import contextvars
+import json
+import logging
+import os
+import shutil
+import struct
 import subprocess
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+from dataclasses import dataclass
 from pathlib import Path
+from typing import Callable, Iterable, Optional
 
 
+from permitted_audio_downloader.app.metrics import get_metrics
+from permitted_audio_downloader.app.models import OutputVariant
 from permitted_audio_downloader.app.utils import get_ffmpeg_bin_dir
 
+TARGET_CODEC = "pcm_s16le"
+PROBE_CACHE_SIZE = 256
+POLL_INTERVAL = 0.1
+STDERR_TAIL_LINES = 20
+
+ProgressCallback = Callable[[float], None]
+CancelCheck = Callable[[], bool]
+
+logger = logging.getLogger("permitted_audio_downloader.ffmpeg")
+
+# Conversion paths, cheapest first.
+PATH_COPY = "copy"
+PATH_REMUX = "remux"
+PATH_DECODE = "decode"
+PATH_TRANSCODE = "transcode"
+# Several variants from one decode.
+PATH_MULTI = "multi"
+
+# (container, bit depth) -> (encoder, sample_fmt or None)
+ENCODERS = {
+    ("wav", 16): ("pcm_s16le", None),
+    ("wav", 24): ("pcm_s24le", None),
+    ("wav", 32): ("pcm_s32le", None),
+    ("aiff", 16): ("pcm_s16be", None),
+    ("aiff", 24): ("pcm_s24be", None),
+    ("aiff", 32): ("pcm_s32be", None),
+    ("flac", 16): ("flac", "s16"),
+    ("flac", 24): ("flac", "s32"),
+}
+
 
 class FfmpegNotFoundError(FileNotFoundError):
     pass
@@ -13,9 +57,7 @@ def find_ffmpeg() -> str:
     bin_dir = get_ffmpeg_bin_dir()
     if bin_dir:
         return str(bin_dir / "ffmpeg.exe")
-    from shutil import which
-
-    in_path = which("ffmpeg")
+    in_path = shutil.which("ffmpeg")
     if in_path:
         return in_path
     raise FfmpegNotFoundError(
@@ -24,19 +66,490 @@ def find_ffmpeg() -> str:
     )
 
 
-def convert_to_wav(input_path: str, output_path: str, sample_rate: int) -> None:
-    ffmpeg = find_ffmpeg()
+def find_ffprobe() -> str | None:
+    bin_dir = get_ffmpeg_bin_dir()
+    if bin_dir:
+        return str(bin_dir / "ffprobe.exe")
+    return shutil.which("ffprobe")
+
+
+@dataclass(frozen=True)
+class ProbeResult:
+    format_name: str
+    codec_name: str
+    sample_rate: int
+    channels: int
+
+
+_probe_cache: OrderedDict[tuple[str, int, int], ProbeResult | None] = OrderedDict()
+_path_counts: Counter[str] = Counter()
+_stats_lock = threading.Lock()
+
+
+def _run_ffprobe(input_path: str) -> ProbeResult | None:
+    ffprobe = find_ffprobe()
+    if not ffprobe:
+        return None
     command = [
-        ffmpeg,
-        "-y",
-        "-i",
+        ffprobe,
+        "-v",
+        "error",
+        "-select_streams",
+        "a:0",
+        "-show_entries",
+        "stream=codec_name,sample_rate,channels:format=format_name",
+        "-of",
+        "json",
         input_path,
-        "-acodec",
-        "pcm_s16le",
-        "-ar",
-        str(sample_rate),
-        output_path,
     ]
     result = subprocess.run(command, capture_output=True, text=True)
     if result.returncode != 0:
-        raise RuntimeError(result.stderr.strip() or "Falha na conversão com ffmpeg")
+        return None
+    try:
+        data = json.loads(result.stdout or "{}")
+        stream = (data.get("streams") or [{}])[0]
+        return ProbeResult(
+            format_name=data.get("format", {}).get("format_name", ""),
+            codec_name=stream.get("codec_name", ""),
+            sample_rate=int(stream.get("sample_rate") or 0),
+            channels=int(stream.get("channels") or 0),
+        )
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def probe_audio(input_path: str) -> ProbeResult | None:
+    stat = os.stat(input_path)
+    key = (os.path.abspath(input_path), stat.st_size, stat.st_mtime_ns)
+    with _stats_lock:
+        if key in _probe_cache:
+            _probe_cache.move_to_end(key)
+            return _probe_cache[key]
+    probe = _run_ffprobe(input_path)
+    with _stats_lock:
+        _probe_cache[key] = probe
+        while len(_probe_cache) > PROBE_CACHE_SIZE:
+            _probe_cache.popitem(last=False)
+    return probe
+
+
+def choose_conversion_path(probe: ProbeResult | None, sample_rate: int) -> str:
+    if probe is None:
+        return PATH_TRANSCODE
+    if probe.sample_rate != sample_rate:
+        return PATH_TRANSCODE
+    if probe.codec_name != TARGET_CODEC:
+        return PATH_DECODE
+    if probe.format_name == "wav":
+        return PATH_COPY
+    return PATH_REMUX
+
+
+def get_conversion_stats() -> dict[str, int]:
+    with _stats_lock:
+        return dict(_path_counts)
+
+
+def _record_path(path: str) -> None:
+    with _stats_lock:
+        _path_counts[path] += 1
+
+
+def _wav_command(
+    ffmpeg: str,
+    input_path: str,
+    output_path: str,
+    sample_rate: int,
+    path: str = PATH_TRANSCODE,
+) -> list[str]:
+    command = [ffmpeg, "-y", "-i", input_path]
+    if path == PATH_REMUX:
+        command += ["-acodec", "copy"]
+    else:
+        command += ["-acodec", TARGET_CODEC]
+    if path == PATH_TRANSCODE:
+        command += ["-ar", str(sample_rate)]
+    command.append(output_path)
+    return command
+
+
+class FfmpegCancelled(RuntimeError):
+    def __init__(self) -> None:
+        super().__init__("Conversão cancelada")
+
+
+class FfmpegTimeout(RuntimeError):
+    def __init__(self, seconds: float) -> None:
+        super().__init__(f"ffmpeg sem progresso por {seconds:g}s; conversão interrompida")
+
+
+def run_ffmpeg(
+    command: list[str],
+    duration: float = 0.0,
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+    timeout: float = 0.0,
+    threads: int = 0,
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+) -> None:
+    # -progress writes key=value blocks to stdout about twice a second while
+    # ffmpeg makes progress; out_time_us against the source duration is the
+    # percentage, and a silence longer than timeout means ffmpeg is stuck.
+    # A watchdog kills the process within POLL_INTERVAL of a cancel or a
+    # stall, which also unblocks a write to stdin when input is streamed.
+    options = ["-hide_banner", "-nostats", "-loglevel", "warning", "-progress", "pipe:1"]
+    if threads:
+        # Before the first -i, so it caps the decoder as well as the filters.
+        options += ["-threads", str(threads), "-filter_threads", str(threads)]
+    command = [command[0], *options, *command[1:]]
+    process = subprocess.Popen(
+        command,
+        stdin=subprocess.DEVNULL if stdin_chunks is None else subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    tail: deque[str] = deque(maxlen=STDERR_TAIL_LINES)
+    last_activity = time.monotonic()
+    stopped: list[RuntimeError] = []
+
+    def read_progress() -> None:
+        nonlocal last_activity
+        for raw in process.stdout:
+            last_activity = time.monotonic()
+            key, _, value = raw.decode("ascii", errors="replace").strip().partition("=")
+            if key != "out_time_us" or on_progress is None or duration <= 0:
+                continue
+            try:
+                seconds = int(value) / 1_000_000
+            except ValueError:
+                continue
+            on_progress(min(100.0, max(0.0, seconds / duration * 100)))
+
+    def read_stderr() -> None:
+        for raw in process.stderr:
+            line = raw.decode("utf-8", errors="replace").rstrip()
+            if line:
+                tail.append(line)
+                logger.info("ffmpeg: %s", line)
+
+    def watch() -> None:
+        while process.poll() is None:
+            if is_cancelled is not None and is_cancelled():
+                stopped.append(FfmpegCancelled())
+            elif timeout and time.monotonic() - last_activity > timeout:
+                stopped.append(FfmpegTimeout(timeout))
+            if stopped:
+                process.kill()
+                return
+            time.sleep(POLL_INTERVAL)
+
+    # Each reader runs in a copy of the caller's context, so its log lines
+    # carry the caller's current job.
+    workers = [
+        threading.Thread(
+            target=contextvars.copy_context().run, args=(target,), name=name, daemon=True
+        )
+        for target, name in (
+            (read_progress, "ffmpeg-progress"),
+            (read_stderr, "ffmpeg-stderr"),
+            (watch, "ffmpeg-watchdog"),
+        )
+    ]
+    for thread in workers:
+        thread.start()
+    try:
+        if stdin_chunks is not None:
+            try:
+                for chunk in stdin_chunks:
+                    # Input arriving counts as activity: a slow download
+                    # mustn't look like a stuck ffmpeg.
+                    last_activity = time.monotonic()
+                    process.stdin.write(chunk)
+                    if stopped:
+                        break
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                # ffmpeg exited or was killed; its status says which.
+                pass
+        process.wait()
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        for thread in workers:
+            thread.join()
+    if stopped:
+        raise stopped[0]
+    if process.returncode != 0:
+        raise RuntimeError("\n".join(tail) or "Falha na conversão com ffmpeg")
+    if on_progress is not None:
+        on_progress(100.0)
+
+
+# LOGICAL_PROCESSOR_RELATIONSHIP.RelationProcessorCore
+RELATION_PROCESSOR_CORE = 0
+
+
+def _linux_physical_cores() -> int:
+    cores: set[tuple[str, str]] = set()
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as handle:
+            package = ""
+            for line in handle:
+                key, _, value = line.partition(":")
+                key = key.strip()
+                if key == "physical id":
+                    package = value.strip()
+                elif key == "core id":
+                    cores.add((package, value.strip()))
+    except OSError:
+        return 0
+    return len(cores)
+
+
+def _count_core_records(buffer: bytes) -> int:
+    # SYSTEM_LOGICAL_PROCESSOR_INFORMATION_EX records are variable-sized and
+    # start with (DWORD Relationship, DWORD Size); one record per core.
+    count = offset = 0
+    while offset + 8 <= len(buffer):
+        relationship, size = struct.unpack_from("<II", buffer, offset)
+        if size <= 0:
+            break
+        if relationship == RELATION_PROCESSOR_CORE:
+            count += 1
+        offset += size
+    return count
+
+
+def _windows_physical_cores() -> int:
+    try:
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        query = kernel32.GetLogicalProcessorInformationEx
+        query.argtypes = [ctypes.c_int, ctypes.c_void_p, ctypes.POINTER(wintypes.DWORD)]
+        query.restype = wintypes.BOOL
+        length = wintypes.DWORD(0)
+        query(RELATION_PROCESSOR_CORE, None, ctypes.byref(length))
+        if not length.value:
+            return 0
+        buffer = ctypes.create_string_buffer(length.value)
+        if not query(RELATION_PROCESSOR_CORE, buffer, ctypes.byref(length)):
+            return 0
+        return _count_core_records(buffer.raw[: length.value])
+    except (AttributeError, OSError):
+        return 0
+
+
+def _macos_physical_cores() -> int:
+    try:
+        completed = subprocess.run(
+            ["sysctl", "-n", "hw.physicalcpu"],
+            capture_output=True,
+            text=True,
+            timeout=2,
+            check=True,
+        )
+        return int(completed.stdout.strip())
+    except (OSError, subprocess.SubprocessError, ValueError):
+        return 0
+
+
+def logical_cpu_count() -> int:
+    # CPUs this process may run on; affinity (taskset, containers) can be
+    # narrower than os.cpu_count().
+    if hasattr(os, "sched_getaffinity"):
+        return max(1, len(os.sched_getaffinity(0)))
+    return os.cpu_count() or 1
+
+
+def physical_cpu_count() -> int:
+    # Audio decoding gains little from hyper-threads, so the pool sizes itself
+    # by cores. The logical count is only the fallback when the platform
+    # query fails, and also caps the result (affinity may exclude cores).
+    logical = logical_cpu_count()
+    if sys.platform == "win32":
+        cores = _windows_physical_cores()
+    elif sys.platform == "darwin":
+        cores = _macos_physical_cores()
+    else:
+        cores = _linux_physical_cores()
+    return max(1, min(cores, logical) if cores else logical)
+
+
+class ConversionPool:
+    # FIFO executor for conversions. One slot per physical core by default,
+    # and every ffmpeg gets an equal share of the logical CPUs through
+    # -threads so parallel runs don't oversubscribe the machine. submit()
+    # blocks while max_queued tasks are waiting, which keeps the upstream
+    # handoff queue (and its temp files) as the place where backlog builds.
+    def __init__(self, workers: int = 0, max_queued: int = 0):
+        self.workers = max(1, workers or physical_cpu_count())
+        self.threads = max(1, logical_cpu_count() // self.workers)
+        self.max_queued = max(1, max_queued or self.workers)
+        self._tasks: deque[Callable[[], None]] = deque()
+        self._cond = threading.Condition()
+        self._busy = 0
+        self._busy_seconds = 0.0
+        self._started = time.perf_counter()
+        self._closed = False
+        self._threads = [
+            threading.Thread(target=self._run, name=f"convert-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, task: Callable[[], None]) -> None:
+        with self._cond:
+            while len(self._tasks) >= self.max_queued and not self._closed:
+                self._cond.wait()
+            if self._closed:
+                raise RuntimeError("Fila de conversão encerrada")
+            self._tasks.append(task)
+            self._cond.notify_all()
+            self._report()
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._tasks and not self._closed:
+                    self._cond.wait()
+                if not self._tasks:
+                    return
+                task = self._tasks.popleft()
+                self._busy += 1
+                self._cond.notify_all()
+                self._report()
+            started = time.perf_counter()
+            try:
+                task()
+            except Exception:
+                logger.exception("Falha inesperada na fila de conversão")
+            finally:
+                with self._cond:
+                    self._busy -= 1
+                    self._busy_seconds += time.perf_counter() - started
+                    self._report()
+
+    def _utilization(self) -> float:
+        elapsed = (time.perf_counter() - self._started) * self.workers
+        return min(1.0, self._busy_seconds / elapsed) if elapsed > 0 else 0.0
+
+    def _report(self) -> None:
+        metrics = get_metrics()
+        metrics.set_gauge("conversion_queue_depth", len(self._tasks))
+        metrics.set_gauge("conversion_slots_busy", self._busy)
+        metrics.set_gauge("conversion_utilization", round(self._utilization(), 4))
+
+    def stats(self) -> dict[str, float]:
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "threads_per_job": self.threads,
+                "busy": self._busy,
+                "queued": len(self._tasks),
+                "utilization": round(self._utilization(), 3),
+            }
+
+    def shutdown(self) -> None:
+        # Tasks already queued still run; cancelled jobs fail fast inside them.
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join()
+
+
+def _variant_args(variant: OutputVariant) -> list[str]:
+    encoder, sample_fmt = ENCODERS[(variant.container, variant.bit_depth)]
+    args = ["-map", "0:a:0", "-acodec", encoder, "-ar", str(variant.sample_rate)]
+    if sample_fmt:
+        args += ["-sample_fmt", sample_fmt]
+    if variant.container == "flac" and variant.bit_depth == 24:
+        args += ["-bits_per_raw_sample", "24"]
+    if variant.channels:
+        args += ["-ac", str(variant.channels)]
+    return args
+
+
+def _variants_command(
+    ffmpeg: str, input_path: str, outputs: list[tuple[OutputVariant, str]]
+) -> list[str]:
+    # One input, one output per variant: ffmpeg decodes the source once and
+    # feeds each encoder (and its resampler) from the same frames.
+    command = [ffmpeg, "-y", "-i", input_path]
+    for variant, output_path in outputs:
+        command += _variant_args(variant)
+        command.append(output_path)
+    return command
+
+
+def convert_to_variants(
+    input_path: str,
+    outputs: list[tuple[OutputVariant, str]],
+    duration: float = 0.0,
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+    timeout: float = 0.0,
+    threads: int = 0,
+) -> str:
+    _record_path(PATH_MULTI)
+    command = _variants_command(find_ffmpeg(), input_path, outputs)
+    with get_metrics().span(f"ffmpeg_{PATH_MULTI}"):
+        run_ffmpeg(command, duration, on_progress, is_cancelled, timeout, threads)
+    return PATH_MULTI
+
+
+def convert_to_wav(
+    input_path: str,
+    output_path: str,
+    sample_rate: int,
+    allow_move: bool = False,
+    duration: float = 0.0,
+    on_progress: Optional[ProgressCallback] = None,
+    is_cancelled: Optional[CancelCheck] = None,
+    timeout: float = 0.0,
+    threads: int = 0,
+) -> str:
+    metrics = get_metrics()
+    with metrics.span("probe"):
+        probe = probe_audio(input_path)
+    path = choose_conversion_path(probe, sample_rate)
+    _record_path(path)
+    if path == PATH_COPY:
+        with metrics.span("write"):
+            if allow_move:
+                shutil.move(input_path, output_path)
+            else:
+                shutil.copyfile(input_path, output_path)
+        return path
+    ffmpeg = find_ffmpeg()
+    command = _wav_command(ffmpeg, input_path, output_path, sample_rate, path)
+    with metrics.span(f"ffmpeg_{path}"):
+        run_ffmpeg(command, duration, on_progress, is_cancelled, timeout, threads)
+    return path
+
+
+def convert_stream_to_wav(
+    chunks: Iterable[bytes],
+    output_path: str,
+    sample_rate: int,
+    is_cancelled: Optional[CancelCheck] = None,
+    timeout: float = 0.0,
+) -> None:
+    _record_path(PATH_TRANSCODE)
+    command = _wav_command(find_ffmpeg(), "pipe:0", output_path, sample_rate)
+    run_ffmpeg(command, is_cancelled=is_cancelled, timeout=timeout, stdin_chunks=chunks)
+
+
+def convert_stream_to_variants(
+    chunks: Iterable[bytes],
+    outputs: list[tuple[OutputVariant, str]],
+    is_cancelled: Optional[CancelCheck] = None,
+    timeout: float = 0.0,
+) -> None:
+    _record_path(PATH_MULTI)
+    command = _variants_command(find_ffmpeg(), "pipe:0", outputs)
+    run_ffmpeg(command, is_cancelled=is_cancelled, timeout=timeout, stdin_chunks=chunks)
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+
+from permitted_audio_downloader.app.models import PAUSED_STATUS, TERMINAL_STATUSES
+from permitted_audio_downloader.app.utils import get_app_data_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'Na fila',
+    title TEXT NOT NULL DEFAULT '',
+    source TEXT NOT NULL DEFAULT '',
+    duration REAL NOT NULL DEFAULT 0,
+    filesize INTEGER NOT NULL DEFAULT 0,
+    output_path TEXT NOT NULL DEFAULT '',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status);
+"""
+
+JOB_FIELDS = ("status", "title", "source", "duration", "filesize", "output_path", "attempts")
+
+
+def get_job_db_path() -> Path:
+    return get_app_data_dir() / "jobs.sqlite3"
+
+
+class JobDatabase:
+    def __init__(self, path: Path | str, flush_interval: float = 0.5):
+        self.path = str(path)
+        self.flush_interval = flush_interval
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._db_lock = threading.Lock()
+        self._pending_lock = threading.Lock()
+        self._pending: dict[int, dict[str, Any]] = {}
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(target=self._flush_loop, name="job-db", daemon=True)
+        self._flusher.start()
+
+    def add(self, url: str, **fields: Any) -> int:
+        now = time.time()
+        columns = ["url", "created_at", "updated_at"]
+        values: list[Any] = [url, now, now]
+        for name in JOB_FIELDS:
+            if name in fields:
+                columns.append(name)
+                values.append(fields[name])
+        placeholders = ", ".join("?" for _ in columns)
+        with self._db_lock:
+            cursor = self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({placeholders})", values
+            )
+            return int(cursor.lastrowid)
+
+    def update(self, job_id: int, **fields: Any) -> None:
+        changes = {name: value for name, value in fields.items() if name in JOB_FIELDS}
+        if not changes:
+            return
+        with self._pending_lock:
+            self._pending.setdefault(job_id, {}).update(changes)
+        # A finished job is written on the next flush instead of waiting out
+        # the interval, so a crash right after completion doesn't redo it.
+        if changes.get("status") in TERMINAL_STATUSES:
+            self._wake.set()
+
+    def delete(self, job_ids: list[int]) -> None:
+        if not job_ids:
+            return
+        with self._pending_lock:
+            for job_id in job_ids:
+                self._pending.pop(job_id, None)
+        with self._db_lock:
+            self._conn.executemany("DELETE FROM jobs WHERE id = ?", [(i,) for i in job_ids])
+
+    def flush(self) -> None:
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return
+        now = time.time()
+        with self._db_lock:
+            self._conn.execute("BEGIN")
+            try:
+                for job_id, changes in pending.items():
+                    assignments = ", ".join(f"{name} = ?" for name in changes)
+                    self._conn.execute(
+                        f"UPDATE jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                        [*changes.values(), now, job_id],
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _flush_loop(self) -> None:
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self.flush()
+
+    def load_unfinished(self) -> list[dict[str, Any]]:
+        self.flush()
+        terminal = tuple(TERMINAL_STATUSES)
+        placeholders = ", ".join("?" for _ in terminal)
+        with self._db_lock:
+            # Anything caught mid-flight by a crash or exit goes back to the
+            # queue; paused jobs stay paused.
+            self._conn.execute(
+                f"UPDATE jobs SET status = 'Na fila' "
+                f"WHERE status NOT IN ({placeholders}, ?)",
+                (*terminal, PAUSED_STATUS),
+            )
+            rows = self._conn.execute(
+                f"SELECT * FROM jobs WHERE status NOT IN ({placeholders}) ORDER BY id",
+                terminal,
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def close(self) -> None:
+        self._closed.set()
+        self._wake.set()
+        self._flusher.join()
+        self.flush()
+        with self._db_lock:
+            self._conn.close()
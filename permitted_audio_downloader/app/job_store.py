@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+from collections import defaultdict, deque
+from typing import Callable, Iterable, Iterator, Optional
+
+from permitted_audio_downloader.app.models import TERMINAL_STATUSES, DownloadItem
+
+QUEUED = "Na fila"
+
+
+class JobStore:
+    # Items keyed by job id, plus the row order shown in the table, a set of
+    # ids per status and one FIFO of queued ids per source. Queues are cleaned
+    # lazily: an id whose status moved on is dropped when it reaches the head.
+    def __init__(self):
+        self._items: dict[int, DownloadItem] = {}
+        self._order: list[int] = []
+        self._rows: dict[int, int] = {}
+        self._by_status: defaultdict[str, set[int]] = defaultdict(set)
+        self._status: dict[int, str] = {}
+        self._ready: defaultdict[str, deque[int]] = defaultdict(deque)
+        self._next_id = 1
+
+    def __len__(self) -> int:
+        return len(self._order)
+
+    def __iter__(self) -> Iterator[DownloadItem]:
+        return (self._items[job_id] for job_id in self._order)
+
+    def __contains__(self, job_id: int) -> bool:
+        return job_id in self._items
+
+    def add(self, item: DownloadItem) -> int:
+        if item.job_id is None:
+            item.job_id = self._next_id
+        self._next_id = max(self._next_id, item.job_id + 1)
+        job_id = item.job_id
+        self._items[job_id] = item
+        self._rows[job_id] = len(self._order)
+        self._order.append(job_id)
+        self._index(job_id, item.status)
+        return job_id
+
+    def get(self, job_id: int) -> Optional[DownloadItem]:
+        return self._items.get(job_id)
+
+    def at(self, row: int) -> DownloadItem:
+        return self._items[self._order[row]]
+
+    def row_of(self, job_id: int) -> Optional[int]:
+        return self._rows.get(job_id)
+
+    def ids_with_status(self, *statuses: str) -> set[int]:
+        ids: set[int] = set()
+        for status in statuses:
+            ids |= self._by_status.get(status, set())
+        return ids
+
+    def count(self, status: str) -> int:
+        return len(self._by_status.get(status, ()))
+
+    def set_status(self, job_id: int, status: str) -> None:
+        item = self._items.get(job_id)
+        if item is None:
+            return
+        item.status = status
+        if self._status.get(job_id) == status:
+            return
+        self._unindex(job_id)
+        self._index(job_id, status)
+
+    def _index(self, job_id: int, status: str) -> None:
+        self._status[job_id] = status
+        self._by_status[status].add(job_id)
+        if status == QUEUED:
+            self._ready[self._items[job_id].source].append(job_id)
+
+    def _unindex(self, job_id: int) -> None:
+        status = self._status.pop(job_id, None)
+        if status is not None:
+            self._by_status[status].discard(job_id)
+
+    def _ready_head(self, source: str) -> Optional[int]:
+        queue = self._ready[source]
+        while queue and self._status.get(queue[0]) != QUEUED:
+            queue.popleft()
+        return queue[0] if queue else None
+
+    def pop_ready(self, can_start: Callable[[str], bool]) -> Optional[DownloadItem]:
+        # Oldest queued job among the sources that still have a free slot;
+        # the cost depends on the number of sources, not on the queue length.
+        best: Optional[int] = None
+        best_source = ""
+        for source in list(self._ready):
+            head = self._ready_head(source)
+            if head is None or not can_start(source):
+                continue
+            if best is None or head < best:
+                best, best_source = head, source
+        if best is None:
+            return None
+        self._ready[best_source].popleft()
+        return self._items[best]
+
+    def remove(self, job_ids: Iterable[int]) -> list[DownloadItem]:
+        doomed = {job_id for job_id in job_ids if job_id in self._items}
+        if not doomed:
+            return []
+        removed = []
+        for job_id in doomed:
+            self._unindex(job_id)
+            removed.append(self._items.pop(job_id))
+        # One pass to rebuild the row order; ready queues drop stale ids lazily.
+        self._order = [job_id for job_id in self._order if job_id not in doomed]
+        self._rows = {job_id: row for row, job_id in enumerate(self._order)}
+        return removed
+
+    def remove_finished(self) -> list[DownloadItem]:
+        return self.remove(self.ids_with_status(*TERMINAL_STATUSES))
@@ -0,0 +1,270 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Optional
+
+from permitted_audio_downloader.app.utils import get_app_data_dir
+from permitted_audio_downloader.app.validators import canonicalize_url
+
+# Every extension an OutputVariant can produce.
+OUTPUT_SUFFIXES = (".wav", ".flac", ".aiff")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS outputs (
+    directory TEXT NOT NULL,
+    name TEXT NOT NULL,
+    media_key TEXT NOT NULL DEFAULT '',
+    variant TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (directory, name)
+);
+CREATE TABLE IF NOT EXISTS directories (
+    directory TEXT PRIMARY KEY,
+    mtime_ns INTEGER NOT NULL
+);
+"""
+
+
+def get_catalog_path() -> Path:
+    return get_app_data_dir() / "library.sqlite3"
+
+
+def media_key_for(url: str, info: Optional[dict[str, Any]] = None) -> str:
+    key = canonicalize_url(url)
+    if key is not None:
+        return ":".join(key)
+    if info and info.get("extractor_key") and info.get("id"):
+        return f"{info['extractor_key']}:{info['id']}"
+    return ""
+
+
+@dataclass
+class CatalogEntry:
+    name: str
+    media_key: str = ""
+    variant: str = ""
+    size: int = 0
+
+
+@dataclass
+class _Directory:
+    path: Path
+    mtime_ns: int = -1
+    # Lower-cased names, since the output folder usually lives on a
+    # case-insensitive filesystem.
+    files: dict[str, CatalogEntry] = field(default_factory=dict)
+    outputs: dict[tuple[str, str], str] = field(default_factory=dict)
+    reserved: set[str] = field(default_factory=set)
+    next_copy: dict[str, int] = field(default_factory=dict)
+
+    def taken(self, name: str) -> bool:
+        key = name.lower()
+        return key in self.files or key in self.reserved
+
+    def add(self, entry: CatalogEntry) -> None:
+        self.files[entry.name.lower()] = entry
+        if entry.media_key:
+            self.outputs[(entry.media_key, entry.variant)] = entry.name.lower()
+
+    def drop(self, key: str) -> None:
+        entry = self.files.pop(key, None)
+        if entry is not None and entry.media_key:
+            if self.outputs.get((entry.media_key, entry.variant)) == key:
+                del self.outputs[(entry.media_key, entry.variant)]
+
+
+class OutputCatalog:
+    # Which WAVs exist in each output folder and which media/variant produced
+    # them. Names are allocated from memory; the folder is only listed again
+    # when its mtime shows something changed on disk since the last look.
+    def __init__(self, path: Path | str):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._dirs: dict[str, _Directory] = {}
+
+    @staticmethod
+    def _dir_key(directory: Path | str) -> str:
+        return os.path.normcase(os.path.abspath(directory))
+
+    def _directory(self, directory: Path | str, reconcile: bool = True) -> _Directory:
+        key = self._dir_key(directory)
+        state = self._dirs.get(key)
+        if state is None:
+            state = self._dirs[key] = _Directory(Path(directory))
+            state.path.mkdir(parents=True, exist_ok=True)
+            row = self._conn.execute(
+                "SELECT mtime_ns FROM directories WHERE directory = ?", (key,)
+            ).fetchone()
+            state.mtime_ns = row[0] if row else -1
+            rows = self._conn.execute(
+                "SELECT name, media_key, variant, size FROM outputs WHERE directory = ?", (key,)
+            ).fetchall()
+            for name, media_key, variant, size in rows:
+                state.add(CatalogEntry(name, media_key, variant, size))
+        if reconcile:
+            self._reconcile(key, state)
+        return state
+
+    def _reconcile(self, key: str, state: _Directory) -> None:
+        try:
+            mtime_ns = os.stat(state.path).st_mtime_ns
+        except FileNotFoundError:
+            state.path.mkdir(parents=True, exist_ok=True)
+            mtime_ns = os.stat(state.path).st_mtime_ns
+        if mtime_ns == state.mtime_ns:
+            return
+        with os.scandir(state.path) as entries:
+            on_disk = {
+                entry.name.lower(): entry.name
+                for entry in entries
+                if entry.name.lower().endswith(OUTPUT_SUFFIXES) and entry.is_file()
+            }
+        gone = [entry.name for lowered, entry in state.files.items() if lowered not in on_disk]
+        new = [name for lowered, name in on_disk.items() if lowered not in state.files]
+        for name in gone:
+            state.drop(name.lower())
+        for name in new:
+            state.add(CatalogEntry(name))
+        state.mtime_ns = mtime_ns
+        self._conn.execute("BEGIN")
+        try:
+            self._conn.executemany(
+                "DELETE FROM outputs WHERE directory = ? AND name = ?",
+                [(key, name) for name in gone],
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO outputs (directory, name, created_at) VALUES (?, ?, ?)",
+                [(key, name, time.time()) for name in new],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO directories (directory, mtime_ns) VALUES (?, ?)",
+                (key, mtime_ns),
+            )
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+
+    def allocate(
+        self, directory: Path | str, stem: str, overwrite: bool = False, suffix: str = ".wav"
+    ) -> Path:
+        # The name stays reserved until record() or release(), so two jobs
+        # with the same title can't be handed the same file.
+        with self._lock:
+            state = self._directory(directory)
+            if overwrite:
+                return state.path / f"{stem}{suffix}"
+            name = self._free_name(state, stem, suffix)
+            if (state.path / name).exists():
+                # The index missed a change that landed in the same mtime
+                # tick as one of our own writes; list the folder again.
+                state.mtime_ns = -1
+                self._reconcile(self._dir_key(directory), state)
+                name = self._free_name(state, stem, suffix)
+            while (state.path / name).exists():
+                state.add(CatalogEntry(name))
+                name = self._free_name(state, stem, suffix)
+            state.reserved.add(name.lower())
+            return state.path / name
+
+    @staticmethod
+    def _free_name(state: _Directory, stem: str, suffix: str) -> str:
+        name = f"{stem}{suffix}"
+        if not state.taken(name):
+            return name
+        lowered = name.lower()
+        copy = state.next_copy.get(lowered, 1)
+        while state.taken(f"{stem} ({copy}){suffix}"):
+            copy += 1
+        state.next_copy[lowered] = copy + 1
+        return f"{stem} ({copy}){suffix}"
+
+    def release(self, path: Path | str) -> None:
+        path = Path(path)
+        with self._lock:
+            state = self._dirs.get(self._dir_key(path.parent))
+            if state is not None:
+                state.reserved.discard(path.name.lower())
+
+    def record(self, path: Path | str, media_key: str = "", variant: str = "") -> None:
+        path = Path(path)
+        try:
+            stat = path.stat()
+        except OSError:
+            self.release(path)
+            return
+        with self._lock:
+            key = self._dir_key(path.parent)
+            state = self._directory(path.parent, reconcile=False)
+            lowered = path.name.lower()
+            previous = state.files.get(lowered)
+            state.reserved.discard(lowered)
+            state.drop(lowered)
+            state.add(CatalogEntry(path.name, media_key, variant, stat.st_size))
+            # Our own write bumped the folder mtime. It is taken as seen only
+            # if the folder hasn't changed since the file was last written;
+            # a later change is someone else's and needs a fresh listing.
+            mtime_ns = os.stat(state.path).st_mtime_ns
+            if mtime_ns <= stat.st_mtime_ns:
+                state.mtime_ns = mtime_ns
+            self._conn.execute("BEGIN")
+            try:
+                if previous is not None:
+                    self._conn.execute(
+                        "DELETE FROM outputs WHERE directory = ? AND name = ?",
+                        (key, previous.name),
+                    )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO outputs "
+                    "(directory, name, media_key, variant, size, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, path.name, media_key, variant, stat.st_size, time.time()),
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO directories (directory, mtime_ns) VALUES (?, ?)",
+                    (key, state.mtime_ns),
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def find(self, directory: Path | str, media_key: str, variant: str) -> Optional[Path]:
+        if not media_key:
+            return None
+        with self._lock:
+            state = self._directory(directory)
+            lowered = state.outputs.get((media_key, variant))
+            if lowered is None:
+                return None
+            entry = state.files[lowered]
+            path = state.path / entry.name
+            try:
+                intact = path.stat().st_size == entry.size
+            except OSError:
+                intact = False
+            if intact:
+                return path
+            # Replaced or truncated behind our back: keep the name, forget
+            # where it came from.
+            state.drop(lowered)
+            state.add(CatalogEntry(entry.name))
+            self._conn.execute(
+                "UPDATE outputs SET media_key = '', variant = '' WHERE directory = ? AND name = ?",
+                (self._dir_key(directory), entry.name),
+            )
+            return None
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
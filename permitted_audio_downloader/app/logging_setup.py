@@ -1,43 +1,187 @@
+from __future__ import annotations
+
+import atexit
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import threading
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Iterator, Optional
+
+from permitted_audio_downloader.app.utils import get_app_data_dir
+
+LOG_VIEW_LINES = 5000
+JOB_LOG_LINES = 500
+MAX_LOGGED_JOBS = 1000
+
+# Item whose work the current thread is doing; stamped on every record so
+# the view can filter by item.
+current_job: ContextVar[Optional[int]] = ContextVar("current_job", default=None)
+
+_listener: Optional[QueueListener] = None
+_buffer: Optional["LogRingBuffer"] = None
+
+
+@contextmanager
+def job_logging(job_id: int) -> Iterator[None]:
+    token = current_job.set(job_id)
+    try:
+        yield
+    finally:
+        current_job.reset(token)
 
-from PySide6 import QtCore
 
+class JobContextFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        if getattr(record, "job_id", None) is None:
+            record.job_id = current_job.get()
+        return True
 
-class QtLogHandler(QtCore.QObject, logging.Handler):
-    log_signal = QtCore.Signal(str)
 
-    def __init__(self):
-        QtCore.QObject.__init__(self)
-        logging.Handler.__init__(self)
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    # emit() no longer flushes each record; the listener calls flush_batch()
+    # once the queue is empty, so a burst becomes one write. The file size is
+    # counted here, because the base shouldRollover() seeks the stream to
+    # find it, and that seek flushes on every record.
+    def __init__(self, *args, **kwargs):
+        self._size = 0
+        self._pending = 0
+        super().__init__(*args, **kwargs)
+
+    def _open(self):
+        stream = super()._open()
+        try:
+            self._size = os.path.getsize(self.baseFilename)
+        except OSError:
+            self._size = 0
+        return stream
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.maxBytes <= 0:
+            return False
+        if self.stream is None:
+            self.stream = self._open()
+        self._pending = len(self.format(record)) + len(self.terminator)
+        return self._size > 0 and self._size + self._pending >= self.maxBytes
+
+    def emit(self, record: logging.LogRecord) -> None:
+        super().emit(record)
+        self._size += self._pending
+        self._pending = 0
+
+    def flush(self) -> None:
+        pass
+
+    def flush_batch(self) -> None:
+        super().flush()
+
+
+class BatchingQueueListener(QueueListener):
+    def handle(self, record: logging.LogRecord) -> None:
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                getattr(handler, "flush_batch", handler.flush)()
+
+
+class LogRingBuffer(logging.Handler):
+    # Bounded in-memory copy of the log for the UI. Lines are also indexed
+    # per item as they arrive, so filtering never rescans the history, and
+    # drain() hands the UI only what is new since its last refresh.
+    def __init__(
+        self,
+        capacity: int = LOG_VIEW_LINES,
+        job_capacity: int = JOB_LOG_LINES,
+        max_jobs: int = MAX_LOGGED_JOBS,
+    ):
+        super().__init__()
+        self.capacity = capacity
+        self.job_capacity = job_capacity
+        self.max_jobs = max_jobs
+        self._lines: deque[str] = deque(maxlen=capacity)
+        self._jobs: OrderedDict[int, deque[str]] = OrderedDict()
+        self._pending: deque[tuple[Optional[int], str]] = deque(maxlen=capacity)
+        self._lines_lock = threading.Lock()
 
     def emit(self, record: logging.LogRecord) -> None:
         try:
-            msg = self.format(record)
-            self.log_signal.emit(msg)
+            text = self.format(record)
         except Exception:
             self.handleError(record)
+            return
+        job_id = getattr(record, "job_id", None)
+        with self._lines_lock:
+            self._lines.append(text)
+            self._pending.append((job_id, text))
+            if job_id is not None:
+                lines = self._jobs.get(job_id)
+                if lines is None:
+                    lines = self._jobs[job_id] = deque(maxlen=self.job_capacity)
+                    while len(self._jobs) > self.max_jobs:
+                        self._jobs.popitem(last=False)
+                lines.append(text)
+
+    def drain(self) -> list[tuple[Optional[int], str]]:
+        with self._lines_lock:
+            pending = list(self._pending)
+            self._pending.clear()
+        return pending
+
+    def snapshot(self, job_id: Optional[int] = None) -> list[str]:
+        # For redrawing the view: everything kept so far, with the pending
+        # lines marked as delivered so the next drain() doesn't repeat them.
+        with self._lines_lock:
+            self._pending.clear()
+            if job_id is None:
+                return list(self._lines)
+            return list(self._jobs.get(job_id, ()))
 
 
 def get_log_path() -> Path:
-    appdata = os.getenv("APPDATA")
-    base_dir = Path(appdata) if appdata else Path.home() / ".config"
-    log_dir = base_dir / "PermittedAudioDownloader" / "logs"
-    log_dir.mkdir(parents=True, exist_ok=True)
-    return log_dir / "app.log"
+    return get_app_data_dir("logs") / "app.log"
+
+
+def get_log_buffer() -> Optional[LogRingBuffer]:
+    return _buffer
 
 
 def setup_logging() -> logging.Logger:
+    # On the caller's thread the record only gets its job id and merged
+    # message before being enqueued; the file and the UI buffer are written
+    # on the listener thread.
+    global _listener, _buffer
     logger = logging.getLogger("permitted_audio_downloader")
     logger.setLevel(logging.INFO)
     if logger.handlers:
         return logger
 
-    log_path = get_log_path()
-    file_handler = RotatingFileHandler(log_path, maxBytes=1_000_000, backupCount=3, encoding="utf-8")
     formatter = logging.Formatter("%(asctime)s [%(levelname)s] %(message)s")
+    file_handler = BufferedRotatingFileHandler(
+        get_log_path(), maxBytes=1_000_000, backupCount=3, encoding="utf-8"
+    )
     file_handler.setFormatter(formatter)
-    logger.addHandler(file_handler)
+    _buffer = LogRingBuffer()
+    _buffer.setFormatter(formatter)
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = QueueHandler(records)
+    queue_handler.addFilter(JobContextFilter())
+    logger.addHandler(queue_handler)
+    _listener = BatchingQueueListener(records, file_handler, _buffer)
+    _listener.start()
+    atexit.register(shutdown_logging)
     return logger
+
+
+def shutdown_logging() -> None:
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in _listener.handlers:
+        handler.close()
+    _listener = None
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from dataclasses import dataclass
+from typing import Any, Callable
+
+INFO_FIELDS = (
+    "id",
+    "extractor_key",
+    "format_id",
+    "ext",
+    "title",
+    "uploader",
+    "duration",
+    "filesize",
+)
+
+# Resolved stream URLs expire on the server side (YouTube after a few hours),
+# so the full info is only reused for the download while it is fresh.
+DEFAULT_INFO_TTL = 30 * 60
+# Records kept for URLs that were resolved but never taken (removed or failed
+# jobs); the oldest go first.
+MAX_RECORDS = 500
+TAKE_POLL_INTERVAL = 0.2
+
+Resolver = Callable[[str], dict[str, Any]]
+ResolvedCallback = Callable[[str, "dict[str, Any] | None", "Exception | None"], None]
+CancelCheck = Callable[[], bool]
+
+
+def compact_info(info: dict[str, Any]) -> dict[str, Any]:
+    compact = {name: info.get(name) for name in INFO_FIELDS if info.get(name) is not None}
+    if "filesize" not in compact and info.get("filesize_approx"):
+        compact["filesize"] = info["filesize_approx"]
+    return compact
+
+
+@dataclass
+class _Record:
+    future: Future
+    compact: dict[str, Any] | None = None
+    info: dict[str, Any] | None = None
+    resolved_at: float = 0.0
+
+
+class MetadataPrefetcher:
+    def __init__(
+        self,
+        resolve: Resolver,
+        max_workers: int = 2,
+        ttl: float = DEFAULT_INFO_TTL,
+        max_records: int = MAX_RECORDS,
+    ):
+        self._resolve = resolve
+        self._ttl = ttl
+        self._max_records = max(1, max_records)
+        self._lock = threading.Lock()
+        self._records: OrderedDict[str, _Record] = OrderedDict()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_workers), thread_name_prefix="metadata"
+        )
+
+    def submit(self, url: str, callback: ResolvedCallback | None = None) -> None:
+        with self._lock:
+            if url in self._records:
+                return
+            future = self._executor.submit(self._run, url, callback)
+            self._records[url] = _Record(future=future)
+            self._trim()
+
+    def _trim(self) -> None:
+        # Caller holds the lock. Only finished records are dropped, so an
+        # in-flight extraction is never resolved twice.
+        excess = len(self._records) - self._max_records
+        if excess <= 0:
+            return
+        for url in [url for url, record in self._records.items() if record.future.done()]:
+            if excess <= 0:
+                break
+            del self._records[url]
+            excess -= 1
+
+    def _run(self, url: str, callback: ResolvedCallback | None) -> None:
+        try:
+            info = self._resolve(url)
+        except Exception as exc:
+            with self._lock:
+                self._records.pop(url, None)
+            if callback:
+                callback(url, None, exc)
+            return
+        compact = compact_info(info)
+        with self._lock:
+            record = self._records.get(url)
+            if record is not None:
+                record.compact = compact
+                record.info = info
+                record.resolved_at = time.monotonic()
+        if callback:
+            callback(url, compact, None)
+
+    def compact(self, url: str) -> dict[str, Any] | None:
+        with self._lock:
+            record = self._records.get(url)
+            return record.compact if record else None
+
+    def take(
+        self, url: str, wait: bool = True, is_cancelled: CancelCheck | None = None
+    ) -> dict[str, Any] | None:
+        # Hands the full info over once; the record is dropped with it.
+        with self._lock:
+            record = self._records.get(url)
+        if record is None:
+            return None
+        while wait and not record.future.done():
+            # Already in flight: waiting is cheaper than extracting a second
+            # time, unless the job is cancelled meanwhile.
+            if is_cancelled is not None and is_cancelled():
+                return None
+            try:
+                record.future.result(timeout=TAKE_POLL_INTERVAL)
+            except FutureTimeout:
+                continue
+            except CancelledError:
+                return None
+        with self._lock:
+            if self._records.get(url) is record:
+                del self._records[url]
+            info, record.info = record.info, None
+            if info is None or time.monotonic() - record.resolved_at > self._ttl:
+                return None
+            return info
+
+    def forget(self, url: str) -> None:
+        with self._lock:
+            record = self._records.pop(url, None)
+        if record is not None:
+            record.future.cancel()
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,249 @@
+from __future__ import annotations
+
+import bisect
+import json
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Iterator, Optional
+
+PREFIX = "pad"
+DURATION_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+BYTES_BUCKETS = tuple(2**power for power in range(16, 33, 2))  # 64 KB .. 4 GB
+ATTEMPT_BUCKETS = (1, 2, 3, 5, 10)
+
+Labels = tuple[tuple[str, str], ...]
+
+_NOOP = nullcontext()
+
+
+def _format_bound(bound: float) -> str:
+    # :g rounds to six digits (1048576 -> 1.04858e+06), which breaks le labels.
+    if bound == float("inf"):
+        return "+Inf"
+    if float(bound).is_integer():
+        return str(int(bound))
+    return repr(float(bound))
+
+
+class Histogram:
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def cumulative(self) -> list[tuple[str, int]]:
+        running = 0
+        rows = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            running += count
+            rows.append((_format_bound(bound), running))
+        return rows
+
+
+class MetricsRegistry:
+    # Off by default. While disabled every call returns before taking the
+    # lock, and span() hands back a shared no-op context, so the
+    # instrumentation left in the hot paths costs one attribute check.
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: dict[tuple[str, Labels], Histogram] = {}
+        self._counters: dict[tuple[str, Labels], float] = {}
+        self._gauges: dict[tuple[str, Labels], float] = {}
+        self._help: dict[str, str] = {}
+
+    def describe(self, name: str, text: str) -> None:
+        self._help[name] = text
+
+    def observe(
+        self, name: str, value: float, buckets: tuple[float, ...] = DURATION_BUCKETS, **labels: str
+    ) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def inc(self, name: str, amount: float = 1, **labels: str) -> None:
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def set_gauge(self, name: str, value: float, **labels: str) -> None:
+        if not self.enabled:
+            return
+        with self._lock:
+            self._gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def span(self, stage: str, timings: Optional[dict[str, float]] = None):
+        if not self.enabled:
+            return _NOOP
+        return self._span(stage, timings)
+
+    @contextmanager
+    def _span(self, stage: str, timings: Optional[dict[str, float]]) -> Iterator[None]:
+        # Failed and cancelled stages are timed too; the time was still spent.
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(stage, time.perf_counter() - started, timings)
+
+    def record(
+        self, stage: str, seconds: float, timings: Optional[dict[str, float]] = None
+    ) -> None:
+        if not self.enabled:
+            return
+        self.observe("stage_duration_seconds", seconds, stage=stage)
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+            self._gauges.clear()
+
+    def snapshot(self) -> dict[str, Any]:
+        with self._lock:
+            histograms = [
+                {
+                    "name": name,
+                    "labels": dict(labels),
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "buckets": dict(histogram.cumulative()),
+                }
+                for (name, labels), histogram in sorted(self._histograms.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._counters.items())
+            ]
+            gauges = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in sorted(self._gauges.items())
+            ]
+        return {"histograms": histograms, "counters": counters, "gauges": gauges}
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), ensure_ascii=False)
+
+    def to_prometheus(self) -> str:
+        snapshot = self.snapshot()
+        lines: list[str] = []
+        seen: set[str] = set()
+
+        def header(name: str, kind: str) -> None:
+            if name in seen:
+                return
+            seen.add(name)
+            if name in self._help:
+                lines.append(f"# HELP {PREFIX}_{name} {self._help[name]}")
+            lines.append(f"# TYPE {PREFIX}_{name} {kind}")
+
+        for entry in snapshot["histograms"]:
+            name = entry["name"]
+            header(name, "histogram")
+            for bound, count in entry["buckets"].items():
+                labels = _format_labels({**entry["labels"], "le": bound})
+                lines.append(f"{PREFIX}_{name}_bucket{labels} {count}")
+            labels = _format_labels(entry["labels"])
+            lines.append(f"{PREFIX}_{name}_sum{labels} {entry['sum']!r}")
+            lines.append(f"{PREFIX}_{name}_count{labels} {entry['count']}")
+        for entry in snapshot["counters"]:
+            header(entry["name"], "counter")
+            labels = _format_labels(entry["labels"])
+            lines.append(f"{PREFIX}_{entry['name']}{labels} {entry['value']!r}")
+        for entry in snapshot["gauges"]:
+            header(entry["name"], "gauge")
+            labels = _format_labels(entry["labels"])
+            lines.append(f"{PREFIX}_{entry['name']}{labels} {entry['value']!r}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    body = ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+    return "{" + body + "}"
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+_registry = MetricsRegistry()
+_registry.describe("stage_duration_seconds", "Tempo gasto em cada etapa de um item.")
+_registry.describe("transfer_bytes", "Bytes baixados e gravados por item.")
+_registry.describe("job_attempts", "Tentativas até o item terminar.")
+_registry.describe("jobs_total", "Itens terminados por resultado.")
+_registry.describe("conversion_queue_depth", "Conversões aguardando um slot livre.")
+_registry.describe("conversion_slots_busy", "Processos ffmpeg em execução.")
+_registry.describe("conversion_utilization", "Uso dos slots de conversão (0 a 1).")
+
+
+def get_metrics() -> MetricsRegistry:
+    return _registry
+
+
+def _handler_class(registry: MetricsRegistry) -> type:
+    # http.server is imported on demand; most sessions never serve metrics.
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            path = self.path.split("?")[0]
+            if path == "/metrics":
+                body = registry.to_prometheus().encode("utf-8")
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/metrics.json":
+                body = registry.to_json().encode("utf-8")
+                content_type = "application/json"
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args) -> None:
+            pass
+
+    return MetricsHandler
+
+
+class MetricsServer:
+    # Local-only endpoint (127.0.0.1) serving /metrics and /metrics.json.
+    def __init__(self, port: int, registry: Optional[MetricsRegistry] = None):
+        from http.server import ThreadingHTTPServer
+
+        handler = _handler_class(registry or _registry)
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, name="metrics-http", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def port(self) -> int:
+        return self._httpd.server_port
+
+    def close(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+TERMINAL_STATUSES = {"Concluído", "Falhou", "Cancelado"}
+PAUSED_STATUS = "Pausado"
+# Failed with a retryable error; back in the queue once its backoff runs out.
+RETRY_STATUS = "Aguardando nova tentativa"
+# Share of the bandwidth limit a download gets relative to the others.
+PRIORITY_WEIGHTS = {"Baixa": 1.0, "Normal": 2.0, "Alta": 4.0}
+DEFAULT_PRIORITY = "Normal"
+# container -> extension
+CONTAINERS = {"wav": ".wav", "flac": ".flac", "aiff": ".aiff"}
+BIT_DEPTHS = (16, 24, 32)
+
+
+@dataclass(frozen=True)
+class OutputVariant:
+    sample_rate: int
+    bit_depth: int = 16
+    channels: int = 0  # 0 keeps the source layout
+    container: str = "wav"
+
+    def __post_init__(self) -> None:
+        if self.container not in CONTAINERS:
+            raise ValueError(f"Formato de saída não suportado: {self.container}")
+        if self.bit_depth not in BIT_DEPTHS or (self.container == "flac" and self.bit_depth > 24):
+            raise ValueError(f"Profundidade de bits não suportada: {self.bit_depth}")
+        if self.sample_rate <= 0 or self.channels < 0:
+            raise ValueError("Taxa de amostragem ou canais inválidos")
+
+    @property
+    def suffix(self) -> str:
+        return CONTAINERS[self.container]
+
+    @property
+    def is_plain_wav(self) -> bool:
+        return self.container == "wav" and self.bit_depth == 16 and not self.channels
+
+    @property
+    def key(self) -> str:
+        # Plain 16-bit WAVs keep the short key the output catalog started with.
+        if self.is_plain_wav:
+            return f"wav:{self.sample_rate}"
+        return f"{self.container}:{self.sample_rate}:{self.bit_depth}:{self.channels}"
+
+    @property
+    def label(self) -> str:
+        parts = [f"{self.sample_rate / 1000:g} kHz"]
+        if self.bit_depth != 16:
+            parts.append(f"{self.bit_depth}-bit")
+        if self.channels:
+            parts.append({1: "mono", 2: "estéreo"}.get(self.channels, f"{self.channels}ch"))
+        if self.container != "wav":
+            parts.append(self.container.upper())
+        return " ".join(parts)
+
+
+def parse_variants(raw: Optional[Iterable[Any]]) -> list[OutputVariant]:
+    # [{"sample_rate": 48000, "bit_depth": 24, "channels": 2, "container": "wav"}]
+    # or "48000:24:2:wav" strings; malformed entries are skipped.
+    variants: list[OutputVariant] = []
+    for entry in raw or ():
+        try:
+            if isinstance(entry, str):
+                fields = entry.split(":")
+                entry = {
+                    name: value
+                    for name, value in zip(("sample_rate", "bit_depth", "channels"), fields[:3])
+                }
+                if len(fields) > 3:
+                    entry["container"] = fields[3]
+            variant = OutputVariant(
+                int(entry["sample_rate"]),
+                int(entry.get("bit_depth", 16)),
+                int(entry.get("channels", 0)),
+                str(entry.get("container", "wav")).lower(),
+            )
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+        if variant not in variants:
+            variants.append(variant)
+    return variants
+
+
+@dataclass
+class DownloadItem:
+    url: str
+    status: str = "Na fila"
+    title: str = ""
+    source: str = ""
+    progress: float = 0.0
+    output_path: str = ""
+    duration: float = 0.0
+    filesize: int = 0
+    attempts: int = 0
+    last_error: str = ""
+    job_id: Optional[int] = None
+    priority: str = DEFAULT_PRIORITY
+    # perf_counter() when it last entered the queue, and seconds spent per
+    # stage (filled only while metrics are enabled).
+    queued_at: float = 0.0
+    timings: dict[str, float] = field(default_factory=dict)
+    # Empty means the options decide (output_variants, else sample_rate).
+    variants: list[OutputVariant] = field(default_factory=list)
+    # variant key -> file; output_path is the first variant's file.
+    output_paths: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def weight(self) -> float:
+        return PRIORITY_WEIGHTS.get(self.priority, PRIORITY_WEIGHTS[DEFAULT_PRIORITY])
@@ -0,0 +1,523 @@
+from __future__ import annotations
+
+import os
+import queue
+import shutil
+import tempfile
+import time
+from dataclasses import dataclass, field
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable
+
+from permitted_audio_downloader.app import ffmpeg_service, ytdlp_service
+from permitted_audio_downloader.app.library import OutputCatalog, media_key_for
+from permitted_audio_downloader.app.metrics import BYTES_BUCKETS, get_metrics
+from permitted_audio_downloader.app.models import (
+    PAUSED_STATUS,
+    DownloadItem,
+    OutputVariant,
+    parse_variants,
+)
+from permitted_audio_downloader.app.scheduler import is_retryable
+from permitted_audio_downloader.app.source_cache import CacheEntry, SourceCache
+from permitted_audio_downloader.app.utils import resolve_output_path, sanitize_filename
+from permitted_audio_downloader.app.validators import ValidationError
+
+ProgressCallback = Callable[[float], None]
+CancelCheck = Callable[[], bool]
+
+
+@dataclass
+class ConversionJob:
+    index: int
+    item: DownloadItem
+    input_path: Path
+    output_path: Path
+    sample_rate: int
+    temp_dir: str = ""
+    cancelled: bool = False
+    disposable_input: bool = False
+    release: Callable[[], None] | None = None
+    # perf_counter() when the download side started waiting for conversion.
+    ready_at: float = 0.0
+    catalog: OutputCatalog | None = None
+    media_key: str = ""
+    # Every variant to produce; empty means a plain WAV at output_path.
+    outputs: list[tuple[OutputVariant, Path]] = field(default_factory=list)
+    # Seconds ffmpeg may go without reporting progress; 0 waits forever.
+    timeout: float = 0.0
+
+    @property
+    def targets(self) -> list[tuple[OutputVariant, Path]]:
+        return self.outputs or [(OutputVariant(self.sample_rate), self.output_path)]
+
+    def cleanup(self) -> None:
+        if self.release is not None:
+            self.release()
+            self.release = None
+        if self.catalog is not None:
+            # No-op once convert_stage recorded the outputs.
+            for _, path in self.targets:
+                self.catalog.release(path)
+        if self.temp_dir:
+            self.remove_temp_dir(self.temp_dir)
+
+    @staticmethod
+    def remove_temp_dir(temp_dir: str) -> None:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def raise_if_cancelled(is_cancelled: CancelCheck, is_paused: CancelCheck | None = None) -> None:
+    if is_cancelled():
+        raise RuntimeError("Download cancelado")
+    if is_paused is not None and is_paused():
+        raise RuntimeError("Download pausado")
+
+
+def is_paused_error(exc: BaseException) -> bool:
+    # yt-dlp wraps exceptions raised from progress hooks, so match the message.
+    return not isinstance(exc, ValidationError) and "download pausado" in str(exc).lower()
+
+
+def failure_status(exc: Exception) -> tuple[str, str]:
+    if is_paused_error(exc):
+        return PAUSED_STATUS, PAUSED_STATUS
+    if not isinstance(exc, ValidationError) and "cancelad" in str(exc).lower():
+        return "Cancelado", "Cancelado"
+    return "Falhou", str(exc)
+
+
+def observe_size(kind: str, path: Path | str) -> None:
+    metrics = get_metrics()
+    if not metrics.enabled:
+        return
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return
+    metrics.observe("transfer_bytes", size, BYTES_BUCKETS, kind=kind)
+
+
+def job_variants(item: DownloadItem, options: dict) -> list[OutputVariant]:
+    return (
+        item.variants
+        or parse_variants(options.get("output_variants"))
+        or [OutputVariant(options["sample_rate"])]
+    )
+
+
+def build_output_path(
+    info: dict[str, Any],
+    options: dict,
+    catalog: OutputCatalog | None = None,
+    label: str = "",
+    suffix: str = ".wav",
+) -> Path:
+    title = info.get("title") or "audio"
+    uploader = info.get("uploader") or ""
+    filename = title
+    if options["preserve_name"] and uploader:
+        filename = f"{uploader} - {title}"
+    filename = sanitize_filename(filename)
+    if label:
+        filename = f"{filename} [{label}]"
+    if catalog is not None:
+        return catalog.allocate(options["output_dir"], filename, options["overwrite"], suffix)
+    return resolve_output_path(options["output_dir"], filename, options["overwrite"], suffix)
+
+
+def build_output_paths(
+    info: dict[str, Any],
+    options: dict,
+    variants: list[OutputVariant],
+    catalog: OutputCatalog | None = None,
+) -> list[tuple[OutputVariant, Path]]:
+    # A single variant keeps the plain title; several get "[48 kHz 24-bit]".
+    labelled = len(variants) > 1
+    return [
+        (
+            variant,
+            build_output_path(
+                info, options, catalog, variant.label if labelled else "", variant.suffix
+            ),
+        )
+        for variant in variants
+    ]
+
+
+def record_outputs(
+    item: DownloadItem,
+    outputs: list[tuple[OutputVariant, Path]],
+    catalog: OutputCatalog | None = None,
+    media_key: str = "",
+) -> None:
+    item.output_paths = {variant.key: str(path) for variant, path in outputs}
+    item.output_path = str(outputs[0][1])
+    for variant, path in outputs:
+        observe_size("output", path)
+        if catalog is not None:
+            catalog.record(path, media_key, variant.key)
+
+
+def existing_outputs(
+    item: DownloadItem, options: dict, catalog: OutputCatalog | None
+) -> dict[str, Path] | None:
+    # Checked before any network access: the same media already converted
+    # with the same parameters into this output folder, for every variant.
+    if catalog is None or not options.get("skip_existing", True):
+        return None
+    media_key = media_key_for(item.url)
+    found = {}
+    for variant in job_variants(item, options):
+        path = catalog.find(options["output_dir"], media_key, variant.key)
+        if path is None:
+            return None
+        found[variant.key] = path
+    return found
+
+
+def get_downloaded_path(info: dict[str, Any]) -> Path:
+    requested = info.get("requested_downloads") or []
+    filepath = (
+        requested[0].get("filepath") if requested else info.get("filepath")
+    ) or info.get("_filename")
+    if not filepath:
+        raise RuntimeError("Arquivo de download não localizado")
+    return Path(filepath)
+
+
+def _progress_hook(
+    on_progress: ProgressCallback,
+    is_cancelled: CancelCheck,
+    is_paused: CancelCheck | None = None,
+):
+    def hook(data: dict) -> None:
+        if data.get("status") == "downloading":
+            downloaded = data.get("downloaded_bytes") or 0
+            total = data.get("total_bytes") or data.get("total_bytes_estimate") or 0
+            on_progress((downloaded / total * 100) if total else 0.0)
+        raise_if_cancelled(is_cancelled, is_paused)
+
+    return hook
+
+
+def apply_info(item: DownloadItem, info: dict[str, Any]) -> None:
+    item.title = info.get("title") or "audio"
+    item.duration = float(info.get("duration") or 0.0)
+    item.filesize = int(info.get("filesize") or info.get("filesize_approx") or 0)
+
+
+def resolve_info(item: DownloadItem, options: dict) -> dict[str, Any]:
+    with get_metrics().span("metadata", item.timings):
+        info = ytdlp_service.extract_info(item.url, ffmpeg_location=options.get("ffmpeg_bin_dir"))
+    apply_info(item, info)
+    return info
+
+
+def _make_job(
+    index: int,
+    item: DownloadItem,
+    options: dict,
+    info: dict[str, Any],
+    input_path: Path,
+    catalog: OutputCatalog | None,
+    **fields: Any,
+) -> ConversionJob:
+    outputs = build_output_paths(info, options, job_variants(item, options), catalog)
+    variant, output_path = outputs[0]
+    return ConversionJob(
+        index=index,
+        item=item,
+        input_path=input_path,
+        output_path=output_path,
+        sample_rate=variant.sample_rate,
+        catalog=catalog,
+        media_key=media_key_for(item.url, info),
+        outputs=outputs,
+        timeout=float(options.get("ffmpeg_timeout", 0) or 0),
+        **fields,
+    )
+
+
+def _job_from_cache(
+    index: int,
+    item: DownloadItem,
+    options: dict,
+    cache: SourceCache,
+    entry: CacheEntry,
+    catalog: OutputCatalog | None = None,
+) -> ConversionJob:
+    apply_info(item, entry.info)
+    return _make_job(
+        index,
+        item,
+        options,
+        entry.info,
+        cache.path_for(entry),
+        catalog,
+        release=partial(cache.unpin, entry.key),
+    )
+
+
+def cached_job(
+    index: int,
+    item: DownloadItem,
+    options: dict,
+    cache: SourceCache | None,
+    info: dict[str, Any] | None = None,
+    catalog: OutputCatalog | None = None,
+) -> ConversionJob | None:
+    if cache is None:
+        return None
+    if info:
+        entry = cache.lookup_info(info, url=item.url, pin=True)
+    else:
+        entry = cache.lookup_url(item.url, pin=True)
+    if entry is None:
+        return None
+    return _job_from_cache(index, item, options, cache, entry, catalog)
+
+
+def download_stage(
+    index: int,
+    item: DownloadItem,
+    options: dict,
+    temp_dir: str,
+    on_progress: ProgressCallback,
+    is_cancelled: CancelCheck,
+    info: dict[str, Any] | None = None,
+    cache: SourceCache | None = None,
+    is_paused: CancelCheck | None = None,
+    catalog: OutputCatalog | None = None,
+) -> ConversionJob:
+    with get_metrics().span("transfer", item.timings):
+        info = ytdlp_service.download_audio(
+            item.url,
+            temp_dir,
+            progress_callback=_progress_hook(on_progress, is_cancelled, is_paused),
+            ffmpeg_location=options.get("ffmpeg_bin_dir"),
+            info=info,
+            weight=lambda: item.weight,
+            segments=int(options.get("download_segments", 1) or 1),
+        )
+    raise_if_cancelled(is_cancelled)
+    apply_info(item, info)
+    downloaded_path = get_downloaded_path(info)
+    observe_size("download", downloaded_path)
+    if cache is not None:
+        entry = cache.store(item.url, info, downloaded_path, pin=True)
+        if entry is not None:
+            job = _job_from_cache(index, item, options, cache, entry, catalog)
+            job.temp_dir = temp_dir
+            return job
+    return _make_job(
+        index,
+        item,
+        options,
+        info,
+        downloaded_path,
+        catalog,
+        temp_dir=temp_dir,
+        disposable_input=True,
+    )
+
+
+def stream_stage(
+    item: DownloadItem,
+    info: dict[str, Any],
+    options: dict,
+    on_progress: ProgressCallback,
+    is_cancelled: CancelCheck,
+    is_paused: CancelCheck | None = None,
+    catalog: OutputCatalog | None = None,
+) -> bool:
+    if not ytdlp_service.is_streamable(info):
+        return False
+    outputs = build_output_paths(info, options, job_variants(item, options), catalog)
+    chunks = ytdlp_service.stream_audio(
+        info,
+        progress_callback=_progress_hook(on_progress, is_cancelled, is_paused),
+        ffmpeg_location=options.get("ffmpeg_bin_dir"),
+        weight=lambda: item.weight,
+    )
+    try:
+        # Download and conversion overlap here, so they share one stage.
+        with get_metrics().span("stream", item.timings):
+            variant, output_path = outputs[0]
+            control = {
+                "is_cancelled": is_cancelled,
+                "timeout": float(options.get("ffmpeg_timeout", 0) or 0),
+            }
+            if len(outputs) == 1 and variant.is_plain_wav:
+                ffmpeg_service.convert_stream_to_wav(
+                    chunks, str(output_path), variant.sample_rate, **control
+                )
+            else:
+                ffmpeg_service.convert_stream_to_variants(
+                    chunks, [(variant, str(path)) for variant, path in outputs], **control
+                )
+    except BaseException:
+        for _, path in outputs:
+            path.unlink(missing_ok=True)
+            if catalog is not None:
+                catalog.release(path)
+        raise
+    record_outputs(item, outputs, catalog, media_key_for(item.url, info))
+    return True
+
+
+def _has_partial(staging_dir: Path) -> bool:
+    return staging_dir.is_dir() and any(staging_dir.iterdir())
+
+
+def fetch_stage(
+    index: int,
+    item: DownloadItem,
+    options: dict,
+    on_progress: ProgressCallback,
+    is_cancelled: CancelCheck,
+    on_info: Callable[[], None] | None = None,
+    cache: SourceCache | None = None,
+    prefetched: Callable[[], dict[str, Any] | None] | None = None,
+    staging_dir: str | None = None,
+    is_paused: CancelCheck | None = None,
+    catalog: OutputCatalog | None = None,
+) -> ConversionJob | None:
+    # Returns the job for the conversion stage, or None when streaming mode
+    # already wrote the WAV. With a staging_dir the partial download is kept
+    # there when the job is paused or fails in a way a retry may fix, and the
+    # next attempt continues it; the caller discards it otherwise.
+    job = cached_job(index, item, options, cache, catalog=catalog)
+    if job is not None:
+        return job
+
+    streaming = bool(options.get("stream_to_ffmpeg"))
+    info = prefetched() if prefetched is not None else None
+    raise_if_cancelled(is_cancelled, is_paused)
+    if info is None and streaming:
+        info = resolve_info(item, options)
+    if info is not None:
+        apply_info(item, info)
+        if on_info is not None:
+            on_info()
+        job = cached_job(index, item, options, cache, info=info, catalog=catalog)
+        if job is not None:
+            return job
+        # A paused download already has bytes in staging; continuing it beats
+        # streaming the whole file again.
+        resuming = bool(staging_dir) and _has_partial(Path(staging_dir))
+        if (
+            streaming
+            and not resuming
+            and stream_stage(item, info, options, on_progress, is_cancelled, is_paused, catalog)
+        ):
+            return None
+
+    temp_dir = staging_dir or tempfile.mkdtemp(prefix="pad-")
+    try:
+        return download_stage(
+            index,
+            item,
+            options,
+            temp_dir,
+            on_progress=on_progress,
+            is_cancelled=is_cancelled,
+            info=info,
+            cache=cache,
+            is_paused=is_paused,
+            catalog=catalog,
+        )
+    except BaseException as exc:
+        if not (staging_dir and (is_paused_error(exc) or is_retryable(exc))):
+            ConversionJob.remove_temp_dir(temp_dir)
+        raise
+
+
+def convert_stage(
+    job: ConversionJob,
+    on_progress: ffmpeg_service.ProgressCallback | None = None,
+    is_cancelled: CancelCheck | None = None,
+    threads: int = 0,
+) -> None:
+    def cancelled() -> bool:
+        return job.cancelled or (is_cancelled is not None and is_cancelled())
+
+    raise_if_cancelled(cancelled)
+    metrics = get_metrics()
+    if job.ready_at:
+        metrics.record("conversion_wait", time.perf_counter() - job.ready_at, job.item.timings)
+    targets = job.targets
+    control = {
+        "duration": job.item.duration,
+        "on_progress": on_progress,
+        "is_cancelled": cancelled,
+        "timeout": job.timeout,
+        "threads": threads,
+    }
+    with metrics.span("convert", job.item.timings):
+        try:
+            if len(targets) == 1 and targets[0][0].is_plain_wav:
+                ffmpeg_service.convert_to_wav(
+                    str(job.input_path),
+                    str(job.output_path),
+                    job.sample_rate,
+                    allow_move=job.disposable_input,
+                    **control,
+                )
+            else:
+                ffmpeg_service.convert_to_variants(
+                    str(job.input_path),
+                    [(variant, str(path)) for variant, path in targets],
+                    **control,
+                )
+        except BaseException:
+            # A killed or failed ffmpeg leaves a truncated file behind.
+            for _, path in targets:
+                path.unlink(missing_ok=True)
+            raise
+    record_outputs(job.item, targets, job.catalog, job.media_key)
+
+
+class HandoffQueue:
+    # put() blocks while full so finished downloads (and their temp files)
+    # can't pile up faster than the conversion stage drains them.
+    def __init__(self, maxsize: int = 2, poll_interval: float = 0.2):
+        self._queue: queue.Queue[ConversionJob | None] = queue.Queue(maxsize=max(1, maxsize))
+        self._poll_interval = poll_interval
+
+    def put(self, job: ConversionJob, is_cancelled: CancelCheck) -> None:
+        job.ready_at = time.perf_counter()
+        while True:
+            raise_if_cancelled(is_cancelled)
+            try:
+                self._queue.put(job, timeout=self._poll_interval)
+                return
+            except queue.Full:
+                continue
+
+    def get(self) -> ConversionJob | None:
+        return self._queue.get()
+
+    def close(self, discard: bool = False) -> None:
+        # The sentinel must not block on a full queue whose consumer is gone.
+        # With discard, jobs still waiting are dropped (temp files removed) to
+        # make room; otherwise this waits for the consumer to take one.
+        while True:
+            try:
+                self._queue.put_nowait(None)
+                return
+            except queue.Full:
+                pass
+            if not discard:
+                time.sleep(self._poll_interval)
+                continue
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                continue
+            if job is not None:
+                job.cleanup()
+
+    def qsize(self) -> int:
+        return self._queue.qsize()
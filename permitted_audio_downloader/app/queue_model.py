@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from typing import Iterator
+
+from PySide6 import QtCore
+
+from permitted_audio_downloader.app.job_store import JobStore
+from permitted_audio_downloader.app.models import DownloadItem
+from permitted_audio_downloader.app.utils import format_duration, format_size
+
+HEADERS = [
+    "Status", "Título", "Fonte", "Duração", "Tamanho", "Progresso", "Prioridade", "Tentativas",
+    "Último erro", "Saída",
+]
+DEFAULT_REFRESH_HZ = 15
+
+
+def _cell_text(item: DownloadItem, column: int) -> str:
+    if column == 0:
+        return item.status
+    if column == 1:
+        return item.title
+    if column == 2:
+        return item.source
+    if column == 3:
+        return format_duration(item.duration)
+    if column == 4:
+        return format_size(item.filesize)
+    if column == 5:
+        return f"{item.progress:.1f}%"
+    if column == 6:
+        return item.priority
+    if column == 7:
+        return str(item.attempts) if item.attempts else ""
+    if column == 8:
+        return item.last_error.splitlines()[0] if item.last_error else ""
+    return item.output_path
+
+
+class QueueTableModel(QtCore.QAbstractTableModel):
+    # Reads straight from the manager's job store. Workers only mark jobs
+    # dirty; inserts and repaints are flushed together a few times a second
+    # instead of once per progress chunk.
+    def __init__(self, store: JobStore, refresh_hz: int = DEFAULT_REFRESH_HZ, parent=None):
+        super().__init__(parent)
+        self._store = store
+        self._row_count = len(store)
+        self._dirty: set[int] = set()
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(max(1, 1000 // max(1, refresh_hz)))
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def rowCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._row_count
+
+    def columnCount(self, parent: QtCore.QModelIndex = QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(HEADERS)
+
+    def headerData(self, section: int, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return HEADERS[section]
+        return None
+
+    def data(self, index: QtCore.QModelIndex, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self._row_count:
+            return None
+        if role == QtCore.Qt.DisplayRole:
+            return _cell_text(self._store.at(index.row()), index.column())
+        if role == QtCore.Qt.ToolTipRole and index.column() in (0, 8):
+            return self._store.at(index.row()).last_error or None
+        return None
+
+    def item_at(self, row: int) -> DownloadItem | None:
+        if 0 <= row < self._row_count:
+            return self._store.at(row)
+        return None
+
+    def mark_dirty(self, job_id: int) -> None:
+        self._dirty.add(job_id)
+
+    def flush(self) -> None:
+        count = len(self._store)
+        if count > self._row_count:
+            self.beginInsertRows(QtCore.QModelIndex(), self._row_count, count - 1)
+            self._row_count = count
+            self.endInsertRows()
+        if not self._dirty:
+            return
+        rows = [self._store.row_of(job_id) for job_id in self._dirty]
+        rows = [row for row in rows if row is not None and row < self._row_count]
+        self._dirty.clear()
+        if rows:
+            top_left = self.index(min(rows), 0)
+            bottom_right = self.index(max(rows), len(HEADERS) - 1)
+            self.dataChanged.emit(top_left, bottom_right, [QtCore.Qt.DisplayRole])
+
+    @contextmanager
+    def resetting(self) -> Iterator[None]:
+        self.beginResetModel()
+        try:
+            yield
+        finally:
+            self._dirty.clear()
+            self._row_count = len(self._store)
+            self.endResetModel()
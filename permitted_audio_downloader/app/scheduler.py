@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import random
+import re
+import time
+from collections import Counter
+from typing import Callable
+
+from permitted_audio_downloader.app.validators import ValidationError
+
+DEFAULT_SOURCE_LIMIT = 2
+# yt-dlp wraps network errors in DownloadError, so most of the
+# classification has to go by the message.
+RETRYABLE_ERRORS = re.compile(
+    r"http error (408|425|429|5\d\d)|too many requests|timed? ?out|connection (reset|refused|"
+    r"aborted)|remote end closed|incomplete ?read|temporar(y|ily)|network is unreachable|"
+    r"broken pipe|name resolution|getaddrinfo",
+    re.IGNORECASE,
+)
+
+
+class SlotLimiter:
+    def __init__(self, max_total: int, source_limits: dict[str, int] | None = None):
+        self._active: Counter[str] = Counter()
+        self.max_total = 1
+        self.source_limits: dict[str, int] = {}
+        self.configure(max_total, source_limits)
+
+    def configure(self, max_total: int, source_limits: dict[str, int] | None = None) -> None:
+        self.max_total = max(1, int(max_total))
+        self.source_limits = {
+            source: max(1, int(limit)) for source, limit in (source_limits or {}).items()
+        }
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    def active_for(self, source: str) -> int:
+        return self._active[source]
+
+    def limit_for(self, source: str) -> int:
+        return self.source_limits.get(source, DEFAULT_SOURCE_LIMIT)
+
+    def has_free_slot(self) -> bool:
+        return self.active < self.max_total
+
+    def can_acquire(self, source: str) -> bool:
+        return self.has_free_slot() and self._active[source] < self.limit_for(source)
+
+    def acquire(self, source: str) -> bool:
+        if not self.can_acquire(source):
+            return False
+        self._active[source] += 1
+        return True
+
+    def release(self, source: str) -> None:
+        if self._active[source] > 0:
+            self._active[source] -= 1
+        if self._active[source] == 0:
+            del self._active[source]
+
+
+def is_retryable(exc: BaseException) -> bool:
+    # Only failures that a later attempt can plausibly fix; anything
+    # unrecognized (unavailable media, 403/404, bad URL) stays failed.
+    if isinstance(exc, ValidationError):
+        return False
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    return RETRYABLE_ERRORS.search(str(exc)) is not None
+
+
+def backoff_delay(
+    attempt: int,
+    base: float,
+    cap: float,
+    rng: Callable[[], float] = random.random,
+) -> float:
+    # Full jitter: anywhere up to the exponential step, so items that failed
+    # together don't come back together.
+    return rng() * min(cap, base * 2 ** max(0, attempt - 1))
+
+
+class CircuitBreaker:
+    # Per source: after `threshold` retryable failures in a row dispatch to
+    # it stops for `cooldown` seconds, then one probe job is let through.
+    # The probe's result closes the breaker or reopens it for another
+    # cooldown.
+    def __init__(
+        self,
+        threshold: int = 5,
+        cooldown: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.threshold = 1
+        self.cooldown = 0.0
+        self._clock = clock
+        self._failures: Counter[str] = Counter()
+        self._opened_at: dict[str, float] = {}
+        self._probing: set[str] = set()
+        self.configure(threshold, cooldown)
+
+    def configure(self, threshold: int, cooldown: float) -> None:
+        self.threshold = max(1, int(threshold))
+        self.cooldown = max(0.0, float(cooldown))
+
+    def state(self, source: str) -> str:
+        opened_at = self._opened_at.get(source)
+        if opened_at is None:
+            return "closed"
+        if self._clock() - opened_at < self.cooldown:
+            return "open"
+        return "half-open"
+
+    def allow(self, source: str) -> bool:
+        state = self.state(source)
+        return state == "closed" or (state == "half-open" and source not in self._probing)
+
+    def dispatched(self, source: str) -> None:
+        if self.state(source) == "half-open":
+            self._probing.add(source)
+
+    def record_success(self, source: str) -> None:
+        self._failures.pop(source, None)
+        self._opened_at.pop(source, None)
+        self._probing.discard(source)
+
+    def record_failure(self, source: str) -> bool:
+        # True when this failure opened (or reopened) the breaker.
+        self._failures[source] += 1
+        probe = source in self._probing
+        self._probing.discard(source)
+        if probe or (source not in self._opened_at and self._failures[source] >= self.threshold):
+            self._opened_at[source] = self._clock()
+            return True
+        return False
+
+    def record_other(self, source: str) -> None:
+        # Cancelled, paused or permanently failed: says nothing about the
+        # host, but a probe slot it held is free again.
+        self._probing.discard(source)
+
+    def next_probe_in(self) -> float | None:
+        # Seconds until the earliest open breaker lets a probe through; ones
+        # already half-open are picked up by the next ordinary dispatch.
+        now = self._clock()
+        waits = [opened_at + self.cooldown - now for opened_at in self._opened_at.values()]
+        waits = [wait for wait in waits if wait > 0]
+        return min(waits) if waits else None
@@ -0,0 +1,235 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any
+
+from permitted_audio_downloader.app.metadata import compact_info
+from permitted_audio_downloader.app.utils import get_app_data_dir
+
+INDEX_FILENAME = "index.json"
+# Access times alone are written at most this often (seconds); adding or
+# removing entries is written at once.
+INDEX_FLUSH_INTERVAL = 5.0
+
+
+def get_cache_dir() -> Path:
+    return get_app_data_dir("cache", "sources")
+
+
+def make_key(extractor: str, media_id: str, format_id: str) -> str:
+    return f"{extractor}:{media_id}:{format_id}"
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as handle:
+        for block in iter(lambda: handle.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    filename: str
+    size: int
+    sha256: str
+    last_access: float
+    info: dict[str, Any] = field(default_factory=dict)
+    # File mtime when the hash was last checked; 0 means never.
+    mtime_ns: int = 0
+
+
+class SourceCache:
+    def __init__(self, root: Path, max_bytes: int, verify_hash: bool = True):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.verify_hash = verify_hash
+        self._lock = threading.Lock()
+        self._entries: dict[str, CacheEntry] = {}
+        self._urls: dict[str, str] = {}
+        self._pins: dict[str, int] = {}
+        self._dirty = False
+        self._saved_at = 0.0
+        self._load()
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.size for entry in self._entries.values())
+
+    def path_for(self, entry: CacheEntry) -> Path:
+        return self.root / entry.filename
+
+    def lookup_url(self, url: str, pin: bool = False) -> CacheEntry | None:
+        with self._lock:
+            key = self._urls.get(url)
+        return self.lookup_key(key, pin=pin) if key else None
+
+    def lookup(
+        self, extractor: str, media_id: str, format_id: str, pin: bool = False
+    ) -> CacheEntry | None:
+        return self.lookup_key(make_key(extractor, media_id, format_id), pin=pin)
+
+    def lookup_info(
+        self, info: dict[str, Any], url: str | None = None, pin: bool = False
+    ) -> CacheEntry | None:
+        if not (info.get("extractor_key") and info.get("id") and info.get("format_id")):
+            return None
+        entry = self.lookup(info["extractor_key"], info["id"], info["format_id"], pin=pin)
+        if entry is not None and url:
+            with self._lock:
+                if self._urls.get(url) != entry.key:
+                    self._urls[url] = entry.key
+                    self._touch()
+        return entry
+
+    def lookup_key(self, key: str, pin: bool = False) -> CacheEntry | None:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if not self._is_intact(entry):
+            self._discard(key)
+            return None
+        with self._lock:
+            if key not in self._entries:
+                return None
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            entry.last_access = time.time()
+            self._touch()
+        return entry
+
+    def store(
+        self, url: str, info: dict[str, Any], source_path: Path, pin: bool = False
+    ) -> CacheEntry | None:
+        extractor = info.get("extractor_key") or info.get("extractor")
+        media_id = info.get("id")
+        format_id = info.get("format_id")
+        if not (extractor and media_id and format_id):
+            return None
+        size = source_path.stat().st_size
+        if size > self.max_bytes:
+            return None
+        key = make_key(extractor, media_id, format_id)
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+        filename = f"{digest}{source_path.suffix}"
+        sha256 = file_sha256(source_path)
+        shutil.move(str(source_path), str(self.root / filename))
+        mtime_ns = (self.root / filename).stat().st_mtime_ns
+        entry = CacheEntry(
+            key=key,
+            filename=filename,
+            size=size,
+            sha256=sha256,
+            last_access=time.time(),
+            info=compact_info({**info, "extractor_key": extractor}),
+            mtime_ns=mtime_ns,
+        )
+        with self._lock:
+            self._entries[key] = entry
+            self._urls[url] = key
+            if pin:
+                self._pins[key] = self._pins.get(key, 0) + 1
+            self._evict()
+            self._save()
+        return entry
+
+    def unpin(self, key: str) -> None:
+        with self._lock:
+            remaining = self._pins.get(key, 0) - 1
+            if remaining > 0:
+                self._pins[key] = remaining
+            else:
+                self._pins.pop(key, None)
+            self._evict()
+            self._save()
+
+    def flush(self) -> None:
+        with self._lock:
+            if self._dirty:
+                self._save()
+
+    def close(self) -> None:
+        self.flush()
+
+    def _touch(self) -> None:
+        # Caller holds the lock.
+        self._dirty = True
+        if time.monotonic() - self._saved_at >= INDEX_FLUSH_INTERVAL:
+            self._save()
+
+    def _is_intact(self, entry: CacheEntry) -> bool:
+        # Size and mtime first; the file is only hashed again when it was
+        # touched since the last check.
+        path = self.path_for(entry)
+        try:
+            stat = path.stat()
+        except OSError:
+            return False
+        if stat.st_size != entry.size:
+            return False
+        if not self.verify_hash or stat.st_mtime_ns == entry.mtime_ns:
+            return True
+        if file_sha256(path) != entry.sha256:
+            return False
+        with self._lock:
+            entry.mtime_ns = stat.st_mtime_ns
+            self._dirty = True
+        return True
+
+    def _discard(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._urls = {url: k for url, k in self._urls.items() if k != key}
+            if entry is not None:
+                self.path_for(entry).unlink(missing_ok=True)
+            self._save()
+
+    def _evict(self) -> None:
+        total = self.total_bytes
+        if total <= self.max_bytes:
+            return
+        for entry in sorted(self._entries.values(), key=lambda e: e.last_access):
+            if total <= self.max_bytes:
+                break
+            if self._pins.get(entry.key):
+                continue
+            self._entries.pop(entry.key)
+            self.path_for(entry).unlink(missing_ok=True)
+            total -= entry.size
+        live = set(self._entries)
+        self._urls = {url: key for url, key in self._urls.items() if key in live}
+
+    def _load(self) -> None:
+        path = self.root / INDEX_FILENAME
+        if not path.exists():
+            return
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+            entries = {key: CacheEntry(**value) for key, value in data.get("entries", {}).items()}
+            urls = dict(data.get("urls", {}))
+        except (json.JSONDecodeError, OSError, TypeError, ValueError):
+            return
+        self._entries = entries
+        self._urls = {url: key for url, key in urls.items() if key in entries}
+
+    def _save(self) -> None:
+        path = self.root / INDEX_FILENAME
+        data = {
+            "entries": {key: asdict(entry) for key, entry in self._entries.items()},
+            "urls": self._urls,
+        }
+        temp_path = path.with_suffix(".tmp")
+        temp_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        os.replace(temp_path, path)
+        self._dirty = False
+        self._saved_at = time.monotonic()
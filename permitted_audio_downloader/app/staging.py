@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import shutil
+from pathlib import Path
+from typing import Iterable
+
+from permitted_audio_downloader.app.utils import get_app_data_dir
+from permitted_audio_downloader.app.ytdlp_service import segmented_partial_bytes
+
+PART_SUFFIXES = (".part", ".ytdl")
+
+
+def get_staging_dir() -> Path:
+    return get_app_data_dir("staging")
+
+
+class StagingArea:
+    # One directory per job that survives pauses and restarts. yt-dlp keeps
+    # its .part file there and continues it with a Range request on resume;
+    # a split download keeps its .segments.part plus the per-segment offsets.
+    def __init__(self, root: Path | str):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _dir(self, key: int | str) -> Path:
+        return self.root / str(key)
+
+    def path_for(self, key: int | str) -> Path:
+        path = self._dir(key)
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def partial_bytes(self, key: int | str) -> int:
+        path = self._dir(key)
+        if not path.is_dir():
+            return 0
+        return sum(
+            segmented_partial_bytes(entry)
+            if entry.name.endswith(".segments.part")
+            else entry.stat().st_size
+            for entry in path.iterdir()
+            if entry.is_file() and entry.suffix in PART_SUFFIXES
+        )
+
+    def discard(self, key: int | str) -> None:
+        shutil.rmtree(self._dir(key), ignore_errors=True)
+
+    def prune(self, keep: Iterable[int | str]) -> int:
+        keep_names = {str(key) for key in keep}
+        removed = 0
+        for entry in self.root.iterdir():
+            if entry.is_dir() and entry.name not in keep_names:
+                shutil.rmtree(entry, ignore_errors=True)
+                removed += 1
+        return removed
@@ -33,33 +33,54 @@ class UiMainWindow:
         options_layout = QtWidgets.QHBoxLayout()
         self.preserve_name_checkbox = QtWidgets.QCheckBox("Preservar nome original")
         self.overwrite_checkbox = QtWidgets.QCheckBox("Sobrescrever se existir")
+        self.stream_checkbox = QtWidgets.QCheckBox("Converter durante o download")
         self.sample_rate_combo = QtWidgets.QComboBox()
-        self.sample_rate_combo.addItems(["44100", "48000"])
+        self.sample_rate_combo.addItems(["44100", "48000", "44100 + 48000"])
+        self.max_workers_spin = QtWidgets.QSpinBox()
+        self.max_workers_spin.setRange(1, 8)
         options_layout.addWidget(self.preserve_name_checkbox)
         options_layout.addWidget(self.overwrite_checkbox)
+        options_layout.addWidget(self.stream_checkbox)
         options_layout.addWidget(QtWidgets.QLabel("Sample rate:"))
         options_layout.addWidget(self.sample_rate_combo)
+        options_layout.addWidget(QtWidgets.QLabel("Downloads simultâneos:"))
+        options_layout.addWidget(self.max_workers_spin)
+        self.rate_limit_spin = QtWidgets.QSpinBox()
+        self.rate_limit_spin.setRange(0, 1_000_000)
+        self.rate_limit_spin.setSingleStep(128)
+        self.rate_limit_spin.setSuffix(" KB/s")
+        self.rate_limit_spin.setSpecialValueText("Sem limite")
+        options_layout.addWidget(QtWidgets.QLabel("Limite de banda:"))
+        options_layout.addWidget(self.rate_limit_spin)
         options_layout.addStretch()
         main_layout.addLayout(options_layout)
 
-        self.table = QtWidgets.QTableWidget(0, 5)
-        self.table.setHorizontalHeaderLabels([
-            "Status", "Título", "Fonte", "Progresso", "Saída"
-        ])
+        self.table = QtWidgets.QTableView()
         self.table.horizontalHeader().setStretchLastSection(True)
+        # Fixed row heights keep scrolling cheap with very long queues.
+        self.table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(24)
         self.table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectRows)
         self.table.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
         main_layout.addWidget(self.table)
 
         buttons_layout = QtWidgets.QHBoxLayout()
         self.download_button = QtWidgets.QPushButton("Baixar")
-        self.pause_button = QtWidgets.QPushButton("Pausar")
+        self.pause_button = QtWidgets.QPushButton("Pausar/Retomar item")
+        self.pause_all_button = QtWidgets.QPushButton("Pausar fila")
+        self.resume_all_button = QtWidgets.QPushButton("Retomar fila")
         self.cancel_button = QtWidgets.QPushButton("Cancelar item")
         self.clear_button = QtWidgets.QPushButton("Limpar concluídos")
         buttons_layout.addWidget(self.download_button)
         buttons_layout.addWidget(self.pause_button)
+        buttons_layout.addWidget(self.pause_all_button)
+        buttons_layout.addWidget(self.resume_all_button)
         buttons_layout.addWidget(self.cancel_button)
         buttons_layout.addWidget(self.clear_button)
+        self.priority_combo = QtWidgets.QComboBox()
+        self.priority_combo.addItems(["Baixa", "Normal", "Alta"])
+        buttons_layout.addWidget(QtWidgets.QLabel("Prioridade:"))
+        buttons_layout.addWidget(self.priority_combo)
         buttons_layout.addStretch()
         main_layout.addLayout(buttons_layout)
 
@@ -67,7 +88,9 @@ class UiMainWindow:
         logs_header = QtWidgets.QHBoxLayout()
         logs_header.addWidget(QtWidgets.QLabel("Logs"))
         self.copy_logs_button = QtWidgets.QPushButton("Copiar logs")
+        self.job_logs_checkbox = QtWidgets.QCheckBox("Só o item selecionado")
         logs_header.addStretch()
+        logs_header.addWidget(self.job_logs_checkbox)
         logs_header.addWidget(self.copy_logs_button)
         logs_layout.addLayout(logs_header)
         self.logs_text = QtWidgets.QPlainTextEdit()
@@ -76,3 +99,6 @@ class UiMainWindow:
         main_layout.addLayout(logs_layout)
 
         main_window.setCentralWidget(central_widget)
+
+        self.throughput_label = QtWidgets.QLabel()
+        main_window.statusBar().addPermanentWidget(self.throughput_label)
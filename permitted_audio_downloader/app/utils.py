@@ -30,16 +30,47 @@ def ensure_unique_path(path: Path) -> Path:
         counter += 1
 
 
-def resolve_output_path(output_dir: str, filename: str, overwrite: bool) -> Path:
+def resolve_output_path(
+    output_dir: str, filename: str, overwrite: bool, suffix: str = ".wav"
+) -> Path:
     output_dir_path = Path(output_dir)
     output_dir_path.mkdir(parents=True, exist_ok=True)
     sanitized = sanitize_filename(filename)
-    target = output_dir_path / f"{sanitized}.wav"
+    target = output_dir_path / f"{sanitized}{suffix}"
     if overwrite:
         return target
     return ensure_unique_path(target)
 
 
+def format_duration(seconds: float | None) -> str:
+    if not seconds:
+        return ""
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{secs:02d}"
+    return f"{minutes}:{secs:02d}"
+
+
+def format_size(size: int | None) -> str:
+    if not size:
+        return ""
+    value = float(size)
+    for unit in ("B", "KB", "MB"):
+        if value < 1024:
+            return f"{value:.0f} {unit}" if unit == "B" else f"{value:.1f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB"
+
+
+def get_app_data_dir(*parts: str) -> Path:
+    appdata = os.getenv("APPDATA")
+    base_dir = Path(appdata) if appdata else Path.home() / ".config"
+    data_dir = base_dir.joinpath("PermittedAudioDownloader", *parts)
+    data_dir.mkdir(parents=True, exist_ok=True)
+    return data_dir
+
+
 def get_default_music_dir() -> str:
     home = Path.home()
     return str(home / "Music" / "PermittedAudioDownloader")
@@ -1,5 +1,6 @@
 import re
-from urllib.parse import urlparse
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
 
 ALLOWED_DOMAINS = {
     "youtube.com",
@@ -15,6 +16,11 @@ SOUNDCLOUD_DOMAINS = {"soundcloud.com", "www.soundcloud.com"}
 
 URL_PATTERN = re.compile(r"^https?://", re.IGNORECASE)
 
+YOUTUBE_CHANNEL_PREFIXES = ("/@", "/channel/", "/c/", "/user/")
+YOUTUBE_ID_PATH_PREFIXES = ("shorts", "embed", "live", "v")
+YOUTUBE_ID = re.compile(r"^[A-Za-z0-9_-]+$")
+SOUNDCLOUD_USER_TABS = {"tracks", "albums", "sets", "popular-tracks", "reposts"}
+
 
 class ValidationError(ValueError):
     pass
@@ -42,6 +48,46 @@ def validate_url(url: str) -> None:
         raise ValidationError("Domínio não suportado")
 
 
+def is_playlist_url(url: str) -> bool:
+    parsed = urlparse(normalize_url(url))
+    domain = parsed.netloc.lower()
+    path = parsed.path.rstrip("/")
+    if domain in YOUTUBE_DOMAINS:
+        return path == "/playlist" or path.startswith(YOUTUBE_CHANNEL_PREFIXES)
+    if domain in SOUNDCLOUD_DOMAINS:
+        parts = [part for part in path.split("/") if part]
+        if len(parts) == 1:
+            return True
+        if len(parts) == 2:
+            return parts[1] in SOUNDCLOUD_USER_TABS
+        return parts[1] == "sets" if len(parts) > 2 else False
+    return False
+
+
+def canonicalize_url(url: str) -> Optional[tuple[str, str]]:
+    # (source, media id) for a single supported track, so that youtu.be/X,
+    # m.youtube.com/watch?v=X&t=30 and watch?v=X&list=... compare equal.
+    # None for collections and anything unrecognised.
+    parsed = urlparse(normalize_url(url))
+    domain = parsed.netloc.lower()
+    parts = [part for part in parsed.path.split("/") if part]
+    if domain in YOUTUBE_DOMAINS:
+        if domain == "youtu.be":
+            media_id = parts[0] if parts else ""
+        elif parts == ["watch"]:
+            media_id = (parse_qs(parsed.query).get("v") or [""])[0]
+        elif len(parts) >= 2 and parts[0] in YOUTUBE_ID_PATH_PREFIXES:
+            media_id = parts[1]
+        else:
+            return None
+        return ("YT", media_id) if YOUTUBE_ID.match(media_id) else None
+    if domain in SOUNDCLOUD_DOMAINS:
+        if len(parts) != 2 or parts[1] in SOUNDCLOUD_USER_TABS:
+            return None
+        return "SC", "/".join(parts).lower()
+    return None
+
+
 def get_source_label(url: str) -> str:
     domain = get_domain(url)
     if domain in YOUTUBE_DOMAINS:
@@ -1,37 +1,518 @@
 from __future__ import annotations
 
-import os
+import json
+import math
+import threading
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from itertools import islice
 from pathlib import Path
-from typing import Any, Callable
+from typing import TYPE_CHECKING, Any, Callable, Iterator
 
-from yt_dlp import YoutubeDL
+from permitted_audio_downloader.app.bandwidth import BandwidthLimiter, FlowMeter, Weight
+from permitted_audio_downloader.app.metadata import compact_info
+from permitted_audio_downloader.app.utils import get_app_data_dir
+from permitted_audio_downloader.app.validators import (
+    ValidationError,
+    is_playlist_url,
+    validate_url,
+)
+
+if TYPE_CHECKING:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.networking import Request
 
 ProgressCallback = Callable[[dict[str, Any]], None]
 
+OUTPUT_TEMPLATE = "%(id)s.%(ext)s"
 
-def download_audio(
-    url: str,
-    temp_dir: str,
-    progress_callback: ProgressCallback | None = None,
-    ffmpeg_location: Path | None = None,
-) -> dict[str, Any]:
-    output_template = os.path.join(temp_dir, "%(id)s.%(ext)s")
+STREAMABLE_PROTOCOLS = {"http", "https"}
+# Containers ffmpeg can demux from a non-seekable pipe; mp4/m4a usually need
+# the moov atom that may sit at the end of the file, so they use the temp file.
+STREAMABLE_EXTS = {"webm", "weba", "opus", "ogg", "mp3", "aac", "flac", "wav"}
+STREAM_CHUNK_SIZE = 64 * 1024
+# While a bandwidth limit is active yt-dlp reads fixed-size blocks, so the
+# progress hook (where the limiter waits) runs often enough to pace smoothly.
+LIMITED_BUFFER_SIZE = 64 * 1024
+# Direct files smaller than this are fetched in one request; below a few MB
+# the extra connections cost more than per-connection throttling does.
+SEGMENT_MIN_SIZE = 8 * 1024 * 1024
+# How often (in downloaded bytes) a split download saves its per-segment
+# progress, besides when it stops.
+SEGMENT_STATE_INTERVAL = 4 * 1024 * 1024
 
-    def hook(data: dict[str, Any]) -> None:
-        if progress_callback:
-            progress_callback(data)
 
+def get_ytdlp_cache_dir() -> Path:
+    return get_app_data_dir("cache", "yt-dlp")
+
+
+def _base_options(ffmpeg_location: Path | None = None) -> dict[str, Any]:
     options = {
         "format": "bestaudio/best",
-        "outtmpl": output_template,
         "quiet": True,
         "no_warnings": True,
+        # Progress goes through the hooks; yt-dlp's own "[download] NN%" lines
+        # would land on stdout, which batch mode keeps for JSON Lines.
+        "noprogress": True,
         "noplaylist": True,
-        "progress_hooks": [hook],
+        # Paused jobs leave a .part file in their staging dir; yt-dlp resumes
+        # it with a Range request instead of starting over.
+        "continuedl": True,
     }
     if ffmpeg_location:
         options["ffmpeg_location"] = str(ffmpeg_location)
+    return options
+
+
+class YdlSession:
+    # A long-lived YoutubeDL that keeps its HTTP connections, cookies and
+    # extractor state between jobs. Only one thread may use it at a time.
+    def __init__(self, options: dict[str, Any]):
+        self._progress_callback: ProgressCallback | None = None
+        self._meter: FlowMeter | None = None
+        # yt-dlp (and its extractor registry) is only imported here, so the
+        # window can open before it is loaded; warm_up() preloads it.
+        from yt_dlp import YoutubeDL
+
+        self.ydl = YoutubeDL(
+            {**options, "outtmpl": OUTPUT_TEMPLATE, "progress_hooks": [self._dispatch]}
+        )
+        self.jobs = 0
+
+    def _dispatch(self, data: dict[str, Any]) -> None:
+        if self._meter:
+            self._meter.update(data)
+        if self._progress_callback:
+            self._progress_callback(data)
+
+    @contextmanager
+    def job(
+        self,
+        temp_dir: str | None = None,
+        progress_callback: ProgressCallback | None = None,
+        ffmpeg_location: Path | None = None,
+        weight: Weight | None = None,
+        segments: int = 1,
+    ) -> Iterator[YoutubeDL]:
+        params = self.ydl.params
+        if temp_dir:
+            params["paths"] = {"home": temp_dir}
+        if segments > 1:
+            # DASH/HLS: yt-dlp fetches this many fragments at once and still
+            # reports one cumulative downloaded_bytes to the progress hook.
+            params["concurrent_fragment_downloads"] = segments
+        if ffmpeg_location:
+            params["ffmpeg_location"] = str(ffmpeg_location)
+        limiter = get_bandwidth_limiter()
+        if limiter.enabled:
+            params["buffersize"] = LIMITED_BUFFER_SIZE
+            params["noresizebuffer"] = True
+        self._progress_callback = progress_callback
+        self._meter = FlowMeter(limiter, weight)
+        try:
+            yield self.ydl
+        finally:
+            self._progress_callback = None
+            self._meter.close()
+            self._meter = None
+            for name in ("paths", "buffersize", "noresizebuffer", "concurrent_fragment_downloads"):
+                params.pop(name, None)
+            self.jobs += 1
+
+    @property
+    def meter(self) -> FlowMeter | None:
+        return self._meter
+
+    def close(self) -> None:
+        self.ydl.close()
+
+
+class SessionPool:
+    def __init__(self, max_size: int = 4, cache_dir: Path | None = None):
+        self.max_size = max(1, max_size)
+        self.cache_dir = cache_dir
+        self._idle: list[YdlSession] = []
+        self._created = 0
+        self._condition = threading.Condition()
+
+    def _new_session(self) -> YdlSession:
+        options = _base_options()
+        if self.cache_dir:
+            options["cachedir"] = str(self.cache_dir)
+        return YdlSession(options)
+
+    def acquire(self) -> YdlSession:
+        with self._condition:
+            while not self._idle and self._created >= self.max_size:
+                self._condition.wait()
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._new_session()
+        except BaseException:
+            with self._condition:
+                self._created -= 1
+                self._condition.notify()
+            raise
+
+    def release(self, session: YdlSession) -> None:
+        with self._condition:
+            self._idle.append(session)
+            self._condition.notify()
+
+    @contextmanager
+    def session(self) -> Iterator[YdlSession]:
+        session = self.acquire()
+        try:
+            yield session
+        finally:
+            self.release(session)
+
+    def resize(self, max_size: int) -> None:
+        with self._condition:
+            self.max_size = max(1, max_size)
+            self._condition.notify_all()
+
+    def close(self) -> None:
+        with self._condition:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for session in idle:
+            session.close()
+
+
+_pool: SessionPool | None = None
+_pool_lock = threading.Lock()
+_limiter = BandwidthLimiter()
+
+
+def get_bandwidth_limiter() -> BandwidthLimiter:
+    return _limiter
+
+
+def get_session_pool() -> SessionPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = SessionPool(cache_dir=get_ytdlp_cache_dir())
+        return _pool
+
+
+def extract_info(url: str, ffmpeg_location: Path | None = None) -> dict[str, Any]:
+    with get_session_pool().session() as session:
+        with session.job(ffmpeg_location=ffmpeg_location) as ydl:
+            return ydl.extract_info(url, download=False)
+
+
+def download_audio(
+    url: str,
+    temp_dir: str,
+    progress_callback: ProgressCallback | None = None,
+    ffmpeg_location: Path | None = None,
+    info: dict[str, Any] | None = None,
+    weight: Weight | None = None,
+    segments: int = 1,
+) -> dict[str, Any]:
+    with get_session_pool().session() as session:
+        with session.job(temp_dir, progress_callback, ffmpeg_location, weight, segments) as ydl:
+            if segments > 1:
+                if info is None:
+                    info = ydl.extract_info(url, download=False)
+                result = _download_segmented(session, ydl, info, segments, progress_callback)
+                if result is not None:
+                    return result
+            if info is not None:
+                return ydl.process_ie_result(info, download=True)
+            return ydl.extract_info(url, download=True)
+
+
+def _request(url: str, headers: dict[str, str]) -> Request:
+    from yt_dlp.networking import Request
+
+    return Request(url, headers=headers)
+
+
+def warm_up() -> None:
+    # Imports yt-dlp and builds one idle session off the UI thread, so the
+    # first real download doesn't pay for it.
+    pool = get_session_pool()
+    pool.release(pool.acquire())
+
+
+def _probe_total(ydl: YoutubeDL, url: str, headers: dict[str, str]) -> int:
+    # Only a 206 with a full Content-Range proves the server honours ranges.
+    request = _request(url, {**headers, "Range": "bytes=0-0"})
+    with ydl.urlopen(request) as response:
+        if response.status != 206:
+            return 0
+        return _response_total(response.headers, ranged=True)
+
+
+def _download_segmented(
+    session: YdlSession,
+    ydl: YoutubeDL,
+    info: dict[str, Any],
+    segments: int,
+    progress_callback: ProgressCallback | None = None,
+) -> dict[str, Any] | None:
+    # A single direct file is split into `segments` byte ranges fetched on
+    # separate connections and written in place at their offsets, so the
+    # file is assembled in order without a merge step. Returns None when the
+    # source can't be split and yt-dlp should download it as usual.
+    if info.get("requested_formats") or info.get("protocol") not in STREAMABLE_PROTOCOLS:
+        return None
+    known = info.get("filesize") or info.get("filesize_approx") or 0
+    if not info.get("url") or (known and known < SEGMENT_MIN_SIZE):
+        return None
+    filepath = Path(ydl.prepare_filename(info))
+    if Path(f"{filepath}.part").exists():
+        # A paused sequential download resumes faster than starting over.
+        return None
+    headers = dict(info.get("http_headers") or {})
+    total = _probe_total(ydl, info["url"], headers)
+    if total < SEGMENT_MIN_SIZE:
+        return None
+
+    part = Path(f"{filepath}.segments.part")
+    state_path = Path(f"{filepath}.segments.json")
+    ranges = _load_segment_state(part, state_path, total)
+    if ranges is None:
+        size = math.ceil(total / segments)
+        ranges = [[start, min(start + size, total) - 1, 0] for start in range(0, total, size)]
+        filepath.parent.mkdir(parents=True, exist_ok=True)
+        with part.open("wb") as handle:
+            handle.truncate(total)
+    lock = threading.Lock()
+    stop = threading.Event()
+    downloaded = sum(done for _, _, done in ranges)
+    saved_at = downloaded
+
+    def save_state() -> None:
+        temp = state_path.with_name(f"{state_path.name}.tmp")
+        temp.write_text(json.dumps({"total": total, "ranges": ranges}), encoding="utf-8")
+        temp.replace(state_path)
+
+    def report(nbytes: int) -> None:
+        nonlocal downloaded, saved_at
+        # Serialised so the hook sees a monotonic total and runs on one
+        # thread at a time; an exception it raises (cancel/pause) stops all.
+        with lock:
+            downloaded += nbytes
+            if downloaded - saved_at >= SEGMENT_STATE_INTERVAL:
+                save_state()
+                saved_at = downloaded
+            if progress_callback:
+                progress_callback(
+                    {"status": "downloading", "downloaded_bytes": downloaded, "total_bytes": total}
+                )
+
+    def fetch(segment: list[int]) -> None:
+        start, end, done = segment
+        if start + done > end:
+            return
+        request = _request(info["url"], {**headers, "Range": f"bytes={start + done}-{end}"})
+        # Unbuffered, so a byte counted in the saved state is already in the
+        # file when the process stops.
+        with part.open("r+b", buffering=0) as handle, ydl.urlopen(request) as response:
+            if response.status != 206:
+                raise RuntimeError("Servidor ignorou o pedido de intervalo")
+            handle.seek(start + done)
+            while start + segment[2] <= end and not stop.is_set():
+                chunk = response.read(min(STREAM_CHUNK_SIZE, end - start - segment[2] + 1))
+                if not chunk:
+                    raise RuntimeError("Conexão encerrada antes do fim do segmento")
+                handle.write(chunk)
+                segment[2] += len(chunk)
+                session.meter.charge(len(chunk))
+                report(len(chunk))
+
+    try:
+        with ThreadPoolExecutor(max_workers=len(ranges), thread_name_prefix="segment") as pool:
+            futures = [pool.submit(fetch, segment) for segment in ranges]
+            wait(futures, return_when=FIRST_EXCEPTION)
+            stop.set()
+            for future in futures:
+                future.result()
+    except BaseException:
+        # Each segment picks up from its own offset next time (pause,
+        # restart); the staging area removes both files on cancel.
+        with lock:
+            save_state()
+        raise
+    part.replace(filepath)
+    state_path.unlink(missing_ok=True)
+    if progress_callback:
+        progress_callback(
+            {"status": "finished", "downloaded_bytes": total, "total_bytes": total}
+        )
+    return {**info, "filepath": str(filepath), "requested_downloads": [{"filepath": str(filepath)}]}
+
+
+def _load_segment_state(part: Path, state_path: Path, total: int) -> list[list[int]] | None:
+    # [[start, end, bytes done], ...] saved by an interrupted split download
+    # of the same file, or None to start over.
+    if not part.exists() or not state_path.exists():
+        return None
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        ranges = [[int(start), int(end), int(done)] for start, end, done in state["ranges"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    if state.get("total") != total or part.stat().st_size != total:
+        return None
+    return ranges
+
+
+def segmented_partial_bytes(part: Path) -> int:
+    # Bytes an interrupted split download really has; the .part itself is
+    # allocated at full size up front.
+    state_path = part.with_name(part.name.removesuffix(".part") + ".json")
+    try:
+        state = json.loads(state_path.read_text(encoding="utf-8"))
+        return sum(int(done) for _, _, done in state["ranges"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return 0
+
+
+def _resolve_redirects(ydl: YoutubeDL, url: str) -> dict[str, Any]:
+    result = ydl.extract_info(url, download=False, process=False)
+    while result.get("_type") in ("url", "url_transparent"):
+        result = ydl.extract_info(
+            result["url"], download=False, process=False, ie_key=result.get("ie_key")
+        )
+    return result
+
+
+def entry_url(entry: dict[str, Any]) -> str:
+    return entry.get("webpage_url") or entry.get("url") or ""
+
+
+PLAYLIST_TYPES = ("playlist", "multi_video")
+
+
+def _is_public_url(url: str) -> bool:
+    try:
+        validate_url(url)
+    except ValidationError:
+        return False
+    return True
+
+
+def _expand_entries(ydl: YoutubeDL, result: dict[str, Any]) -> Iterator[dict[str, Any]]:
+    for entry in result.get("entries") or []:
+        if not entry:
+            continue
+        url = entry_url(entry)
+        if entry.get("_type") in PLAYLIST_TYPES:
+            # Channel roots list their tabs (Videos, Shorts, ...) as playlists.
+            yield from _expand_entries(ydl, entry)
+        elif entry.get("_type") in ("url", "url_transparent") and is_playlist_url(url):
+            yield from _expand_entries(ydl, _resolve_redirects(ydl, url))
+        elif url and not _is_public_url(url):
+            # SoundCloud sets list the tracks they did not inline as
+            # api-v2.soundcloud.com stubs; resolving one gives its public page.
+            try:
+                resolved = ydl.extract_info(
+                    url, download=False, process=False, ie_key=entry.get("ie_key")
+                )
+            except Exception:
+                yield entry
+            else:
+                yield resolved if _is_public_url(entry_url(resolved)) else entry
+        else:
+            yield entry
+
+
+def iter_playlist_entries(
+    url: str, ffmpeg_location: Path | None = None
+) -> Iterator[dict[str, Any]]:
+    # process=False keeps "entries" as the extractor's own generator, so pages
+    # are only requested as the caller iterates.
+    options = _base_options(ffmpeg_location)
+    options["noplaylist"] = False
+    options["cachedir"] = str(get_ytdlp_cache_dir())
+    session = YdlSession(options)
+    try:
+        with session.job() as ydl:
+            result = _resolve_redirects(ydl, url)
+            if result.get("_type") not in PLAYLIST_TYPES:
+                yield result
+                return
+            yield from _expand_entries(ydl, result)
+    finally:
+        session.close()
+
+
+def iter_playlist_pages(
+    url: str, page_size: int = 25, ffmpeg_location: Path | None = None
+) -> Iterator[list[tuple[str, dict[str, Any]]]]:
+    # Entries without a usable URL are passed on too, so the caller can
+    # report them instead of them silently vanishing from the listing.
+    entries = (
+        (entry_url(entry), compact_info(entry))
+        for entry in iter_playlist_entries(url, ffmpeg_location)
+    )
+    while True:
+        page = list(islice(entries, page_size))
+        if not page:
+            return
+        yield page
+
+
+def is_streamable(info: dict[str, Any]) -> bool:
+    if info.get("requested_formats") or not info.get("url"):
+        return False
+    return info.get("protocol") in STREAMABLE_PROTOCOLS and info.get("ext") in STREAMABLE_EXTS
+
+
+def _response_total(headers: Any, ranged: bool) -> int:
+    if ranged:
+        content_range = headers.get("Content-Range") or ""
+        _, _, size = content_range.rpartition("/")
+        return int(size) if size.isdigit() else 0
+    return int(headers.get("Content-Length") or 0)
+
+
+def stream_audio(
+    info: dict[str, Any],
+    progress_callback: ProgressCallback | None = None,
+    ffmpeg_location: Path | None = None,
+    chunk_size: int = STREAM_CHUNK_SIZE,
+    weight: Weight | None = None,
+) -> Iterator[bytes]:
+    headers = dict(info.get("http_headers") or {})
+    range_size = (info.get("downloader_options") or {}).get("http_chunk_size")
+    total = info.get("filesize") or info.get("filesize_approx") or 0
+    downloaded = 0
+
+    def report(status: str) -> None:
+        if progress_callback:
+            progress_callback(
+                {"status": status, "downloaded_bytes": downloaded, "total_bytes": total}
+            )
 
-    with YoutubeDL(options) as ydl:
-        info = ydl.extract_info(url, download=True)
-        return info
+    with get_session_pool().session() as session, session.job(
+        ffmpeg_location=ffmpeg_location, weight=weight
+    ) as ydl:
+        while True:
+            request_headers = dict(headers)
+            if range_size:
+                # Same chunked range requests yt-dlp's HttpFD uses to avoid throttling.
+                request_headers["Range"] = f"bytes={downloaded}-{downloaded + range_size - 1}"
+            received = 0
+            with ydl.urlopen(_request(info["url"], request_headers)) as response:
+                if not total:
+                    total = _response_total(response.headers, ranged=bool(range_size))
+                while True:
+                    chunk = response.read(chunk_size)
+                    if not chunk:
+                        break
+                    received += len(chunk)
+                    downloaded += len(chunk)
+                    session.meter.charge(len(chunk))
+                    report("downloading")
+                    yield chunk
+            if not range_size or received < range_size or (total and downloaded >= total):
+                break
+    report("finished")
@@ -0,0 +1,366 @@
+"""End-to-end download + conversion benchmark against a local HTTP server.
+
+    python -m permitted_audio_downloader.benchmarks.bench_pipeline
+    python -m permitted_audio_downloader.benchmarks.bench_pipeline \\
+        --formats mp3,webm --duration 120 --queue-sizes 8,32 --concurrency 1,4 \\
+        --output results.json
+    python -m permitted_audio_downloader.benchmarks.bench_pipeline --compare results.json
+
+Synthetic tones are generated with ffmpeg and served with Range support; yt-dlp
+resolves them through its generic extractor. Each scenario runs in a fresh
+subprocess that drives the real DownloadManager -> DownloadWorker ->
+ConversionWorker -> ffmpeg_service path, so peak RSS is per scenario. The
+local server is allow-listed only inside that subprocess.
+
+Results are JSON (one entry per scenario). --compare exits with 1 when a
+scenario's throughput drops more than --tolerance below the given baseline.
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from permitted_audio_downloader.benchmarks.local_server import (
+    FORMATS,
+    make_synthetic_audio,
+    media_url,
+    serve_media,
+)
+
+STAGES = ("queue_wait", "fetch", "handoff_wait", "convert", "total")
+# Status that closes each stage, in pipeline order.
+STAGE_END = {
+    "queue_wait": "Baixando",
+    "fetch": "Aguardando conversão",
+    "handoff_wait": "Convertendo",
+    "convert": "Concluído",
+}
+
+
+def peak_rss_mb() -> tuple[Optional[float], Optional[float]]:
+    # (this process, its largest child); None where the platform can't tell.
+    if resource is not None:
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        # ru_maxrss is KiB on Linux and bytes on macOS.
+        rss_unit = 1 if sys.platform == "darwin" else 1024
+        return (
+            round(usage.ru_maxrss * rss_unit / 2**20, 1),
+            round(children.ru_maxrss * rss_unit / 2**20, 1),
+        )
+    try:
+        import psutil
+    except ImportError:
+        return None, None
+    memory = psutil.Process().memory_info()
+    # peak_wset is the Windows peak working set; finished ffmpeg children
+    # are no longer visible, so their peak is unknown.
+    return round(getattr(memory, "peak_wset", memory.rss) / 2**20, 1), None
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def _summarize(values: list[float]) -> dict[str, float]:
+    return {
+        "p50": round(percentile(values, 0.50), 4),
+        "p90": round(percentile(values, 0.90), 4),
+        "p99": round(percentile(values, 0.99), 4),
+        "max": round(max(values), 4) if values else 0.0,
+    }
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class DiskSampler(threading.Thread):
+    def __init__(self, paths: list[Path], interval: float = 0.05):
+        super().__init__(name="disk-sampler", daemon=True)
+        self.paths = paths
+        self.interval = interval
+        self.peak = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        while not self._done.wait(self.interval):
+            self.peak = max(self.peak, sum(_dir_size(path) for path in self.paths))
+
+    def stop(self) -> int:
+        self._done.set()
+        self.join()
+        return self.peak
+
+
+def run_scenario(scenario: dict[str, Any]) -> dict[str, Any]:
+    # Runs inside the child process; everything the app writes goes to workdir.
+    workdir = Path(tempfile.mkdtemp(prefix="pad-bench-"))
+    os.environ["APPDATA"] = str(workdir / "appdata")
+    tmp_dir = workdir / "tmp"
+    out_dir = workdir / "out"
+    tmp_dir.mkdir()
+    out_dir.mkdir()
+    tempfile.tempdir = str(tmp_dir)
+
+    from PySide6 import QtCore
+
+    from permitted_audio_downloader.app import ffmpeg_service, validators
+    from permitted_audio_downloader.app.download_manager import DownloadManager
+    from permitted_audio_downloader.app.staging import get_staging_dir
+
+    validators.ALLOWED_DOMAINS.add(validators.get_domain(scenario["base_url"]))
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    concurrency = scenario["concurrency"]
+    manager = DownloadManager(
+        {
+            "output_dir": str(out_dir),
+            "preserve_name": False,
+            "overwrite": False,
+            "sample_rate": scenario["sample_rate"],
+            "ffmpeg_bin_dir": None,
+            "max_workers": concurrency,
+            "source_limits": {"": concurrency},
+            "conversion_queue_size": scenario["conversion_queue_size"],
+            "stream_to_ffmpeg": scenario["stream"],
+            "cache_enabled": False,
+            "metadata_workers": 2,
+            "persist_queue": False,
+        }
+    )
+    events: dict[int, dict[str, float]] = {}
+    outcomes: dict[int, bool] = {}
+
+    def on_status(job_id: int, status: str) -> None:
+        events.setdefault(job_id, {}).setdefault(status, time.perf_counter())
+
+    def on_finished(job_id: int, success: bool, message: str) -> None:
+        outcomes[job_id] = success
+        events.setdefault(job_id, {}).setdefault("Concluído", time.perf_counter())
+
+    manager.item_status.connect(on_status)
+    manager.item_finished.connect(on_finished)
+    manager.queue_empty.connect(app.quit)
+    timed_out = []
+
+    def on_timeout() -> None:
+        timed_out.append(True)
+        app.quit()
+
+    QtCore.QTimer.singleShot(int(scenario["timeout"] * 1000), on_timeout)
+
+    sampler = DiskSampler([tmp_dir, get_staging_dir()])
+    sampler.start()
+    started = time.perf_counter()
+    queued_at: dict[int, float] = {}
+    for number in range(scenario["queue_size"]):
+        job_id = manager.add_item(media_url(scenario["base_url"], scenario["format"], number))
+        queued_at[job_id] = time.perf_counter()
+    manager.start()
+    app.exec()
+    wall = time.perf_counter() - started
+    peak_temp = sampler.stop()
+    manager.shutdown()
+
+    stages: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    for job_id, marks in events.items():
+        previous = queued_at.get(job_id)
+        for stage, status in STAGE_END.items():
+            # Streaming jobs skip the handoff/convert statuses; a stage is
+            # only measured when the one before it was seen too.
+            if status not in marks or previous is None:
+                previous = None
+                continue
+            stages[stage].append(marks[status] - previous)
+            previous = marks[status]
+        if "Concluído" in marks and job_id in queued_at:
+            stages["total"].append(marks["Concluído"] - queued_at[job_id])
+
+    succeeded = sum(1 for ok in outcomes.values() if ok)
+    downloaded = succeeded * scenario["source_bytes"]
+    peak_rss, peak_child_rss = peak_rss_mb()
+    return {
+        "scenario": {k: v for k, v in scenario.items() if k not in ("base_url", "timeout")},
+        "succeeded": succeeded,
+        "failed": scenario["queue_size"] - succeeded,
+        "timed_out": bool(timed_out),
+        "wall_s": round(wall, 3),
+        "throughput_mb_s": round(downloaded / wall / 2**20, 3) if wall else 0.0,
+        "items_per_s": round(succeeded / wall, 3) if wall else 0.0,
+        "audio_x_realtime": round(succeeded * scenario["duration"] / wall, 1) if wall else 0.0,
+        "stages": {stage: _summarize(values) for stage, values in stages.items() if values},
+        "peak_rss_mb": peak_rss,
+        "peak_child_rss_mb": peak_child_rss,
+        "peak_temp_mb": round(peak_temp / 2**20, 2),
+        "output_mb": round(_dir_size(out_dir) / 2**20, 2),
+        "conversion_paths": ffmpeg_service.get_conversion_stats(),
+    }
+
+
+def _scenario_key(result: dict[str, Any]) -> tuple:
+    scenario = result["scenario"]
+    return (
+        scenario["format"],
+        scenario["duration"],
+        scenario["queue_size"],
+        scenario["concurrency"],
+        scenario["stream"],
+    )
+
+
+def compare(results: list[dict], baseline: list[dict], tolerance: float) -> list[str]:
+    previous = {_scenario_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(_scenario_key(result))
+        if not old or not old["throughput_mb_s"]:
+            continue
+        ratio = result["throughput_mb_s"] / old["throughput_mb_s"]
+        if ratio < 1 - tolerance:
+            regressions.append(
+                f"{_scenario_key(result)}: {old['throughput_mb_s']} -> "
+                f"{result['throughput_mb_s']} MB/s ({(ratio - 1) * 100:+.0f}%)"
+            )
+    return regressions
+
+
+def _environment(ffmpeg: str) -> dict[str, Any]:
+    def first_line(command: list[str]) -> str:
+        try:
+            completed = subprocess.run(command, capture_output=True, text=True, check=False)
+            return completed.stdout.splitlines()[0] if completed.stdout else ""
+        except OSError:
+            return ""
+
+    import yt_dlp.version
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "yt_dlp": yt_dlp.version.__version__,
+        "ffmpeg": first_line([ffmpeg, "-version"]),
+        "commit": first_line(["git", "rev-parse", "--short", "HEAD"]),
+    }
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--formats", default="mp3,webm", help=f"entre {','.join(FORMATS)}")
+    parser.add_argument("--duration", type=int, default=60, help="segundos de áudio por arquivo")
+    parser.add_argument("--queue-sizes", type=_int_list, default=[4, 16])
+    parser.add_argument("--concurrency", type=_int_list, default=[1, 3])
+    parser.add_argument("--sample-rate", type=int, choices=(44100, 48000), default=44100)
+    parser.add_argument("--conversion-queue-size", type=int, default=2)
+    parser.add_argument("--stream", action="store_true", help="converter durante o download")
+    parser.add_argument("--timeout", type=float, default=600, help="limite por cenário (s)")
+    parser.add_argument("--output", help="grava os resultados JSON neste arquivo")
+    parser.add_argument("--compare", help="resultados anteriores para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    parser.add_argument("--scenario", help=argparse.SUPPRESS)
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    if args.scenario:
+        print(json.dumps(run_scenario(json.loads(args.scenario))), flush=True)
+        # Skip interpreter teardown: Qt objects finalized during GC can abort
+        # the process after the result is already written.
+        os._exit(0)
+
+    from permitted_audio_downloader.app.ffmpeg_service import find_ffmpeg
+
+    ffmpeg = find_ffmpeg()
+    formats = [fmt for fmt in args.formats.split(",") if fmt]
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pad-media-") as media_dir:
+        files = {
+            fmt: make_synthetic_audio(ffmpeg, Path(media_dir), fmt, args.duration)
+            for fmt in formats
+        }
+        with serve_media(files) as base_url:
+            matrix = itertools.product(formats, args.queue_sizes, args.concurrency)
+            for fmt, queue_size, concurrency in matrix:
+                scenario = {
+                    "base_url": base_url,
+                    "format": fmt,
+                    "duration": args.duration,
+                    "source_bytes": files[fmt].stat().st_size,
+                    "queue_size": queue_size,
+                    "concurrency": concurrency,
+                    "sample_rate": args.sample_rate,
+                    "conversion_queue_size": args.conversion_queue_size,
+                    "stream": args.stream,
+                    "timeout": args.timeout,
+                }
+                completed = subprocess.run(
+                    [sys.executable, "-m", __spec__.name, "--scenario", json.dumps(scenario)],
+                    capture_output=True,
+                    text=True,
+                    check=False,
+                )
+                if completed.returncode != 0:
+                    print(completed.stderr, file=sys.stderr)
+                    return completed.returncode
+                result = json.loads(completed.stdout.strip().splitlines()[-1])
+                results.append(result)
+                print(
+                    f"{fmt:>5} queue={queue_size:<4} workers={concurrency:<2} "
+                    f"{result['throughput_mb_s']:>8.2f} MB/s  "
+                    f"{result['items_per_s']:>6.2f} itens/s  "
+                    f"total p90={result['stages'].get('total', {}).get('p90', 0):.2f}s  "
+                    f"rss={result['peak_rss_mb'] or '?'} MB  temp={result['peak_temp_mb']} MB",
+                    file=sys.stderr,
+                )
+
+    report = {"environment": _environment(ffmpeg), "results": results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))["results"]
+        regressions = compare(results, baseline, args.tolerance)
+        for line in regressions:
+            print(f"Regressão: {line}", file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
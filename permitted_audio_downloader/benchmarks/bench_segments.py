@@ -0,0 +1,111 @@
+"""Segmented (parallel range) download benchmark against a throttled local server.
+
+    python -m permitted_audio_downloader.benchmarks.bench_segments
+    python -m permitted_audio_downloader.benchmarks.bench_segments \\
+        --duration 300 --connection-rate 2048 --segments 1,2,4,8 --output segments.json
+
+Serves one synthetic WAV with Range support and a per-connection rate cap,
+like a CDN that throttles each stream, and downloads it through
+ytdlp_service.download_audio once per --segments value. Reports wall time,
+throughput and whether the progress hook stayed monotonic and ended at the
+file size.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any
+
+from permitted_audio_downloader.benchmarks.local_server import (
+    make_synthetic_audio,
+    media_url,
+    serve_media,
+)
+
+
+def _int_list(value: str) -> list[int]:
+    return [int(part) for part in value.split(",") if part]
+
+
+def run_download(base_url: str, segments: int, number: int, size: int) -> dict[str, Any]:
+    from permitted_audio_downloader.app import ytdlp_service
+
+    reports: list[int] = []
+
+    def on_progress(data: dict[str, Any]) -> None:
+        if data.get("status") == "downloading":
+            reports.append(int(data.get("downloaded_bytes") or 0))
+
+    with tempfile.TemporaryDirectory(prefix="pad-segments-") as temp_dir:
+        started = time.perf_counter()
+        info = ytdlp_service.download_audio(
+            media_url(base_url, "wav", number), temp_dir, on_progress, segments=segments
+        )
+        wall = time.perf_counter() - started
+        requested = info.get("requested_downloads") or [{}]
+        received = Path(requested[0].get("filepath") or info["filepath"]).stat().st_size
+    return {
+        "segments": segments,
+        "wall_s": round(wall, 3),
+        "throughput_mb_s": round(received / wall / 2**20, 3) if wall else 0.0,
+        "complete": received == size,
+        "progress_monotonic": reports == sorted(reports),
+        "progress_final": reports[-1] if reports else 0,
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=int, default=120, help="segundos de áudio (WAV)")
+    parser.add_argument(
+        "--connection-rate", type=int, default=1024, help="limite por conexão em KB/s (0 = sem)"
+    )
+    parser.add_argument("--segments", type=_int_list, default=[1, 2, 4, 8])
+    parser.add_argument("--output", help="grava os resultados JSON neste arquivo")
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    os.environ.setdefault("APPDATA", tempfile.mkdtemp(prefix="pad-bench-appdata-"))
+
+    from permitted_audio_downloader.app import ytdlp_service
+    from permitted_audio_downloader.app.ffmpeg_service import find_ffmpeg
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix="pad-media-") as media_dir:
+        source = make_synthetic_audio(find_ffmpeg(), Path(media_dir), "wav", args.duration)
+        size = source.stat().st_size
+        # Split every run, whatever --duration produced.
+        ytdlp_service.SEGMENT_MIN_SIZE = 1
+        with serve_media({"wav": source}, args.connection_rate * 1024) as base_url:
+            for number, segments in enumerate(args.segments):
+                result = run_download(base_url, segments, number, size)
+                results.append(result)
+                print(
+                    f"segments={segments:<3} {result['wall_s']:>8.2f}s  "
+                    f"{result['throughput_mb_s']:>8.2f} MB/s  "
+                    f"completo={result['complete']}  progresso ok={result['progress_monotonic']}",
+                    file=sys.stderr,
+                )
+
+    report = {
+        "source_bytes": size,
+        "connection_rate_kb_s": args.connection_rate,
+        "results": results,
+    }
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,187 @@
+"""Cold-start import time and time to first paint, checked against a budget.
+
+    python -m permitted_audio_downloader.benchmarks.bench_startup
+    python -m permitted_audio_downloader.benchmarks.bench_startup --runs 5 --output startup.json
+
+Every measurement runs in a fresh interpreter. Import times come from
+python -X importtime for the GUI and batch entry points; first paint is the
+time from interpreter start to the first event-loop turn after the main
+window is shown. Exits with 1 when the median of any entry point exceeds its
+budget or when it loads a module that should only be loaded on first use
+(yt-dlp for both, Qt for batch).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+from typing import Any
+
+ENTRY_POINTS = {
+    "gui": "permitted_audio_downloader.main",
+    "batch": "permitted_audio_downloader.app.batch",
+}
+# Loaded on first use (or by the post-paint warm-up), never at import.
+DEFERRED = {
+    "gui": ("yt_dlp", "http.server"),
+    "batch": ("yt_dlp", "PySide6", "http.server"),
+}
+BUDGET_MS = {"gui": 600, "batch": 250, "first_paint": 1500}
+
+FIRST_PAINT = """
+import time
+started = time.perf_counter()
+import json, os, sys
+from PySide6 import QtCore, QtWidgets
+from permitted_audio_downloader.main import MainWindow
+imported = time.perf_counter()
+app = QtWidgets.QApplication([])
+window = MainWindow()
+window.show()
+
+def painted():
+    print(json.dumps({
+        "import_ms": (imported - started) * 1000,
+        "first_paint_ms": (time.perf_counter() - started) * 1000,
+        "yt_dlp_loaded": "yt_dlp" in sys.modules,
+    }), flush=True)
+    os._exit(0)
+
+QtCore.QTimer.singleShot(0, painted)
+app.exec()
+"""
+
+
+def _child_env() -> dict[str, str]:
+    env = dict(os.environ)
+    # A fresh profile: no restored queue, nothing resolved at startup.
+    env["APPDATA"] = tempfile.mkdtemp(prefix="pad-startup-")
+    if sys.platform.startswith("linux") and not (
+        env.get("DISPLAY") or env.get("WAYLAND_DISPLAY")
+    ):
+        env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    return env
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, cumulative, name = line.removeprefix("import time:").split("|", 2)
+        if own.strip().isdigit():
+            rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
+
+
+def measure_import(entry: str) -> dict[str, Any]:
+    module = ENTRY_POINTS[entry]
+    code = f"import json, sys, {module}; print(json.dumps(sorted(sys.modules)))"
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=_child_env(),
+    )
+    modules = set(json.loads(completed.stdout.strip().splitlines()[-1]))
+    rows = parse_importtime(completed.stderr)
+    total = next((cumulative for name, _, cumulative in rows if name == module), 0)
+    heaviest = sorted(rows, key=lambda row: row[1], reverse=True)[:10]
+    return {
+        "entry": entry,
+        "import_ms": round(total / 1000, 1),
+        "deferred_loaded": [
+            name for name in DEFERRED[entry]
+            if name in modules or any(m.startswith(f"{name}.") for m in modules)
+        ],
+        "heaviest": [
+            {"module": name, "self_ms": round(own / 1000, 1)} for name, own, _ in heaviest
+        ],
+    }
+
+
+def measure_first_paint() -> dict[str, Any]:
+    completed = subprocess.run(
+        [sys.executable, "-c", FIRST_PAINT],
+        capture_output=True,
+        text=True,
+        check=True,
+        env=_child_env(),
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def check_budget(results: dict[str, Any], budgets: dict[str, float]) -> list[str]:
+    problems = []
+    for entry in ENTRY_POINTS:
+        median = results[entry]["median_ms"]
+        if median > budgets[entry]:
+            problems.append(f"{entry}: import {median:.0f} ms > {budgets[entry]:.0f} ms")
+        for name in results[entry]["deferred_loaded"]:
+            problems.append(f"{entry}: {name} carregado na importação")
+    paint = results.get("first_paint")
+    if paint:
+        if paint["median_ms"] > budgets["first_paint"]:
+            problems.append(
+                f"primeira pintura {paint['median_ms']:.0f} ms > {budgets['first_paint']:.0f} ms"
+            )
+        if paint["yt_dlp_loaded"]:
+            problems.append("yt_dlp carregado antes da primeira pintura")
+    return problems
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--budget-gui-ms", type=float, default=BUDGET_MS["gui"])
+    parser.add_argument("--budget-batch-ms", type=float, default=BUDGET_MS["batch"])
+    parser.add_argument("--budget-paint-ms", type=float, default=BUDGET_MS["first_paint"])
+    parser.add_argument("--no-gui", action="store_true", help="não mede a primeira pintura")
+    parser.add_argument("--output", help="grava os resultados JSON neste arquivo")
+    return parser
+
+
+def main() -> int:
+    args = build_parser().parse_args()
+    runs = max(1, args.runs)
+    results: dict[str, Any] = {}
+    for entry in ENTRY_POINTS:
+        samples = [measure_import(entry) for _ in range(runs)]
+        results[entry] = {
+            "median_ms": round(statistics.median(s["import_ms"] for s in samples), 1),
+            "samples_ms": [s["import_ms"] for s in samples],
+            "deferred_loaded": sorted({n for s in samples for n in s["deferred_loaded"]}),
+            "heaviest": samples[-1]["heaviest"],
+        }
+    if not args.no_gui:
+        paints = [measure_first_paint() for _ in range(runs)]
+        results["first_paint"] = {
+            "median_ms": round(statistics.median(p["first_paint_ms"] for p in paints), 1),
+            "samples_ms": [round(p["first_paint_ms"], 1) for p in paints],
+            "yt_dlp_loaded": any(p["yt_dlp_loaded"] for p in paints),
+        }
+
+    budgets = {
+        "gui": args.budget_gui_ms,
+        "batch": args.budget_batch_ms,
+        "first_paint": args.budget_paint_ms,
+    }
+    problems = check_budget(results, budgets)
+    text = json.dumps({"budgets_ms": budgets, "results": results}, indent=2, ensure_ascii=False)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    else:
+        print(text)
+    for line in problems:
+        print(f"Fora do orçamento: {line}", file=sys.stderr)
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
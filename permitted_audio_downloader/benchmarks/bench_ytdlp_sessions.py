@@ -0,0 +1,84 @@
+"""Per-job yt-dlp setup cost: a fresh YoutubeDL per job vs. a pooled session.
+
+    python -m permitted_audio_downloader.benchmarks.bench_ytdlp_sessions
+    python -m permitted_audio_downloader.benchmarks.bench_ytdlp_sessions --url https://youtu.be/...
+
+Without --url only the local setup is measured (building YoutubeDL and
+instantiating the YouTube/SoundCloud extractors). With --url every job also
+runs extract_info(download=False), which includes the network warm-up that
+the pool keeps between jobs (connections, cookies, client_id, player cache).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from yt_dlp import YoutubeDL
+
+from permitted_audio_downloader.app.ytdlp_service import SessionPool, _base_options
+
+EXTRACTORS = ("Youtube", "Soundcloud")
+
+
+def _job(ydl: YoutubeDL, url: str | None) -> None:
+    for name in EXTRACTORS:
+        ydl.get_info_extractor(name)
+    if url:
+        ydl.extract_info(url, download=False)
+
+
+def run_fresh(jobs: int, url: str | None, cache_dir: Path) -> list[float]:
+    timings = []
+    for _ in range(jobs):
+        started = time.perf_counter()
+        with YoutubeDL({**_base_options(), "cachedir": str(cache_dir)}) as ydl:
+            _job(ydl, url)
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def run_pooled(jobs: int, url: str | None, cache_dir: Path) -> list[float]:
+    pool = SessionPool(max_size=1, cache_dir=cache_dir)
+    timings = []
+    try:
+        for _ in range(jobs):
+            started = time.perf_counter()
+            with pool.session() as session, session.job() as ydl:
+                _job(ydl, url)
+            timings.append(time.perf_counter() - started)
+    finally:
+        pool.close()
+    return timings
+
+
+def _summary(timings: list[float]) -> dict[str, float]:
+    return {
+        "first_ms": timings[0] * 1000,
+        "median_ms": statistics.median(timings) * 1000,
+        "mean_ms": statistics.fmean(timings) * 1000,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--jobs", type=int, default=20)
+    parser.add_argument("--url", help="URL permitida para incluir extract_info no custo")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as fresh_dir, tempfile.TemporaryDirectory() as pool_dir:
+        results = {
+            "jobs": args.jobs,
+            "url": args.url,
+            "fresh": _summary(run_fresh(args.jobs, args.url, Path(fresh_dir))),
+            "pooled": _summary(run_pooled(args.jobs, args.url, Path(pool_dir))),
+        }
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
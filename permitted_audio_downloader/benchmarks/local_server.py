@@ -0,0 +1,130 @@
+"""Synthetic audio files and a local HTTP server (with Range) for benchmarks."""
+from __future__ import annotations
+
+import subprocess
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Iterator
+
+# extension -> (ffmpeg encoder, Content-Type)
+FORMATS = {
+    "mp3": ("libmp3lame", "audio/mpeg"),
+    "webm": ("libopus", "audio/webm"),
+    "m4a": ("aac", "audio/mp4"),
+    "ogg": ("libvorbis", "audio/ogg"),
+    "wav": ("pcm_s16le", "audio/wav"),
+}
+READ_SIZE = 64 * 1024
+
+
+def make_synthetic_audio(
+    ffmpeg: str, directory: Path, fmt: str, seconds: int, sample_rate: int = 48000
+) -> Path:
+    encoder, _ = FORMATS[fmt]
+    path = directory / f"tone-{seconds}s-{sample_rate}.{fmt}"
+    if not path.exists():
+        subprocess.run(
+            [
+                ffmpeg, "-hide_banner", "-loglevel", "error", "-y",
+                "-f", "lavfi",
+                "-i", f"sine=frequency=440:sample_rate={sample_rate}:duration={seconds}",
+                "-ac", "2", "-c:a", encoder, str(path),
+            ],
+            check=True,
+        )
+    return path
+
+
+class MediaHandler(BaseHTTPRequestHandler):
+    # GET /media/<fmt>/<anything>.<fmt> serves the synthetic file for <fmt>,
+    # so every queued URL is distinct while the bytes stay the same.
+    protocol_version = "HTTP/1.1"
+    files: dict[str, Path] = {}
+    # Bytes per second per connection (0 = unthrottled), like a CDN that
+    # caps each stream rather than the client.
+    connection_rate: int = 0
+
+    def do_HEAD(self) -> None:
+        self._respond(send_body=False)
+
+    def do_GET(self) -> None:
+        self._respond(send_body=True)
+
+    def _respond(self, send_body: bool) -> None:
+        parts = self.path.split("?")[0].strip("/").split("/")
+        path = self.files.get(parts[1]) if len(parts) == 3 and parts[0] == "media" else None
+        if path is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        size = path.stat().st_size
+        start, end = 0, size - 1
+        header = self.headers.get("Range")
+        if header:
+            first, _, last = header.removeprefix("bytes=").partition("-")
+            start = int(first or 0)
+            end = min(int(last), end) if last else end
+            if start >= size:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", FORMATS[path.suffix[1:]][1])
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(end - start + 1))
+        self.end_headers()
+        if not send_body:
+            return
+        try:
+            with path.open("rb") as handle:
+                handle.seek(start)
+                remaining = end - start + 1
+                sent = 0
+                began = time.perf_counter()
+                while remaining > 0:
+                    chunk = handle.read(min(READ_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+                    sent += len(chunk)
+                    if self.connection_rate:
+                        ahead = sent / self.connection_rate - (time.perf_counter() - began)
+                        if ahead > 0:
+                            time.sleep(ahead)
+        except ConnectionError:
+            self.close_connection = True
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@contextmanager
+def serve_media(files: dict[str, Path], connection_rate: int = 0) -> Iterator[str]:
+    handler = type(
+        "BoundMediaHandler",
+        (MediaHandler,),
+        {"files": dict(files), "connection_rate": connection_rate},
+    )
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    httpd.daemon_threads = True
+    thread = threading.Thread(target=httpd.serve_forever, name="bench-http", daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{httpd.server_port}"
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+
+def media_url(base_url: str, fmt: str, number: int) -> str:
+    return f"{base_url}/media/{fmt}/track{number:05d}.{fmt}"
@@ -1,14 +1,34 @@
 import os
 import sys
+import threading
 
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtGui, QtWidgets
 
+from permitted_audio_downloader.app import ytdlp_service
 from permitted_audio_downloader.app.config import load_config, save_config
 from permitted_audio_downloader.app.download_manager import DownloadManager
-from permitted_audio_downloader.app.logging_setup import QtLogHandler, setup_logging
+from permitted_audio_downloader.app.logging_setup import (
+    LOG_VIEW_LINES,
+    get_log_buffer,
+    setup_logging,
+)
+from permitted_audio_downloader.app.models import DEFAULT_PRIORITY, PAUSED_STATUS, DownloadItem
+from permitted_audio_downloader.app.queue_model import QueueTableModel
 from permitted_audio_downloader.app.ui_main import UiMainWindow
-from permitted_audio_downloader.app.utils import get_default_music_dir, get_ffmpeg_bin_dir
-from permitted_audio_downloader.app.validators import ValidationError, validate_url
+from permitted_audio_downloader.app.utils import (
+    format_size,
+    get_default_music_dir,
+    get_ffmpeg_bin_dir,
+)
+from permitted_audio_downloader.app.validators import (
+    ValidationError,
+    is_playlist_url,
+    validate_url,
+)
+
+# Third entry of the sample rate combo: both masters from one download.
+MULTI_RATE_INDEX = 2
+DUAL_RATE_VARIANTS = [{"sample_rate": 44100}, {"sample_rate": 48000}]
 
 
 class MainWindow(QtWidgets.QMainWindow):
@@ -29,44 +49,80 @@ class MainWindow(QtWidgets.QMainWindow):
             )
 
         self.download_manager = DownloadManager(self._current_options())
+        self.queue_model = QueueTableModel(self.download_manager.store, parent=self)
+        self.ui.table.setModel(self.queue_model)
 
         self._setup_ui_state()
         self._connect_signals()
 
-        qt_handler = QtLogHandler()
-        qt_handler.setFormatter(self.logger.handlers[0].formatter)
-        qt_handler.log_signal.connect(self.append_log)
-        self.logger.addHandler(qt_handler)
+        # The view is redrawn in batches from the log's ring buffer instead
+        # of once per record; Qt drops the oldest blocks past the limit.
+        self.log_buffer = get_log_buffer()
+        self.ui.logs_text.setMaximumBlockCount(LOG_VIEW_LINES)
+        self._log_job: int | None = None
+        self._log_timer = QtCore.QTimer(self)
+        self._log_timer.setInterval(200)
+        self._log_timer.timeout.connect(self._flush_logs)
+        self._log_timer.start()
 
         self.logger.info("Aplicativo iniciado")
+        restored = self.download_manager.restore()
+        if restored:
+            self.logger.info("%s itens pendentes restaurados da fila anterior", restored)
+
+        self._throughput_timer = QtCore.QTimer(self)
+        self._throughput_timer.setInterval(1000)
+        self._throughput_timer.timeout.connect(self._refresh_throughput)
+        self._throughput_timer.start()
 
     def _setup_ui_state(self) -> None:
         self.ui.output_dir_input.setText(self.config.output_dir)
         self.ui.preserve_name_checkbox.setChecked(self.config.preserve_name)
         self.ui.overwrite_checkbox.setChecked(self.config.overwrite)
+        self.ui.stream_checkbox.setChecked(self.config.stream_to_ffmpeg)
         index = 0 if self.config.sample_rate == 44100 else 1
+        if self.config.output_variants:
+            index = MULTI_RATE_INDEX
+            if self.config.output_variants != DUAL_RATE_VARIANTS:
+                self.ui.sample_rate_combo.setItemText(index, "Variantes do config.json")
         self.ui.sample_rate_combo.setCurrentIndex(index)
-        self.ui.pause_button.setEnabled(False)
-        self.ui.pause_button.setToolTip("Pausa não suportada no MVP")
+        self.ui.max_workers_spin.setValue(self.config.max_workers)
+        self.ui.rate_limit_spin.setValue(self.config.rate_limit_kbps)
+        self.ui.priority_combo.setCurrentText(DEFAULT_PRIORITY)
+        self.ui.priority_combo.setToolTip("Parte da banda limitada que o item selecionado recebe")
+        self.ui.pause_button.setToolTip(
+            "Pausa o item selecionado mantendo o que já foi baixado, ou retoma se estiver pausado"
+        )
 
     def _connect_signals(self) -> None:
         self.ui.add_button.clicked.connect(self.add_to_queue)
         self.ui.download_button.clicked.connect(self.start_downloads)
+        self.ui.pause_button.clicked.connect(self.toggle_pause_selected)
+        self.ui.pause_all_button.clicked.connect(self.download_manager.pause_all)
+        self.ui.resume_all_button.clicked.connect(self.resume_all)
         self.ui.cancel_button.clicked.connect(self.cancel_selected)
         self.ui.clear_button.clicked.connect(self.clear_completed)
         self.ui.output_dir_button.clicked.connect(self.choose_output_dir)
         self.ui.output_dir_input.editingFinished.connect(self._update_config)
         self.ui.copy_logs_button.clicked.connect(self.copy_logs)
 
-        self.download_manager.item_updated.connect(self._add_table_row)
-        self.download_manager.item_status.connect(self._update_status)
-        self.download_manager.item_progress.connect(self._update_progress)
-        self.download_manager.item_info.connect(self._update_info)
+        self.download_manager.item_status.connect(self._mark_dirty)
+        self.download_manager.item_progress.connect(self._mark_dirty)
+        self.download_manager.item_info.connect(self._mark_dirty)
         self.download_manager.item_finished.connect(self._handle_finished)
+        self.download_manager.log_message.connect(self.logger.info)
+        self.download_manager.job_log.connect(self._log_job_message)
+        self.ui.job_logs_checkbox.toggled.connect(self._refresh_log_filter)
 
         self.ui.preserve_name_checkbox.stateChanged.connect(self._update_config)
         self.ui.overwrite_checkbox.stateChanged.connect(self._update_config)
+        self.ui.stream_checkbox.stateChanged.connect(self._update_config)
         self.ui.sample_rate_combo.currentIndexChanged.connect(self._update_config)
+        self.ui.max_workers_spin.valueChanged.connect(self._update_config)
+        self.ui.rate_limit_spin.valueChanged.connect(self._update_rate_limit)
+        self.ui.priority_combo.activated.connect(self._apply_priority)
+        self.ui.table.selectionModel().currentRowChanged.connect(self._sync_priority)
+        self.ui.table.selectionModel().currentRowChanged.connect(self._refresh_log_filter)
 
     def _current_options(self) -> dict:
         output_dir = self.config.output_dir or get_default_music_dir()
@@ -75,11 +131,64 @@ class MainWindow(QtWidgets.QMainWindow):
             "preserve_name": self.config.preserve_name,
             "overwrite": self.config.overwrite,
             "sample_rate": self.config.sample_rate,
+            "output_variants": self.config.output_variants,
             "ffmpeg_bin_dir": self.ffmpeg_bin_dir,
+            "max_workers": self.config.max_workers,
+            "source_limits": self.config.source_limits,
+            "conversion_queue_size": self.config.conversion_queue_size,
+            "conversion_workers": self.config.conversion_workers,
+            "download_segments": self.config.download_segments,
+            "stream_to_ffmpeg": self.config.stream_to_ffmpeg,
+            "cache_enabled": self.config.cache_enabled,
+            "cache_max_mb": self.config.cache_max_mb,
+            "metadata_workers": self.config.metadata_workers,
+            "persist_queue": self.config.persist_queue,
+            "rate_limit_kbps": self.config.rate_limit_kbps,
+            "bandwidth_profiles": self.config.bandwidth_profiles,
+            "metrics_enabled": self.config.metrics_enabled,
+            "metrics_port": self.config.metrics_port,
+            "skip_existing": self.config.skip_existing,
+            "ffmpeg_timeout": self.config.ffmpeg_timeout,
+            "max_retries": self.config.max_retries,
+            "retry_base_delay": self.config.retry_base_delay,
+            "retry_max_delay": self.config.retry_max_delay,
+            "breaker_threshold": self.config.breaker_threshold,
+            "breaker_cooldown": self.config.breaker_cooldown,
         }
 
-    def append_log(self, message: str) -> None:
-        self.ui.logs_text.appendPlainText(message)
+    def warm_up(self) -> None:
+        def run() -> None:
+            try:
+                ytdlp_service.warm_up()
+            except Exception:
+                self.logger.exception("Falha ao pré-carregar o yt-dlp")
+
+        threading.Thread(target=run, name="warm-up", daemon=True).start()
+
+    def _log_job_message(self, job_id: int, message: str) -> None:
+        self.logger.info(message, extra={"job_id": job_id})
+
+    def _flush_logs(self) -> None:
+        if self.log_buffer is None:
+            return
+        batch = [
+            text
+            for job_id, text in self.log_buffer.drain()
+            if self._log_job is None or job_id == self._log_job
+        ]
+        if batch:
+            self.ui.logs_text.appendPlainText("\n".join(batch))
+
+    def _refresh_log_filter(self) -> None:
+        if self.log_buffer is None:
+            return
+        item = self._selected_item() if self.ui.job_logs_checkbox.isChecked() else None
+        job_id = item.job_id if item is not None else None
+        if job_id == self._log_job:
+            return
+        self._log_job = job_id
+        self.ui.logs_text.setPlainText("\n".join(self.log_buffer.snapshot(job_id)))
+        self.ui.logs_text.moveCursor(QtGui.QTextCursor.End)
 
     def add_to_queue(self) -> None:
         url = self.ui.url_input.text().strip()
@@ -89,30 +198,53 @@ class MainWindow(QtWidgets.QMainWindow):
             self.logger.warning(str(exc))
             QtWidgets.QMessageBox.warning(self, "URL inválida", str(exc))
             return
-        index = self.download_manager.add_item(url)
         self.ui.url_input.clear()
-        self.logger.info("URL adicionada à fila: %s", url)
-        self.ui.table.selectRow(index)
+        if is_playlist_url(url):
+            self.download_manager.add_playlist(url)
+            self.logger.info("Playlist adicionada; listando itens: %s", url)
+            return
+        job_id = self.download_manager.find_duplicate(url)
+        if job_id is None:
+            job_id = self.download_manager.add_item(url)
+            self.logger.info("URL adicionada à fila: %s", url)
+        else:
+            self.logger.info(
+                "URL já está na fila (item %s): %s", job_id, url, extra={"job_id": job_id}
+            )
+        self.queue_model.flush()
+        self.ui.table.selectRow(self.download_manager.store.row_of(job_id))
 
     def start_downloads(self) -> None:
         self.download_manager.update_options(self._current_options())
-        self.download_manager.start_next()
+        self.download_manager.start()
+
+    def toggle_pause_selected(self) -> None:
+        item = self._selected_item()
+        if item is None:
+            return
+        if item.status == PAUSED_STATUS:
+            self.download_manager.update_options(self._current_options())
+            self.download_manager.resume_item(item.job_id)
+        else:
+            self.download_manager.pause_item(item.job_id)
+
+    def resume_all(self) -> None:
+        self.download_manager.update_options(self._current_options())
+        self.download_manager.resume_all()
 
     def cancel_selected(self) -> None:
-        row = self._selected_row()
-        if row is None:
+        item = self._selected_item()
+        if item is None:
             return
-        self.download_manager.cancel_item(row)
+        self.download_manager.cancel_item(item.job_id)
 
     def clear_completed(self) -> None:
-        rows_to_remove = []
-        for row in range(self.ui.table.rowCount()):
-            status_item = self.ui.table.item(row, 0)
-            if status_item and status_item.text() in {"Concluído", "Falhou", "Cancelado"}:
-                rows_to_remove.append(row)
-        for row in reversed(rows_to_remove):
-            self.ui.table.removeRow(row)
-            del self.download_manager.items[row]
+        with self.queue_model.resetting():
+            self.download_manager.clear_finished()
+
+    def closeEvent(self, event) -> None:
+        self.download_manager.shutdown()
+        super().closeEvent(event)
 
     def choose_output_dir(self) -> None:
         directory = QtWidgets.QFileDialog.getExistingDirectory(
@@ -128,51 +260,58 @@ class MainWindow(QtWidgets.QMainWindow):
     def copy_logs(self) -> None:
         QtWidgets.QApplication.clipboard().setText(self.ui.logs_text.toPlainText())
 
-    def _selected_row(self) -> int | None:
+    def _selected_item(self) -> DownloadItem | None:
         selection = self.ui.table.selectionModel().selectedRows()
         if not selection:
             return None
-        return selection[0].row()
-
-    def _add_table_row(self, index: int, item) -> None:
-        self.ui.table.insertRow(index)
-        self.ui.table.setItem(index, 0, QtWidgets.QTableWidgetItem(item.status))
-        self.ui.table.setItem(index, 1, QtWidgets.QTableWidgetItem(item.title))
-        self.ui.table.setItem(index, 2, QtWidgets.QTableWidgetItem(item.source))
-        self.ui.table.setItem(index, 3, QtWidgets.QTableWidgetItem("0%"))
-        self.ui.table.setItem(index, 4, QtWidgets.QTableWidgetItem(item.output_path))
-
-    def _update_status(self, index: int, status: str) -> None:
-        item = self.ui.table.item(index, 0)
-        if item:
-            item.setText(status)
-
-    def _update_progress(self, index: int, progress: float) -> None:
-        item = self.ui.table.item(index, 3)
-        if item:
-            item.setText(f"{progress:.1f}%")
-
-    def _update_info(self, index: int, title: str, source: str) -> None:
-        title_item = self.ui.table.item(index, 1)
-        source_item = self.ui.table.item(index, 2)
-        if title_item:
-            title_item.setText(title)
-        if source_item:
-            source_item.setText(source)
-
-    def _handle_finished(self, index: int, success: bool, message: str) -> None:
-        if not success:
-            self.logger.error("Falha no item %s: %s", index + 1, message)
-        else:
-            self.logger.info("Item %s concluído", index + 1)
-        output_item = self.ui.table.item(index, 4)
-        if output_item:
-            output_item.setText(self.download_manager.items[index].output_path)
+        return self.queue_model.item_at(selection[0].row())
+
+    def _mark_dirty(self, job_id: int) -> None:
+        self.queue_model.mark_dirty(job_id)
+
+    def _handle_finished(self, job_id: int, success: bool, message: str) -> None:
+        if success:
+            self.logger.info("Item %s concluído", job_id, extra={"job_id": job_id})
+        elif message != PAUSED_STATUS:
+            self.logger.error(
+                "Falha no item %s: %s", job_id, message, extra={"job_id": job_id}
+            )
+        self.queue_model.mark_dirty(job_id)
+
+    def _update_rate_limit(self) -> None:
+        self._update_config()
+        self.download_manager.update_options(self._current_options())
+
+    def _apply_priority(self) -> None:
+        item = self._selected_item()
+        if item is not None:
+            self.download_manager.set_priority(item.job_id, self.ui.priority_combo.currentText())
+
+    def _sync_priority(self, current, previous) -> None:
+        item = self.queue_model.item_at(current.row())
+        if item is not None:
+            self.ui.priority_combo.setCurrentText(item.priority)
+
+    def _refresh_throughput(self) -> None:
+        rate = self.download_manager.throughput()
+        text = f"Vazão: {format_size(int(rate)) or '0 B'}/s"
+        limit = self.download_manager.current_rate_limit()
+        if limit:
+            text += f" (limite {format_size(limit)}/s)"
+        self.ui.throughput_label.setText(text)
 
     def _update_config(self) -> None:
         self.config.preserve_name = self.ui.preserve_name_checkbox.isChecked()
         self.config.overwrite = self.ui.overwrite_checkbox.isChecked()
-        self.config.sample_rate = int(self.ui.sample_rate_combo.currentText())
+        self.config.stream_to_ffmpeg = self.ui.stream_checkbox.isChecked()
+        if self.ui.sample_rate_combo.currentIndex() == MULTI_RATE_INDEX:
+            if not self.config.output_variants:
+                self.config.output_variants = list(DUAL_RATE_VARIANTS)
+        else:
+            self.config.sample_rate = int(self.ui.sample_rate_combo.currentText())
+            self.config.output_variants = []
+        self.config.max_workers = self.ui.max_workers_spin.value()
+        self.config.rate_limit_kbps = self.ui.rate_limit_spin.value()
         output_dir = self.ui.output_dir_input.text().strip()
         self.config.output_dir = output_dir or get_default_music_dir()
         save_config(self.config)
@@ -182,6 +321,8 @@ def main() -> int:
     app = QtWidgets.QApplication(sys.argv)
     window = MainWindow()
     window.show()
+    # Queued behind the first paint: yt-dlp loads while the window is usable.
+    QtCore.QTimer.singleShot(0, window.warm_up)
     return app.exec()
 
 
@@ -0,0 +1,90 @@
+import threading
+import time
+from datetime import datetime
+
+from permitted_audio_downloader.app.bandwidth import (
+    BandwidthLimiter,
+    FlowMeter,
+    parse_profiles,
+)
+
+
+def test_profiles_pick_rate_by_time_of_day_and_wrap_midnight():
+    profiles = parse_profiles(
+        [
+            {"start": "09:00", "end": "18:00", "kbps": 256},
+            {"start": "22:00", "end": "06:00", "kbps": 0},
+            {"start": "xx"},
+        ]
+    )
+    assert len(profiles) == 2
+    moment = {"now": datetime(2024, 5, 1, 10, 30)}
+    limiter = BandwidthLimiter(1024 * 1024, profiles, now=lambda: moment["now"])
+    assert limiter.current_rate() == 256 * 1024
+    moment["now"] = datetime(2024, 5, 1, 23, 0)
+    assert limiter.current_rate() == 0
+    moment["now"] = datetime(2024, 5, 1, 20, 0)
+    assert limiter.current_rate() == 1024 * 1024
+
+
+def test_limit_paces_a_single_download():
+    limiter = BandwidthLimiter(200 * 1024)
+    flow = object()
+    started = time.monotonic()
+    for _ in range(10):
+        limiter.consume(flow, 10 * 1024)
+    elapsed = time.monotonic() - started
+    assert 0.3 < elapsed < 1.0
+
+
+def test_bandwidth_is_split_by_weight():
+    limiter = BandwidthLimiter(400 * 1024, burst_seconds=0.05)
+    received = {"high": 0, "low": 0}
+    stop = threading.Event()
+
+    def download(name, weight):
+        flow = object()
+        while not stop.is_set():
+            limiter.consume(flow, 4 * 1024, weight)
+            received[name] += 4 * 1024
+
+    threads = [
+        threading.Thread(target=download, args=("high", 3.0)),
+        threading.Thread(target=download, args=("low", 1.0)),
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.8)
+    stop.set()
+    limiter.configure(0)
+    for thread in threads:
+        thread.join()
+    assert 2.0 < received["high"] / received["low"] < 4.5
+
+
+def test_raising_the_limit_wakes_waiting_downloads():
+    limiter = BandwidthLimiter(1)
+    flow = object()
+    limiter.consume(flow, 10 * 1024)
+    done = threading.Event()
+    thread = threading.Thread(target=lambda: (limiter.consume(flow, 1024), done.set()))
+    thread.start()
+    time.sleep(0.05)
+    assert not done.is_set()
+    limiter.configure(0)
+    assert done.wait(0.5)
+    thread.join()
+
+
+def test_flow_meter_charges_deltas_and_throughput_counts_them():
+    clock = {"now": 100.0}
+    limiter = BandwidthLimiter(window=2.0, clock=lambda: clock["now"])
+    meter = FlowMeter(limiter)
+    for downloaded in (5_000, 7_000, 12_000):
+        meter.update(
+            {"status": "downloading", "tmpfilename": "a.part", "downloaded_bytes": downloaded}
+        )
+    meter.update({"status": "finished", "downloaded_bytes": 12_000})
+    assert limiter.throughput() == 7_000 / 2.0
+    clock["now"] += 5
+    assert limiter.throughput() == 0
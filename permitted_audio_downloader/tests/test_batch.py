@@ -0,0 +1,143 @@
+import io
+import json
+import subprocess
+import sys
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from permitted_audio_downloader.app import batch, ytdlp_service
+from permitted_audio_downloader.app.batch import BatchRunner, JsonLinesReporter, read_urls
+
+
+def _events(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_read_urls_skips_blank_lines_and_comments():
+    lines = ["https://youtu.be/a\n", "\n", "# comentário\n", "  https://youtu.be/b  "]
+    assert list(read_urls(lines)) == ["https://youtu.be/a", "https://youtu.be/b"]
+
+
+def test_batch_runner_reports_each_job_and_summary(tmp_path, monkeypatch):
+    def fake_fetch(index, item, options, on_progress, is_cancelled, on_info, cache, catalog):
+        on_progress(50.0)
+        item.title = f"track {index}"
+        on_info()
+        return batch.ConversionJob(
+            index=index,
+            item=item,
+            input_path=tmp_path / "in",
+            output_path=tmp_path / f"{index}.wav",
+            sample_rate=44100,
+        )
+
+    def fake_convert(job, on_progress=None, is_cancelled=None, threads=0):
+        job.item.output_path = str(job.output_path)
+
+    monkeypatch.setattr(batch, "fetch_stage", fake_fetch)
+    monkeypatch.setattr(batch, "convert_stage", fake_convert)
+    stream = io.StringIO()
+    runner = BatchRunner({"source_limits": {"YT": 1}}, JsonLinesReporter(stream), concurrency=2)
+
+    summary = runner.run(["https://youtu.be/a", "https://example.com/x", "https://youtu.be/b"])
+
+    events = _events(stream)
+    done = {event["job"]: event for event in events if event["event"] == "done"}
+    assert done[0]["success"] and done[0]["output_path"].endswith("0.wav")
+    assert done[1]["message"] == "Domínio não suportado"
+    assert "convert" in done[2]["timings"]
+    assert summary["total"] == 3
+    assert summary["succeeded"] == 2
+    assert summary["failed"] == 1
+
+
+def test_batch_runner_downloads_repeated_media_once(tmp_path, monkeypatch):
+    fetched = []
+
+    def fake_fetch(index, item, options, on_progress, is_cancelled, on_info, cache, catalog):
+        fetched.append(item.url)
+        return batch.ConversionJob(
+            index=index,
+            item=item,
+            input_path=tmp_path / "in",
+            output_path=tmp_path / f"{index}.wav",
+            sample_rate=44100,
+        )
+
+    def fake_convert(job, on_progress=None, is_cancelled=None, threads=0):
+        job.item.output_path = str(job.output_path)
+
+    monkeypatch.setattr(batch, "fetch_stage", fake_fetch)
+    monkeypatch.setattr(batch, "convert_stage", fake_convert)
+    stream = io.StringIO()
+    runner = BatchRunner({}, JsonLinesReporter(stream), concurrency=2)
+
+    summary = runner.run(
+        [
+            "https://youtu.be/abc",
+            "https://m.youtube.com/watch?v=abc&t=30",
+            "https://youtu.be/xyz",
+            "https://www.youtube.com/watch?v=abc&list=PL1",
+        ]
+    )
+
+    assert sorted(fetched) == ["https://youtu.be/abc", "https://youtu.be/xyz"]
+    done = {event["job"]: event for event in _events(stream) if event["event"] == "done"}
+    assert len(done) == 4
+    for index in (1, 3):
+        assert done[index]["duplicate_of"] == 0
+        assert done[index]["success"]
+        assert done[index]["output_path"].endswith("0.wav")
+    assert summary["succeeded"] == 4
+    assert summary["duplicates"] == 2
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def test_batch_stdout_stays_json_lines_during_real_downloads(tmp_path, monkeypatch, capfd):
+    served = tmp_path / "served"
+    served.mkdir()
+    (served / "mix.mp3").write_bytes(bytes(512 * 1024))
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), partial(QuietHandler, directory=str(served)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+
+    def fake_convert(job, on_progress=None, is_cancelled=None, threads=0):
+        job.item.output_path = str(job.output_path)
+
+    pool = ytdlp_service.SessionPool(cache_dir=tmp_path / "ytdlp")
+    monkeypatch.setattr(ytdlp_service, "_pool", pool)
+    monkeypatch.setattr(batch, "validate_url", lambda url: None)
+    monkeypatch.setattr(batch, "convert_stage", fake_convert)
+    (tmp_path / "out").mkdir()
+    options = {
+        "output_dir": str(tmp_path / "out"),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+    }
+    runner = BatchRunner(options, JsonLinesReporter(sys.stdout))
+    try:
+        summary = runner.run([f"http://127.0.0.1:{httpd.server_port}/mix.mp3"])
+    finally:
+        httpd.shutdown()
+        httpd.server_close()
+
+    lines = capfd.readouterr().out.splitlines()
+    assert summary["succeeded"] == 1
+    assert [json.loads(line)["event"] for line in lines][-1] == "done"
+
+
+def test_batch_entry_point_does_not_import_qt():
+    code = (
+        "import sys, permitted_audio_downloader.__main__, permitted_audio_downloader.app.batch;"
+        "assert not any(name.startswith('PySide6') for name in sys.modules)"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,111 @@
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+pytest.importorskip("yt_dlp")
+
+from types import SimpleNamespace
+
+from permitted_audio_downloader.app.download_manager import DownloadManager
+from permitted_audio_downloader.app.models import RETRY_STATUS
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setenv("APPDATA", str(tmp_path))
+    app = QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+    manager = DownloadManager(
+        {
+            "output_dir": str(tmp_path / "out"),
+            "persist_queue": False,
+            "metadata_lookahead": 0,
+        }
+    )
+    yield manager
+    manager.shutdown()
+    app.processEvents()
+
+
+def test_duplicate_urls_merge_onto_one_job(manager):
+    first = manager.add_item("https://youtu.be/dQw4w9WgXcQ")
+    other = manager.add_item("https://youtu.be/other")
+
+    assert manager.add_item("https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=30") == first
+    assert manager.find_duplicate("https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL1") == first
+    assert len(manager.store) == 2
+
+    manager._on_status(first, "Concluído")
+    assert manager.find_duplicate("https://youtu.be/dQw4w9WgXcQ") is None
+    again = manager.add_item("https://youtu.be/dQw4w9WgXcQ")
+    assert again != first
+    assert manager.add_item("https://youtu.be/dQw4w9WgXcQ") == again
+
+    manager.cancel_item(other)
+    assert manager.find_duplicate("https://youtu.be/other") is None
+    assert manager.add_item("https://youtu.be/other") != other
+
+
+def test_skipped_playlist_entries_are_reported(manager):
+    messages = []
+    manager.log_message.connect(messages.append)
+    manager._on_playlist_page(
+        0,
+        [
+            ("https://youtu.be/ok", {"title": "ok"}),
+            ("https://api-v2.soundcloud.com/tracks/7", {"title": "stub"}),
+            ("", {"title": "sem url"}),
+        ],
+    )
+    assert len(manager.store) == 1
+    assert messages == [
+        "Item da playlist ignorado (Domínio não suportado): "
+        "https://api-v2.soundcloud.com/tracks/7",
+        "Item da playlist ignorado (URL vazia): sem url",
+    ]
+
+
+def _fail_download(manager, job_id, message, retryable=True):
+    item = manager.store.get(job_id)
+    manager.store.set_status(job_id, "Baixando")
+    item.attempts += 1
+    manager._workers[job_id] = SimpleNamespace(item=item, retryable=retryable)
+    manager._on_status(job_id, "Falhou")
+    manager._on_finished(job_id, False, message)
+    return item
+
+
+def test_retryable_failures_wait_outside_the_slots_then_requeue(manager):
+    manager.update_options(
+        {**manager.options, "max_retries": 1, "retry_base_delay": 0, "breaker_threshold": 1}
+    )
+    job_id = manager.add_item("https://youtu.be/flaky")
+    finished = []
+    manager.item_finished.connect(lambda *args: finished.append(args))
+    (manager._staging.path_for(job_id) / "audio.webm.part").write_bytes(b"x" * 10)
+
+    item = _fail_download(manager, job_id, "HTTP Error 503: Service Unavailable")
+    assert item.status == RETRY_STATUS
+    assert manager._staging.partial_bytes(job_id) == 10
+    assert item.last_error == "HTTP Error 503: Service Unavailable"
+    assert manager.active_count() == 0
+    assert finished == []
+    # The breaker for the source opened on the first retryable failure.
+    assert not manager._can_dispatch(item.source)
+
+    manager._on_retry_timer()
+    assert item.status == "Na fila"
+
+    _fail_download(manager, job_id, "HTTP Error 503: Service Unavailable")
+    assert item.status == "Falhou"
+    assert item.attempts == 2
+    assert finished == [(job_id, False, "HTTP Error 503: Service Unavailable")]
+    assert manager._staging.partial_bytes(job_id) == 0
+
+
+def test_permanent_failures_are_not_retried(manager):
+    job_id = manager.add_item("https://youtu.be/gone")
+    (manager._staging.path_for(job_id) / "audio.webm.part").write_bytes(b"x" * 10)
+    item = _fail_download(manager, job_id, "Video unavailable", retryable=False)
+    assert item.status == "Falhou"
+    assert manager._staging.partial_bytes(job_id) == 0
+    assert item.last_error == "Video unavailable"
+    assert manager._can_dispatch(item.source)
@@ -0,0 +1,271 @@
+import io
+import logging
+import shutil
+import struct
+import subprocess
+import threading
+import time
+
+import pytest
+
+from permitted_audio_downloader.app import ffmpeg_service
+from permitted_audio_downloader.app.logging_setup import JobContextFilter, job_logging
+from permitted_audio_downloader.app.models import OutputVariant
+from permitted_audio_downloader.app.ffmpeg_service import (
+    PATH_COPY,
+    PATH_DECODE,
+    PATH_REMUX,
+    PATH_TRANSCODE,
+    ProbeResult,
+    choose_conversion_path,
+)
+
+
+@pytest.mark.parametrize(
+    "probe, expected",
+    [
+        (None, PATH_TRANSCODE),
+        (ProbeResult("wav", "pcm_s16le", 44100, 2), PATH_COPY),
+        (ProbeResult("matroska,webm", "pcm_s16le", 44100, 2), PATH_REMUX),
+        (ProbeResult("mp3", "mp3", 44100, 2), PATH_DECODE),
+        (ProbeResult("wav", "pcm_s16le", 48000, 2), PATH_TRANSCODE),
+        (ProbeResult("ogg", "opus", 48000, 2), PATH_TRANSCODE),
+    ],
+)
+def test_choose_conversion_path(probe, expected):
+    assert choose_conversion_path(probe, 44100) == expected
+
+
+def test_wav_command_for_each_path():
+    assert ffmpeg_service._wav_command("ffmpeg", "in", "out", 44100, PATH_REMUX) == [
+        "ffmpeg", "-y", "-i", "in", "-acodec", "copy", "out"
+    ]
+    assert "-ar" not in ffmpeg_service._wav_command("ffmpeg", "in", "out", 44100, PATH_DECODE)
+    assert ffmpeg_service._wav_command("ffmpeg", "in", "out", 48000)[-3:] == [
+        "-ar", "48000", "out"
+    ]
+
+
+def test_variants_command_decodes_input_once():
+    command = ffmpeg_service._variants_command(
+        "ffmpeg",
+        "in.webm",
+        [
+            (OutputVariant(44100), "a.wav"),
+            (OutputVariant(48000, 24, 2), "b.wav"),
+            (OutputVariant(48000, 24, 0, "flac"), "c.flac"),
+        ],
+    )
+    assert command.count("-i") == 1
+    assert command[:4] == ["ffmpeg", "-y", "-i", "in.webm"]
+    first = command.index("a.wav")
+    assert command[4:first] == ["-map", "0:a:0", "-acodec", "pcm_s16le", "-ar", "44100"]
+    second = command.index("b.wav")
+    assert command[first + 1:second] == [
+        "-map", "0:a:0", "-acodec", "pcm_s24le", "-ar", "48000", "-ac", "2"
+    ]
+    assert command[second + 1:] == [
+        "-map", "0:a:0", "-acodec", "flac", "-ar", "48000",
+        "-sample_fmt", "s32", "-bits_per_raw_sample", "24", "c.flac",
+    ]
+
+
+def test_copy_path_skips_ffmpeg_and_probes_once(tmp_path, monkeypatch):
+    calls = []
+
+    def fake_probe(path):
+        calls.append(path)
+        return ProbeResult("wav", "pcm_s16le", 44100, 2)
+
+    monkeypatch.setattr(ffmpeg_service, "_run_ffprobe", fake_probe)
+    monkeypatch.setattr(ffmpeg_service, "find_ffmpeg", lambda: pytest.fail("ffmpeg chamado"))
+    source = tmp_path / "in.wav"
+    source.write_bytes(b"RIFF")
+    before = ffmpeg_service.get_conversion_stats().get(PATH_COPY, 0)
+
+    ffmpeg_service.convert_to_wav(str(source), str(tmp_path / "a.wav"), 44100)
+    ffmpeg_service.convert_to_wav(str(source), str(tmp_path / "b.wav"), 44100)
+
+    assert (tmp_path / "b.wav").read_bytes() == b"RIFF"
+    assert len(calls) == 1
+    assert ffmpeg_service.get_conversion_stats()[PATH_COPY] == before + 2
+
+
+needs_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg ausente")
+
+
+def _sine_command(tmp_path, seconds=30):
+    # -re paces the input in real time, so the conversion runs long enough to
+    # be cancelled and reports progress every half second.
+    return [
+        shutil.which("ffmpeg"), "-y", "-re", "-f", "lavfi",
+        "-i", f"sine=frequency=440:duration={seconds}", str(tmp_path / "out.wav"),
+    ]
+
+
+@needs_ffmpeg
+def test_run_ffmpeg_reports_progress(tmp_path):
+    seen = []
+    ffmpeg_service.run_ffmpeg(_sine_command(tmp_path, 1), duration=1.0, on_progress=seen.append)
+    assert seen[-1] == 100.0
+    assert seen == sorted(seen)
+
+
+@needs_ffmpeg
+def test_run_ffmpeg_cancel_kills_promptly(tmp_path):
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="cancelada"):
+        ffmpeg_service.run_ffmpeg(
+            _sine_command(tmp_path), is_cancelled=lambda: time.monotonic() - started > 0.3
+        )
+    assert time.monotonic() - started < 5
+
+
+@needs_ffmpeg
+def test_run_ffmpeg_times_out_without_progress(tmp_path):
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="sem progresso"):
+        ffmpeg_service.run_ffmpeg(_sine_command(tmp_path), timeout=0.2)
+    assert time.monotonic() - started < 5
+
+
+@needs_ffmpeg
+def test_ffmpeg_stderr_lines_carry_the_job_id(tmp_path):
+    records = []
+    handler = logging.Handler()
+    handler.addFilter(JobContextFilter())
+    handler.emit = records.append
+    ffmpeg_service.logger.addHandler(handler)
+    ffmpeg_service.logger.setLevel(logging.INFO)
+    try:
+        with job_logging(7), pytest.raises(RuntimeError):
+            ffmpeg_service.run_ffmpeg(
+                [shutil.which("ffmpeg"), "-i", str(tmp_path / "missing.mp3"), "out.wav"]
+            )
+    finally:
+        ffmpeg_service.logger.removeHandler(handler)
+        ffmpeg_service.logger.setLevel(logging.NOTSET)
+    assert records and {record.job_id for record in records} == {7}
+
+
+@needs_ffmpeg
+def test_stream_conversion_reads_chunks_into_wav(tmp_path):
+    source = tmp_path / "in.wav"
+    ffmpeg_service.run_ffmpeg(
+        [shutil.which("ffmpeg"), "-y", "-f", "lavfi", "-i", "sine=duration=1", str(source)]
+    )
+    data = source.read_bytes()
+    chunks = (data[offset:offset + 4096] for offset in range(0, len(data), 4096))
+    ffmpeg_service.convert_stream_to_wav(chunks, str(tmp_path / "out.wav"), 44100, timeout=5)
+    assert (tmp_path / "out.wav").stat().st_size > 88_000
+
+
+@needs_ffmpeg
+def test_stream_write_to_stuck_ffmpeg_times_out(tmp_path):
+    # ffmpeg never reads stdin here, so the write blocks once the pipe is full.
+    def endless():
+        while True:
+            yield b"\0" * 65536
+
+    started = time.monotonic()
+    with pytest.raises(RuntimeError, match="sem progresso"):
+        ffmpeg_service.run_ffmpeg(_sine_command(tmp_path), timeout=0.3, stdin_chunks=endless())
+    assert time.monotonic() - started < 5
+
+
+CPUINFO = "".join(
+    f"processor\t: {n}\nphysical id\t: 0\ncore id\t\t: {n // 2}\n\n" for n in range(8)
+)
+
+
+def test_linux_physical_cores_ignores_hyperthreads(monkeypatch):
+    monkeypatch.setattr(
+        ffmpeg_service, "open", lambda *args, **kwargs: io.StringIO(CPUINFO), raising=False
+    )
+    assert ffmpeg_service._linux_physical_cores() == 4
+
+
+def test_windows_core_records_are_counted():
+    core = struct.pack("<II", 0, 48) + bytes(40)
+    cache = struct.pack("<II", 2, 56) + bytes(48)
+    assert ffmpeg_service._count_core_records(core + cache + core + core) == 3
+    assert ffmpeg_service._count_core_records(b"") == 0
+
+
+def test_macos_physical_cores_reads_sysctl(monkeypatch):
+    calls = []
+
+    def fake_run(command, **kwargs):
+        calls.append(command)
+        return subprocess.CompletedProcess(command, 0, stdout="6\n", stderr="")
+
+    monkeypatch.setattr(ffmpeg_service.subprocess, "run", fake_run)
+    assert ffmpeg_service._macos_physical_cores() == 6
+    assert calls == [["sysctl", "-n", "hw.physicalcpu"]]
+
+
+@pytest.mark.parametrize(
+    "platform, helper",
+    [
+        ("win32", "_windows_physical_cores"),
+        ("darwin", "_macos_physical_cores"),
+        ("linux", "_linux_physical_cores"),
+    ],
+)
+def test_physical_cpu_count_uses_platform_query_then_logical(monkeypatch, platform, helper):
+    monkeypatch.setattr(ffmpeg_service.sys, "platform", platform)
+    monkeypatch.delattr(ffmpeg_service.os, "sched_getaffinity", raising=False)
+    monkeypatch.setattr(ffmpeg_service.os, "cpu_count", lambda: 16)
+    for name in ("_windows_physical_cores", "_macos_physical_cores", "_linux_physical_cores"):
+        monkeypatch.setattr(ffmpeg_service, name, lambda: 99)
+    monkeypatch.setattr(ffmpeg_service, helper, lambda: 8)
+    assert ffmpeg_service.physical_cpu_count() == 8
+    monkeypatch.setattr(ffmpeg_service, helper, lambda: 0)
+    assert ffmpeg_service.physical_cpu_count() == 16
+
+
+def test_conversion_threads_share_the_affinity_mask(monkeypatch):
+    monkeypatch.setattr(ffmpeg_service.os, "cpu_count", lambda: 64)
+    monkeypatch.setattr(
+        ffmpeg_service.os, "sched_getaffinity", lambda pid: set(range(8)), raising=False
+    )
+    monkeypatch.setattr(ffmpeg_service, "_linux_physical_cores", lambda: 32)
+    monkeypatch.setattr(ffmpeg_service.sys, "platform", "linux")
+    assert ffmpeg_service.logical_cpu_count() == 8
+    pool = ffmpeg_service.ConversionPool(workers=2)
+    try:
+        assert pool.threads == 4
+    finally:
+        pool.shutdown()
+    pool = ffmpeg_service.ConversionPool()
+    try:
+        assert (pool.workers, pool.threads) == (8, 1)
+    finally:
+        pool.shutdown()
+
+
+def test_conversion_pool_runs_fifo_in_parallel_and_reports_usage():
+    pool = ffmpeg_service.ConversionPool(workers=2, max_queued=4)
+    assert pool.threads >= 1
+    gate = threading.Event()
+    started, order = [], []
+
+    def task(name):
+        started.append(name)
+        gate.wait(5)
+        order.append(name)
+
+    for name in "abcd":
+        pool.submit(lambda name=name: task(name))
+    deadline = time.monotonic() + 5
+    while len(started) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    stats = pool.stats()
+    assert sorted(started) == ["a", "b"]
+    assert (stats["busy"], stats["queued"]) == (2, 2)
+    gate.set()
+    pool.shutdown()
+    assert sorted(started[:2]) == ["a", "b"] and sorted(order) == ["a", "b", "c", "d"]
+    assert pool.stats()["busy"] == 0 and pool.stats()["utilization"] > 0
+    with pytest.raises(RuntimeError):
+        pool.submit(lambda: None)
@@ -0,0 +1,65 @@
+import sqlite3
+
+from permitted_audio_downloader.app.job_db import JobDatabase
+
+
+def test_resume_skips_completed_and_requeues_interrupted(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    db = JobDatabase(path)
+    done = db.add("https://youtu.be/a", source="YT")
+    running = db.add("https://youtu.be/b", source="YT")
+    queued = db.add("https://youtu.be/c", source="YT", title="C")
+    db.update(done, status="Concluído", output_path="a.wav", attempts=1)
+    db.update(running, status="Baixando", attempts=2)
+    db.close()
+
+    reopened = JobDatabase(path)
+    rows = reopened.load_unfinished()
+    reopened.close()
+
+    assert [row["id"] for row in rows] == [running, queued]
+    assert rows[0]["status"] == "Na fila"
+    assert rows[0]["attempts"] == 2
+    assert rows[1]["title"] == "C"
+
+
+def test_updates_are_batched_until_flush(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    db = JobDatabase(path, flush_interval=60)
+    job_id = db.add("https://youtu.be/a")
+    db.update(job_id, title="primeiro")
+    db.update(job_id, title="segundo", attempts=1)
+
+    def stored_title():
+        with sqlite3.connect(path) as conn:
+            return conn.execute("SELECT title FROM jobs WHERE id = ?", (job_id,)).fetchone()[0]
+
+    assert stored_title() == ""
+    db.flush()
+    assert stored_title() == "segundo"
+    db.close()
+
+
+def test_uses_wal_and_deletes_rows(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    db = JobDatabase(path)
+    job_id = db.add("https://youtu.be/a")
+    db.delete([job_id])
+    assert db.load_unfinished() == []
+    db.close()
+    with sqlite3.connect(path) as conn:
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+
+
+def test_paused_jobs_stay_paused_after_restart(tmp_path):
+    path = tmp_path / "jobs.sqlite3"
+    db = JobDatabase(path)
+    job_id = db.add("https://youtu.be/a")
+    db.update(job_id, status="Pausado")
+    db.close()
+
+    reopened = JobDatabase(path)
+    rows = reopened.load_unfinished()
+    reopened.close()
+
+    assert [(row["id"], row["status"]) for row in rows] == [(job_id, "Pausado")]
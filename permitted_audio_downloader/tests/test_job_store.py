@@ -0,0 +1,68 @@
+import time
+
+from permitted_audio_downloader.app.job_store import JobStore
+from permitted_audio_downloader.app.models import DownloadItem
+
+
+def _store(*sources):
+    store = JobStore()
+    ids = [store.add(DownloadItem(url=f"https://x/{n}", source=s)) for n, s in enumerate(sources)]
+    return store, ids
+
+
+def test_ids_are_stable_and_keep_counting_after_given_ids():
+    store = JobStore()
+    restored = store.add(DownloadItem(url="https://x/a", job_id=41))
+    fresh = store.add(DownloadItem(url="https://x/b"))
+    assert (restored, fresh) == (41, 42)
+    assert store.row_of(fresh) == 1
+
+
+def test_pop_ready_is_fifo_across_sources_with_free_slots():
+    store, ids = _store("YT", "SC", "YT", "SC")
+    assert store.pop_ready(lambda source: True).job_id == ids[0]
+    store.set_status(ids[0], "Baixando")
+    assert store.pop_ready(lambda source: source == "YT").job_id == ids[2]
+    store.set_status(ids[2], "Baixando")
+    assert store.pop_ready(lambda source: source == "YT") is None
+    assert store.pop_ready(lambda source: True).job_id == ids[1]
+
+
+def test_cancelled_and_requeued_jobs_update_the_ready_queue():
+    store, ids = _store("YT", "YT")
+    store.set_status(ids[0], "Cancelado")
+    assert store.pop_ready(lambda source: True).job_id == ids[1]
+    store.set_status(ids[1], "Falhou")
+    store.set_status(ids[1], "Na fila")
+    assert store.count("Na fila") == 1
+    assert store.pop_ready(lambda source: True).job_id == ids[1]
+
+
+def test_remove_finished_keeps_running_jobs_and_their_ids():
+    store, ids = _store("YT", "YT", "YT", "YT")
+    store.set_status(ids[0], "Concluído")
+    store.set_status(ids[1], "Baixando")
+    store.set_status(ids[2], "Falhou")
+
+    removed = store.remove_finished()
+
+    assert sorted(item.job_id for item in removed) == [ids[0], ids[2]]
+    assert [item.job_id for item in store] == [ids[1], ids[3]]
+    assert store.row_of(ids[3]) == 1
+    assert store.get(ids[0]) is None
+    store.set_status(ids[0], "Concluído")
+    assert store.count("Concluído") == 0
+
+
+def test_scheduling_cost_does_not_grow_with_queue_length():
+    def drain(size):
+        store, _ = _store(*["YT", "SC"] * (size // 2))
+        started = time.perf_counter()
+        for _ in range(500):
+            item = store.pop_ready(lambda source: True)
+            store.set_status(item.job_id, "Concluído")
+        return time.perf_counter() - started
+
+    small = min(drain(1_000) for _ in range(3))
+    large = min(drain(50_000) for _ in range(3))
+    assert large < small * 5
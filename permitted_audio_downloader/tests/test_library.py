@@ -0,0 +1,99 @@
+import os
+
+from permitted_audio_downloader.app.library import OutputCatalog, media_key_for
+from permitted_audio_downloader.app.models import OutputVariant
+
+
+def _write(path, size=10):
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def _bump_mtime(directory):
+    # Keeps the test independent of the filesystem's timestamp resolution.
+    stat = os.stat(directory)
+    os.utime(directory, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+
+def test_allocate_uses_index_and_reserves_names(tmp_path):
+    out = tmp_path / "out"
+    out.mkdir()
+    _write(out / "Song.wav")
+    _write(out / "Song (1).wav")
+    catalog = OutputCatalog(tmp_path / "library.sqlite3")
+
+    first = catalog.allocate(out, "song")
+    second = catalog.allocate(out, "song")
+    assert (first.name, second.name) == ("song (2).wav", "song (3).wav")
+    assert catalog.allocate(out, "Song", overwrite=True) == out / "Song.wav"
+
+    catalog.release(second)
+    assert catalog.allocate(out, "other").name == "other.wav"
+    catalog.close()
+
+
+def test_find_returns_recorded_output_until_it_changes(tmp_path):
+    out = tmp_path / "out"
+    catalog = OutputCatalog(tmp_path / "library.sqlite3")
+    key = media_key_for("https://m.youtube.com/watch?v=abc123&t=5")
+    assert key == "YT:abc123"
+
+    path = catalog.allocate(out, "Track")
+    _write(path, 100)
+    catalog.record(path, key, OutputVariant(44100).key)
+    assert catalog.find(out, media_key_for("https://youtu.be/abc123"), "wav:44100") == path
+    assert catalog.find(out, key, OutputVariant(48000).key) is None
+    catalog.close()
+
+    reopened = OutputCatalog(tmp_path / "library.sqlite3")
+    assert reopened.find(out, key, "wav:44100") == path
+    _write(path, 5)
+    assert reopened.find(out, key, "wav:44100") is None
+    assert reopened.allocate(out, "Track").name == "Track (1).wav"
+    reopened.close()
+
+
+def test_reconciles_files_changed_on_disk_between_sessions(tmp_path):
+    out = tmp_path / "out"
+    catalog = OutputCatalog(tmp_path / "library.sqlite3")
+    path = catalog.allocate(out, "Track")
+    _write(path)
+    catalog.record(path, "YT:abc", "wav:44100")
+    catalog.close()
+
+    path.unlink()
+    _write(out / "Manual.wav")
+    _bump_mtime(out)
+
+    reopened = OutputCatalog(tmp_path / "library.sqlite3")
+    assert reopened.find(out, "YT:abc", "wav:44100") is None
+    assert reopened.allocate(out, "Track").name == "Track.wav"
+    assert reopened.allocate(out, "manual").name == "manual (1).wav"
+    reopened.close()
+
+
+def test_record_does_not_hide_a_later_change_to_the_folder(tmp_path):
+    out = tmp_path / "out"
+    catalog = OutputCatalog(tmp_path / "library.sqlite3")
+    path = catalog.allocate(out, "Track")
+    _write(path)
+    _write(out / "User.wav")
+    _bump_mtime(out)
+    catalog.record(path, "YT:abc", "wav:44100")
+    assert catalog.allocate(out, "User").name == "User (1).wav"
+    catalog.close()
+
+
+def test_allocate_never_returns_a_name_taken_on_disk(tmp_path):
+    out = tmp_path / "out"
+    catalog = OutputCatalog(tmp_path / "library.sqlite3")
+    path = catalog.allocate(out, "Track")
+    _write(path)
+    catalog.record(path, "YT:abc", "wav:44100")
+    # Created in the same mtime tick, so the folder looks unchanged.
+    seen = os.stat(out)
+    _write(out / "Late.wav")
+    os.utime(out, ns=(seen.st_atime_ns, seen.st_mtime_ns))
+    assert catalog.allocate(out, "Late").name == "Late (1).wav"
+    assert (out / "Late.wav").read_bytes() == b"x" * 10
+    catalog.close()
@@ -0,0 +1,79 @@
+import logging
+import queue
+
+from permitted_audio_downloader.app.logging_setup import (
+    BatchingQueueListener,
+    BufferedRotatingFileHandler,
+    JobContextFilter,
+    LogRingBuffer,
+    job_logging,
+)
+
+
+def _record(message, job_id=None):
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, message, None, None)
+    if job_id is not None:
+        record.job_id = job_id
+    return record
+
+
+def test_ring_buffer_is_bounded_and_indexed_per_job():
+    buffer = LogRingBuffer(capacity=3, job_capacity=2, max_jobs=2)
+    for index in range(5):
+        buffer.handle(_record(f"line {index}", job_id=index % 2))
+    buffer.handle(_record("other", job_id=7))
+
+    assert buffer.snapshot() == ["line 3", "line 4", "other"]
+    assert buffer.snapshot(1) == ["line 1", "line 3"]
+    # Oldest job evicted once more than max_jobs have logged.
+    assert buffer.snapshot(0) == []
+    assert buffer.drain() == []
+
+    buffer.handle(_record("new", job_id=1))
+    assert buffer.drain() == [(1, "new")]
+    assert buffer.drain() == []
+
+
+def test_job_context_is_stamped_on_records():
+    context = JobContextFilter()
+    with job_logging(4):
+        inside = _record("x")
+        context.filter(inside)
+    outside = _record("y")
+    context.filter(outside)
+    explicit = _record("z", job_id=9)
+    with job_logging(4):
+        context.filter(explicit)
+    assert (inside.job_id, outside.job_id, explicit.job_id) == (4, None, 9)
+
+
+def test_listener_writes_file_in_batches(tmp_path):
+    path = tmp_path / "app.log"
+    file_handler = BufferedRotatingFileHandler(path, maxBytes=1_000_000, encoding="utf-8")
+    records = queue.SimpleQueue()
+    for index in range(3):
+        records.put(_record(f"queued {index}"))
+    listener = BatchingQueueListener(records, file_handler)
+
+    listener.handle(records.get())
+    listener.handle(records.get())
+    assert path.read_text(encoding="utf-8") == ""
+    listener.handle(records.get())
+    assert path.read_text(encoding="utf-8").splitlines() == [f"queued {i}" for i in range(3)]
+    file_handler.close()
+
+
+def test_buffered_handler_still_rolls_over_by_size(tmp_path):
+    path = tmp_path / "app.log"
+    path.write_text("x" * 20 + "\n", encoding="utf-8")
+    file_handler = BufferedRotatingFileHandler(path, maxBytes=35, backupCount=2, encoding="utf-8")
+    for index in range(3):
+        file_handler.emit(_record(f"linha {index:02d}"))
+    file_handler.flush_batch()
+
+    assert (tmp_path / "app.log.1").read_text(encoding="utf-8").splitlines() == [
+        "x" * 20,
+        "linha 00",
+    ]
+    assert path.read_text(encoding="utf-8").splitlines() == ["linha 01", "linha 02"]
+    file_handler.close()
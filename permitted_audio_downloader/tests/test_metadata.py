@@ -0,0 +1,92 @@
+import threading
+import time
+
+from permitted_audio_downloader.app.metadata import MetadataPrefetcher, compact_info
+from permitted_audio_downloader.app.utils import format_duration, format_size
+
+
+def test_compact_info_keeps_display_fields():
+    info = {"id": "a", "title": "T", "formats": [{}], "filesize_approx": 2048}
+    assert compact_info(info) == {"id": "a", "title": "T", "filesize": 2048}
+
+
+def test_prefetch_resolves_once_and_hands_info_over():
+    calls = []
+    done = threading.Event()
+
+    def resolve(url):
+        calls.append(url)
+        return {"id": "a", "title": "Track", "url": "https://cdn/a"}
+
+    prefetcher = MetadataPrefetcher(resolve, max_workers=1)
+    prefetcher.submit("u", lambda url, compact, error: done.set())
+    prefetcher.submit("u")
+    assert done.wait(1)
+    assert prefetcher.compact("u")["title"] == "Track"
+    assert prefetcher.take("u")["url"] == "https://cdn/a"
+    assert prefetcher.take("u") is None
+    assert calls == ["u"]
+    prefetcher.shutdown()
+
+
+def test_prefetch_take_ignores_stale_info():
+    prefetcher = MetadataPrefetcher(lambda url: {"id": "a"}, ttl=-1)
+    prefetcher.submit("u")
+    assert prefetcher.take("u") is None
+    prefetcher.shutdown()
+
+
+def test_prefetch_reports_errors():
+    errors = []
+    done = threading.Event()
+
+    def resolve(url):
+        raise RuntimeError("boom")
+
+    def callback(url, compact, error):
+        errors.append(error)
+        done.set()
+
+    prefetcher = MetadataPrefetcher(resolve)
+    prefetcher.submit("u", callback)
+    assert done.wait(1)
+    assert str(errors[0]) == "boom"
+    assert prefetcher.take("u") is None
+    prefetcher.shutdown()
+
+
+def test_take_returns_when_the_job_is_cancelled():
+    release = threading.Event()
+
+    def resolve(url):
+        release.wait(5)
+        return {"id": "a"}
+
+    prefetcher = MetadataPrefetcher(resolve, max_workers=1)
+    prefetcher.submit("u")
+    cancelled = threading.Event()
+    threading.Timer(0.1, cancelled.set).start()
+    started = time.monotonic()
+    assert prefetcher.take("u", is_cancelled=cancelled.is_set) is None
+    assert time.monotonic() - started < 2
+    release.set()
+    prefetcher.shutdown()
+
+
+def test_records_are_dropped_when_taken_and_capped():
+    prefetcher = MetadataPrefetcher(lambda url: {"id": url}, max_workers=1, max_records=3)
+    prefetcher.submit("taken")
+    assert prefetcher.take("taken") == {"id": "taken"}
+    assert prefetcher.compact("taken") is None
+    for n in range(10):
+        prefetcher.submit(f"u{n}")
+        prefetcher._records[f"u{n}"].future.result()
+    assert list(prefetcher._records) == ["u7", "u8", "u9"]
+    prefetcher.shutdown()
+
+
+def test_format_helpers():
+    assert format_duration(3725) == "1:02:05"
+    assert format_duration(65) == "1:05"
+    assert format_size(5 * 1024 * 1024) == "5.0 MB"
+    assert format_size(0) == ""
@@ -0,0 +1,78 @@
+import json
+import urllib.request
+
+from permitted_audio_downloader.app.metrics import BYTES_BUCKETS, MetricsRegistry, MetricsServer
+
+
+def test_disabled_registry_records_nothing():
+    metrics = MetricsRegistry()
+    timings = {}
+    first = metrics.span("transfer", timings)
+    with first:
+        pass
+    metrics.observe("transfer_bytes", 10)
+    metrics.inc("jobs_total", result="Concluído")
+    assert metrics.span("convert") is first
+    assert timings == {}
+    metrics.set_gauge("conversion_slots_busy", 2)
+    assert metrics.snapshot() == {"histograms": [], "counters": [], "gauges": []}
+
+
+def test_spans_fill_histograms_and_job_timings():
+    metrics = MetricsRegistry(enabled=True)
+    timings = {}
+    for _ in range(2):
+        with metrics.span("convert", timings):
+            pass
+    metrics.record("queue_wait", 3.0, timings)
+    metrics.observe("transfer_bytes", 5000, (1024, 4096, 16384), kind="download")
+
+    assert set(timings) == {"convert", "queue_wait"}
+    assert timings["queue_wait"] == 3.0
+    histograms = {
+        (entry["name"], tuple(entry["labels"].values())): entry
+        for entry in metrics.snapshot()["histograms"]
+    }
+    assert histograms[("stage_duration_seconds", ("convert",))]["count"] == 2
+    sizes = histograms[("transfer_bytes", ("download",))]
+    assert sizes["buckets"] == {"1024": 0, "4096": 0, "16384": 1, "+Inf": 1}
+    assert sizes["sum"] == 5000
+
+
+def test_large_and_fractional_bucket_bounds_are_exact():
+    metrics = MetricsRegistry(enabled=True)
+    metrics.observe("transfer_bytes", 2_000_000, BYTES_BUCKETS, kind="download")
+    metrics.observe("ratio", 0.1, (2.5e-7, 0.1))
+
+    text = metrics.to_prometheus()
+    assert 'pad_transfer_bytes_bucket{kind="download",le="1048576"} 0' in text
+    assert 'pad_transfer_bytes_bucket{kind="download",le="4194304"} 1' in text
+    assert 'pad_transfer_bytes_bucket{kind="download",le="4294967296"} 1' in text
+    assert 'pad_ratio_bucket{le="2.5e-07"}' in text
+    assert "e+" not in text
+
+
+def test_prometheus_text_and_local_endpoint():
+    metrics = MetricsRegistry(enabled=True)
+    metrics.describe("jobs_total", "Itens terminados.")
+    metrics.inc("jobs_total", result='Fal"hou')
+    metrics.record("queue_wait", 0.2)
+    metrics.set_gauge("conversion_queue_depth", 3)
+
+    text = metrics.to_prometheus()
+    assert "# TYPE pad_stage_duration_seconds histogram" in text
+    assert 'pad_stage_duration_seconds_bucket{stage="queue_wait",le="0.25"} 1' in text
+    assert 'pad_stage_duration_seconds_count{stage="queue_wait"} 1' in text
+    assert "# HELP pad_jobs_total Itens terminados." in text
+    assert 'pad_jobs_total{result="Fal\\"hou"} 1' in text
+    assert "# TYPE pad_conversion_queue_depth gauge\npad_conversion_queue_depth 3" in text
+
+    server = MetricsServer(0, metrics)
+    try:
+        base = f"http://127.0.0.1:{server.port}"
+        with urllib.request.urlopen(f"{base}/metrics") as response:
+            assert response.read().decode("utf-8") == text
+        with urllib.request.urlopen(f"{base}/metrics.json") as response:
+            assert json.loads(response.read())["counters"][0]["value"] == 1
+    finally:
+        server.close()
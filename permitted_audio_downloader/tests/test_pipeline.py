@@ -0,0 +1,108 @@
+import threading
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from permitted_audio_downloader.app.models import DownloadItem, OutputVariant, parse_variants
+from permitted_audio_downloader.app.pipeline import (
+    ConversionJob,
+    HandoffQueue,
+    build_output_path,
+    build_output_paths,
+    job_variants,
+)
+
+
+def _job(tmp_path, index=0):
+    return ConversionJob(
+        index=index,
+        item=DownloadItem(url="https://youtu.be/abc"),
+        input_path=tmp_path / "in.webm",
+        output_path=tmp_path / "out.wav",
+        sample_rate=44100,
+        temp_dir=str(tmp_path),
+    )
+
+
+def test_handoff_put_blocks_until_cancelled(tmp_path):
+    handoff = HandoffQueue(maxsize=1, poll_interval=0.01)
+    handoff.put(_job(tmp_path, 0), lambda: False)
+    cancelled = threading.Event()
+    timer = threading.Timer(0.05, cancelled.set)
+    timer.start()
+    with pytest.raises(RuntimeError, match="cancelado"):
+        handoff.put(_job(tmp_path, 1), cancelled.is_set)
+    assert handoff.qsize() == 1
+
+
+def test_handoff_close_wakes_consumer(tmp_path):
+    handoff = HandoffQueue(maxsize=2)
+    handoff.put(_job(tmp_path), lambda: False)
+    handoff.close()
+    assert handoff.get().index == 0
+    assert handoff.get() is None
+
+
+def test_handoff_close_does_not_block_on_full_queue(tmp_path):
+    handoff = HandoffQueue(maxsize=1)
+    temp_dir = tmp_path / "job"
+    temp_dir.mkdir()
+    job = _job(tmp_path)
+    job.temp_dir = str(temp_dir)
+    handoff.put(job, lambda: False)
+    closer = threading.Thread(target=handoff.close, kwargs={"discard": True})
+    closer.start()
+    closer.join(timeout=2)
+    assert not closer.is_alive()
+    assert handoff.get() is None
+    assert not temp_dir.exists()
+
+
+def test_build_output_path_uses_uploader(tmp_path):
+    options = {"output_dir": str(tmp_path), "preserve_name": True, "overwrite": False}
+    path = build_output_path({"title": "Track", "uploader": "Artist"}, options)
+    assert path == tmp_path / "Artist - Track.wav"
+
+
+def test_parse_variants_accepts_dicts_and_strings():
+    variants = parse_variants(
+        [
+            {"sample_rate": 44100},
+            "48000:24:2",
+            "48000:16:1:FLAC",
+            "44100",
+            {"sample_rate": 48000, "bit_depth": 32, "container": "flac"},
+            "abc",
+        ]
+    )
+    assert variants == [
+        OutputVariant(44100),
+        OutputVariant(48000, 24, 2),
+        OutputVariant(48000, 16, 1, "flac"),
+    ]
+    assert [variant.key for variant in variants] == [
+        "wav:44100",
+        "wav:48000:24:2",
+        "flac:48000:16:1",
+    ]
+
+
+def test_variants_get_labelled_names_only_when_several(tmp_path):
+    options = {
+        "output_dir": str(tmp_path),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+        "output_variants": ["44100", "48000:24:0:flac"],
+    }
+    item = DownloadItem(url="https://youtu.be/abc")
+    outputs = build_output_paths({"title": "Track"}, options, job_variants(item, options))
+    assert [path.name for _, path in outputs] == [
+        "Track [44.1 kHz].wav",
+        "Track [48 kHz 24-bit FLAC].flac",
+    ]
+
+    item.variants = [OutputVariant(48000)]
+    [(variant, path)] = build_output_paths({"title": "Track"}, options, job_variants(item, options))
+    assert path.name == "Track.wav" and variant.sample_rate == 48000
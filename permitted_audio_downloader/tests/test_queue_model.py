@@ -0,0 +1,60 @@
+import pytest
+
+QtCore = pytest.importorskip("PySide6.QtCore")
+
+from permitted_audio_downloader.app.job_store import JobStore
+from permitted_audio_downloader.app.models import DownloadItem
+from permitted_audio_downloader.app.queue_model import QueueTableModel
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def test_inserts_and_updates_are_coalesced_until_flush(app):
+    store = JobStore()
+    model = QueueTableModel(store)
+    inserted = []
+    changed = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    model.dataChanged.connect(lambda tl, br, roles: changed.append((tl.row(), br.row())))
+
+    ids = [store.add(DownloadItem(url=f"https://youtu.be/{n}")) for n in range(10_000)]
+    assert model.rowCount() == 0
+    model.flush()
+    assert inserted == [(0, 9_999)]
+
+    for percent in range(100):
+        store.get(ids[3]).progress = percent
+        model.mark_dirty(ids[3])
+        model.mark_dirty(ids[7])
+    assert changed == []
+    model.flush()
+    assert changed == [(3, 7)]
+    assert model.data(model.index(3, 5)) == "99.0%"
+
+
+def test_resetting_picks_up_removed_rows(app):
+    store = JobStore()
+    first = store.add(DownloadItem(url="https://youtu.be/a"))
+    second = store.add(DownloadItem(url="https://youtu.be/b"))
+    model = QueueTableModel(store)
+    model.mark_dirty(second)
+    with model.resetting():
+        store.set_status(first, "Concluído")
+        store.remove_finished()
+    assert model.rowCount() == 1
+    assert model.data(model.index(0, 0)) == "Na fila"
+
+
+def test_attempts_and_last_error_columns(app):
+    store = JobStore()
+    model = QueueTableModel(store)
+    item = DownloadItem(url="https://youtu.be/a", attempts=2, last_error="HTTP Error 429\nmais")
+    store.add(item)
+    model.flush()
+    assert model.data(model.index(0, 7)) == "2"
+    assert model.data(model.index(0, 8)) == "HTTP Error 429"
+    assert model.data(model.index(0, 8), QtCore.Qt.ToolTipRole) == "HTTP Error 429\nmais"
+    assert model.data(model.index(0, 9)) == ""
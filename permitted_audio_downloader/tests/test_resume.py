@@ -0,0 +1,228 @@
+import gc
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from permitted_audio_downloader.app import ytdlp_service
+from permitted_audio_downloader.app.models import DownloadItem
+from permitted_audio_downloader.app.pipeline import failure_status, fetch_stage
+from permitted_audio_downloader.app.staging import StagingArea
+from permitted_audio_downloader.app.ytdlp_service import SessionPool
+
+PAYLOAD = os.urandom(2 * 1024 * 1024)
+
+
+class RangeHandler(BaseHTTPRequestHandler):
+    ranges: list = []
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def _respond(self, send_body):
+        header = self.headers.get("Range")
+        self.ranges.append(header)
+        start, end = 0, len(PAYLOAD) - 1
+        if header:
+            first, _, last = header.removeprefix("bytes=").partition("-")
+            start = int(first)
+            end = min(int(last), end) if last else end
+            if start >= len(PAYLOAD):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(PAYLOAD)}")
+                self.end_headers()
+                return
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+        else:
+            self.send_response(200)
+        body = PAYLOAD[start:end + 1]
+        self.send_header("Content-Type", "audio/mpeg")
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            try:
+                self.wfile.write(body)
+            except ConnectionError:
+                pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    RangeHandler.ranges = []
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_paused_download_continues_with_range_request(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ytdlp_service, "_pool", SessionPool(cache_dir=tmp_path / "ytdlp"))
+    (tmp_path / "out").mkdir()
+    options = {
+        "output_dir": str(tmp_path / "out"),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+    }
+    item = DownloadItem(url=f"{server}/mix.mp3")
+    staging = StagingArea(tmp_path / "staging")
+    staging_dir = str(staging.path_for(1))
+    pause = threading.Event()
+
+    def on_progress(percent):
+        if percent >= 40:
+            pause.set()
+
+    status = None
+    try:
+        fetch_stage(
+            1, item, options, on_progress, lambda: False,
+            staging_dir=staging_dir, is_paused=pause.is_set,
+        )
+    except Exception as exc:
+        status = failure_status(exc)[0]
+    gc.collect()
+    assert status == "Pausado"
+    kept = staging.partial_bytes(1)
+    assert 0 < kept < len(PAYLOAD)
+
+    RangeHandler.ranges.clear()
+    job = fetch_stage(
+        1, item, options, lambda percent: None, lambda: False,
+        staging_dir=staging_dir, is_paused=lambda: False,
+    )
+
+    assert f"bytes={kept}-" in RangeHandler.ranges
+    assert job.input_path.read_bytes() == PAYLOAD
+    job.cleanup()
+    assert not os.path.exists(staging_dir)
+
+
+def test_retryable_failure_keeps_the_partial_download_for_the_retry(
+    tmp_path, server, monkeypatch
+):
+    monkeypatch.setattr(ytdlp_service, "_pool", SessionPool(cache_dir=tmp_path / "ytdlp"))
+    (tmp_path / "out").mkdir()
+    options = {
+        "output_dir": str(tmp_path / "out"),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+    }
+    item = DownloadItem(url=f"{server}/flaky.mp3")
+    staging = StagingArea(tmp_path / "staging")
+    staging_dir = str(staging.path_for(1))
+
+    def on_progress(percent):
+        if percent >= 40:
+            raise ConnectionResetError("Connection reset by peer")
+
+    with pytest.raises(Exception) as failure:
+        fetch_stage(1, item, options, on_progress, lambda: False, staging_dir=staging_dir)
+    gc.collect()
+    assert failure_status(failure.value)[0] == "Falhou"
+    kept = staging.partial_bytes(1)
+    assert 0 < kept < len(PAYLOAD)
+
+    RangeHandler.ranges.clear()
+    job = fetch_stage(
+        1, item, options, lambda percent: None, lambda: False, staging_dir=staging_dir
+    )
+
+    assert f"bytes={kept}-" in RangeHandler.ranges
+    assert job.input_path.read_bytes() == PAYLOAD
+    job.cleanup()
+
+
+def test_large_file_is_fetched_in_parallel_ranges(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ytdlp_service, "_pool", SessionPool(cache_dir=tmp_path / "ytdlp"))
+    monkeypatch.setattr(ytdlp_service, "SEGMENT_MIN_SIZE", 1024 * 1024)
+    (tmp_path / "out").mkdir()
+    options = {
+        "output_dir": str(tmp_path / "out"),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+        "download_segments": 4,
+    }
+    item = DownloadItem(url=f"{server}/set.mp3")
+    seen = []
+
+    job = fetch_stage(
+        1, item, options, seen.append, lambda: False, staging_dir=str(tmp_path / "staging")
+    )
+
+    quarter = len(PAYLOAD) // 4
+    assert {f"bytes={i * quarter}-{(i + 1) * quarter - 1}" for i in range(4)} <= set(
+        RangeHandler.ranges
+    )
+    assert job.input_path.read_bytes() == PAYLOAD
+    assert seen == sorted(seen) and seen[-1] == 100.0
+    assert not list((tmp_path / "staging").glob("*.part"))
+    job.cleanup()
+
+
+def test_paused_segmented_download_resumes_each_segment(tmp_path, server, monkeypatch):
+    monkeypatch.setattr(ytdlp_service, "_pool", SessionPool(cache_dir=tmp_path / "ytdlp"))
+    monkeypatch.setattr(ytdlp_service, "SEGMENT_MIN_SIZE", 1024 * 1024)
+    monkeypatch.setattr(ytdlp_service, "SEGMENT_STATE_INTERVAL", 256 * 1024)
+    (tmp_path / "out").mkdir()
+    options = {
+        "output_dir": str(tmp_path / "out"),
+        "preserve_name": False,
+        "overwrite": False,
+        "sample_rate": 44100,
+        "download_segments": 4,
+    }
+    item = DownloadItem(url=f"{server}/long.mp3")
+    staging = StagingArea(tmp_path / "staging")
+    staging_dir = str(staging.path_for(1))
+    pause = threading.Event()
+
+    def on_progress(percent):
+        if percent >= 40:
+            pause.set()
+
+    status = None
+    try:
+        fetch_stage(
+            1, item, options, on_progress, lambda: False,
+            staging_dir=staging_dir, is_paused=pause.is_set,
+        )
+    except Exception as exc:
+        status = failure_status(exc)[0]
+    assert status == "Pausado"
+    kept = staging.partial_bytes(1)
+    assert len(PAYLOAD) * 0.4 <= kept < len(PAYLOAD)
+
+    RangeHandler.ranges.clear()
+    seen = []
+    job = fetch_stage(
+        1, item, options, seen.append, lambda: False,
+        staging_dir=staging_dir, is_paused=lambda: False,
+    )
+
+    # Each unfinished segment continues from its own offset, so only the
+    # missing bytes are requested again.
+    spans = [
+        r.removeprefix("bytes=").partition("-")
+        for r in RangeHandler.ranges
+        if r and r != "bytes=0-0"
+    ]
+    assert sum(int(last) - int(first) + 1 for first, _, last in spans) == len(PAYLOAD) - kept
+    assert seen[0] >= 40 and seen[-1] == 100.0
+    assert job.input_path.read_bytes() == PAYLOAD
+    job.cleanup()
@@ -0,0 +1,74 @@
+from permitted_audio_downloader.app.scheduler import (
+    CircuitBreaker,
+    SlotLimiter,
+    backoff_delay,
+    is_retryable,
+)
+from permitted_audio_downloader.app.validators import ValidationError
+
+
+def test_limiter_caps_total_slots():
+    limiter = SlotLimiter(2, {"YT": 5, "SC": 5})
+    assert limiter.acquire("YT")
+    assert limiter.acquire("SC")
+    assert not limiter.acquire("YT")
+    limiter.release("SC")
+    assert limiter.acquire("YT")
+    assert limiter.active == 2
+
+
+def test_limiter_caps_per_source():
+    limiter = SlotLimiter(4, {"YT": 1})
+    assert limiter.acquire("YT")
+    assert not limiter.can_acquire("YT")
+    assert limiter.acquire("SC")
+    assert limiter.active_for("YT") == 1
+
+
+def test_limiter_reconfigure_keeps_active_counts():
+    limiter = SlotLimiter(1)
+    assert limiter.acquire("YT")
+    limiter.configure(3, {"YT": 3})
+    assert limiter.acquire("YT")
+    assert limiter.active_for("YT") == 2
+
+
+def test_only_transient_failures_are_retryable():
+    assert is_retryable(RuntimeError("unable to download: HTTP Error 429: Too Many Requests"))
+    assert is_retryable(RuntimeError("HTTP Error 503: Service Unavailable"))
+    assert is_retryable(ConnectionResetError(104, "Connection reset by peer"))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(RuntimeError("HTTP Error 404: Not Found"))
+    assert not is_retryable(RuntimeError("ERROR: [youtube] abc: Video unavailable"))
+    assert not is_retryable(ValidationError("Domínio não suportado"))
+
+
+def test_backoff_grows_exponentially_with_full_jitter():
+    assert backoff_delay(1, 2.0, 300.0, rng=lambda: 1.0) == 2.0
+    assert backoff_delay(4, 2.0, 300.0, rng=lambda: 1.0) == 16.0
+    assert backoff_delay(20, 2.0, 300.0, rng=lambda: 1.0) == 300.0
+    assert backoff_delay(4, 2.0, 300.0, rng=lambda: 0.25) == 4.0
+
+
+def test_breaker_opens_then_lets_one_probe_through():
+    now = [0.0]
+    breaker = CircuitBreaker(threshold=2, cooldown=30, clock=lambda: now[0])
+    assert not breaker.record_failure("YT")
+    assert breaker.record_failure("YT")
+    assert not breaker.allow("YT")
+    assert breaker.allow("SC")
+    assert breaker.next_probe_in() == 30
+
+    now[0] = 31.0
+    assert breaker.state("YT") == "half-open"
+    assert breaker.allow("YT")
+    breaker.dispatched("YT")
+    assert not breaker.allow("YT")
+
+    assert breaker.record_failure("YT")
+    assert breaker.state("YT") == "open"
+    now[0] = 62.0
+    breaker.dispatched("YT")
+    breaker.record_success("YT")
+    assert breaker.state("YT") == "closed"
+    assert not breaker.record_failure("YT")
@@ -0,0 +1,85 @@
+import os
+import time
+
+from permitted_audio_downloader.app import source_cache
+from permitted_audio_downloader.app.source_cache import SourceCache
+
+
+def _info(media_id):
+    return {"extractor_key": "Youtube", "id": media_id, "format_id": "251", "title": media_id}
+
+
+def _source(tmp_path, name, size):
+    path = tmp_path / f"{name}.webm"
+    path.write_bytes(b"x" * size)
+    return path
+
+
+def test_store_and_lookup_by_url_and_key(tmp_path):
+    cache = SourceCache(tmp_path / "cache", max_bytes=1000)
+    entry = cache.store("https://youtu.be/a", _info("a"), _source(tmp_path, "a", 10))
+    assert cache.lookup_url("https://youtu.be/a").key == entry.key
+    assert cache.lookup("Youtube", "a", "251").info["title"] == "a"
+    assert cache.path_for(entry).read_bytes() == b"x" * 10
+
+
+def test_index_survives_reload(tmp_path):
+    cache = SourceCache(tmp_path / "cache", max_bytes=1000)
+    cache.store("https://youtu.be/a", _info("a"), _source(tmp_path, "a", 10))
+    reloaded = SourceCache(tmp_path / "cache", max_bytes=1000)
+    assert reloaded.lookup_url("https://youtu.be/a") is not None
+
+
+def test_lru_eviction_skips_pinned_entries(tmp_path):
+    cache = SourceCache(tmp_path / "cache", max_bytes=25)
+    cache.store("u1", _info("a"), _source(tmp_path, "a", 10), pin=True)
+    time.sleep(0.01)
+    cache.store("u2", _info("b"), _source(tmp_path, "b", 10))
+    time.sleep(0.01)
+    cache.store("u3", _info("c"), _source(tmp_path, "c", 10))
+    assert cache.lookup_url("u1") is not None
+    assert cache.lookup_url("u2") is None
+    assert cache.lookup_url("u3") is not None
+    assert cache.total_bytes <= 25
+
+
+def test_corrupted_entry_is_discarded(tmp_path):
+    cache = SourceCache(tmp_path / "cache", max_bytes=1000)
+    entry = cache.store("u1", _info("a"), _source(tmp_path, "a", 10))
+    path = cache.path_for(entry)
+    path.write_bytes(b"y" * 10)
+    # Independent of the filesystem's timestamp resolution.
+    os.utime(path, ns=(entry.mtime_ns + 10**9, entry.mtime_ns + 10**9))
+    assert cache.lookup_url("u1") is None
+    assert not cache.path_for(entry).exists()
+
+
+def test_lookup_hashes_only_when_the_file_changed(tmp_path, monkeypatch):
+    cache = SourceCache(tmp_path / "cache", max_bytes=1000)
+    entry = cache.store("u1", _info("a"), _source(tmp_path, "a", 10))
+    hashed = []
+    real_sha256 = source_cache.file_sha256
+    monkeypatch.setattr(
+        source_cache, "file_sha256", lambda path: hashed.append(path) or real_sha256(path)
+    )
+    for _ in range(3):
+        assert cache.lookup_url("u1") is not None
+    assert hashed == []
+
+    os.utime(cache.path_for(entry), ns=(entry.mtime_ns + 10**9, entry.mtime_ns + 10**9))
+    assert cache.lookup_url("u1") is not None
+    assert cache.lookup_url("u1") is not None
+    assert len(hashed) == 1
+
+
+def test_access_times_are_written_in_batches(tmp_path, monkeypatch):
+    cache = SourceCache(tmp_path / "cache", max_bytes=1000)
+    cache.store("u1", _info("a"), _source(tmp_path, "a", 10))
+    index = tmp_path / "cache" / source_cache.INDEX_FILENAME
+    written = index.read_text(encoding="utf-8")
+    for _ in range(5):
+        cache.lookup_url("u1")
+    assert index.read_text(encoding="utf-8") == written
+
+    cache.close()
+    assert index.read_text(encoding="utf-8") != written
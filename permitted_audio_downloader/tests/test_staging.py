@@ -0,0 +1,21 @@
+from permitted_audio_downloader.app.staging import StagingArea
+
+
+def test_partial_bytes_counts_only_part_files(tmp_path):
+    staging = StagingArea(tmp_path)
+    job_dir = staging.path_for(7)
+    (job_dir / "abc.webm.part").write_bytes(b"x" * 300)
+    (job_dir / "abc.info.json").write_text("{}")
+    assert staging.partial_bytes(7) == 300
+    assert staging.partial_bytes(8) == 0
+
+
+def test_prune_keeps_known_jobs_and_discard_removes_one(tmp_path):
+    staging = StagingArea(tmp_path)
+    for key in (1, 2, 3):
+        (staging.path_for(key) / "a.part").write_bytes(b"x")
+    assert staging.prune(keep=[1, 3]) == 1
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["1", "3"]
+    staging.discard(3)
+    staging.discard(99)
+    assert [p.name for p in tmp_path.iterdir()] == ["1"]
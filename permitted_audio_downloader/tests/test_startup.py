@@ -0,0 +1,30 @@
+import importlib.util
+
+import pytest
+
+from permitted_audio_downloader.benchmarks.bench_startup import (
+    BUDGET_MS,
+    measure_import,
+    parse_importtime,
+)
+
+
+def test_parse_importtime_reads_self_and_cumulative():
+    stderr = (
+        "import time: self [us] | cumulative | imported package\n"
+        "import time:       120 |        120 |   json.decoder\n"
+        "import time:       300 |        420 | json\n"
+    )
+    assert parse_importtime(stderr) == [("json.decoder", 120, 120), ("json", 300, 420)]
+
+
+def test_batch_import_stays_headless_and_defers_yt_dlp():
+    result = measure_import("batch")
+    assert result["deferred_loaded"] == []
+    # Loose enough for a slow CI runner; the benchmark enforces the real budget.
+    assert 0 < result["import_ms"] < BUDGET_MS["batch"] * 4
+
+
+@pytest.mark.skipif(importlib.util.find_spec("PySide6") is None, reason="PySide6 ausente")
+def test_gui_import_defers_yt_dlp():
+    assert measure_import("gui")["deferred_loaded"] == []
@@ -1,6 +1,11 @@
 import pytest
 
-from permitted_audio_downloader.app.validators import ValidationError, validate_url
+from permitted_audio_downloader.app.validators import (
+    ValidationError,
+    canonicalize_url,
+    is_playlist_url,
+    validate_url,
+)
 
 
 @pytest.mark.parametrize(
@@ -29,3 +34,57 @@ def test_validate_url_allows_domains(url):
 def test_validate_url_rejects_invalid(url):
     with pytest.raises(ValidationError):
         validate_url(url)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/playlist?list=PL123",
+        "https://www.youtube.com/@artist",
+        "https://soundcloud.com/artist",
+        "https://soundcloud.com/artist/tracks",
+        "https://soundcloud.com/artist/sets/album",
+    ],
+)
+def test_is_playlist_url_detects_collections(url):
+    assert is_playlist_url(url)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://www.youtube.com/watch?v=abc&list=PL123",
+        "https://youtu.be/abc",
+        "https://soundcloud.com/artist/track",
+        "https://soundcloud.com/artist/track?in=artist/sets/album",
+    ],
+)
+def test_is_playlist_url_ignores_single_tracks(url):
+    assert not is_playlist_url(url)
+
+
+@pytest.mark.parametrize(
+    "url",
+    [
+        "https://youtu.be/dQw4w9WgXcQ",
+        "https://youtu.be/dQw4w9WgXcQ?si=share",
+        "https://m.youtube.com/watch?v=dQw4w9WgXcQ&t=30",
+        "https://www.youtube.com/watch?v=dQw4w9WgXcQ&list=PL123",
+        "  https://YouTube.com/watch?feature=share&v=dQw4w9WgXcQ ",
+        "https://www.youtube.com/shorts/dQw4w9WgXcQ",
+    ],
+)
+def test_canonicalize_url_reduces_youtube_variants(url):
+    assert canonicalize_url(url) == ("YT", "dQw4w9WgXcQ")
+
+
+def test_canonicalize_url_soundcloud_and_collections():
+    assert canonicalize_url("https://soundcloud.com/Artist/Track?in=artist/sets/x") == (
+        "SC",
+        "artist/track",
+    )
+    assert canonicalize_url("https://www.soundcloud.com/artist/track") == ("SC", "artist/track")
+    assert canonicalize_url("https://soundcloud.com/artist/tracks") is None
+    assert canonicalize_url("https://www.youtube.com/playlist?list=PL123") is None
+    assert canonicalize_url("https://www.youtube.com/watch") is None
+    assert canonicalize_url("https://example.com/watch?v=abc") is None
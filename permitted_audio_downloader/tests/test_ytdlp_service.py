@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+pytest.importorskip("yt_dlp")
+
+from permitted_audio_downloader.app import ytdlp_service
+from permitted_audio_downloader.app.ytdlp_service import (
+    SessionPool,
+    _response_total,
+    is_streamable,
+)
+
+
+def test_is_streamable_accepts_direct_webm():
+    info = {"url": "https://host/a.webm", "protocol": "https", "ext": "webm"}
+    assert is_streamable(info)
+
+
+@pytest.mark.parametrize(
+    "info",
+    [
+        {"url": "https://host/a.m4a", "protocol": "https", "ext": "m4a"},
+        {"url": "https://host/a.m3u8", "protocol": "m3u8_native", "ext": "mp4"},
+        {"url": "https://host/a.webm", "protocol": "https", "ext": "webm", "requested_formats": [{}]},
+    ],
+)
+def test_is_streamable_rejects_seek_or_fragment_formats(info):
+    assert not is_streamable(info)
+
+
+def test_response_total_reads_content_range():
+    assert _response_total({"Content-Range": "bytes 0-99/12345"}, ranged=True) == 12345
+    assert _response_total({"Content-Length": "100"}, ranged=False) == 100
+
+
+class _FakeSession:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_session_pool_reuses_idle_sessions(monkeypatch):
+    monkeypatch.setattr(SessionPool, "_new_session", lambda self: _FakeSession())
+    pool = SessionPool(max_size=2)
+    with pool.session() as first:
+        pass
+    with pool.session() as second:
+        assert second is first
+    pool.close()
+    assert first.closed
+
+
+def test_session_pool_blocks_at_max_size(monkeypatch):
+    monkeypatch.setattr(SessionPool, "_new_session", lambda self: _FakeSession())
+    pool = SessionPool(max_size=1)
+    held = pool.acquire()
+    acquired = []
+    thread = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+    thread.start()
+    thread.join(0.05)
+    assert not acquired
+    pool.release(held)
+    thread.join(1)
+    assert acquired == [held]
+
+
+def test_playlist_pages_are_produced_lazily(monkeypatch):
+    listed = []
+
+    def fake_entries(url, ffmpeg_location=None):
+        for number in range(5):
+            listed.append(number)
+            yield {"url": f"https://youtu.be/{number}", "title": str(number)}
+        yield {"title": "sem url"}
+
+    monkeypatch.setattr(ytdlp_service, "iter_playlist_entries", fake_entries)
+    pages = ytdlp_service.iter_playlist_pages("https://youtube.com/playlist?list=x", page_size=2)
+    first = next(pages)
+    assert first == [
+        ("https://youtu.be/0", {"title": "0"}),
+        ("https://youtu.be/1", {"title": "1"}),
+    ]
+    assert listed == [0, 1]
+    rest = list(pages)
+    assert [len(page) for page in rest] == [2, 2]
+    assert rest[-1][-1] == ("", {"title": "sem url"})
+
+
+class FakeYdl:
+    def __init__(self, results):
+        self.results = results
+        self.requested = []
+
+    def extract_info(self, url, download=False, process=False, ie_key=None):
+        self.requested.append(url)
+        return self.results[url]
+
+
+def test_nested_playlists_and_soundcloud_stubs_are_expanded():
+    stub = "https://api-v2.soundcloud.com/tracks/42"
+    tab = "https://www.youtube.com/@artist/shorts"
+    ydl = FakeYdl(
+        {
+            stub: {"webpage_url": "https://soundcloud.com/artist/faixa", "title": "faixa"},
+            tab: {"_type": "playlist", "entries": [{"_type": "url", "url": "https://youtu.be/c"}]},
+        }
+    )
+    result = {
+        "_type": "playlist",
+        "entries": [
+            {
+                "_type": "playlist",
+                "title": "Videos",
+                "entries": [{"_type": "url", "url": "https://youtu.be/a"}],
+            },
+            {"_type": "url", "url": tab},
+            {"_type": "url", "url": stub, "ie_key": "Soundcloud"},
+            {"_type": "url", "url": "https://youtu.be/b"},
+        ],
+    }
+    urls = [ytdlp_service.entry_url(entry) for entry in ytdlp_service._expand_entries(ydl, result)]
+    assert urls == [
+        "https://youtu.be/a",
+        "https://youtu.be/c",
+        "https://soundcloud.com/artist/faixa",
+        "https://youtu.be/b",
+    ]
+    assert ydl.requested == [tab, stub]
+
+
+def test_unresolvable_stubs_are_passed_on_for_reporting():
+    stub = "https://api-v2.soundcloud.com/tracks/7"
+
+    class FailingYdl:
+        def extract_info(self, *args, **kwargs):
+            raise RuntimeError("404")
+
+    entries = list(
+        ytdlp_service._expand_entries(FailingYdl(), {"entries": [{"_type": "url", "url": stub}]})
+    )
+    assert [ytdlp_service.entry_url(entry) for entry in entries] == [stub]